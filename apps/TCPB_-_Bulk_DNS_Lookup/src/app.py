@@ -2,6 +2,7 @@
 
 # standard library
 import json
+import queue
 import time
 import traceback
 from threading import Lock, Thread
@@ -15,44 +16,16 @@ import dns.resolver
 
 # first-party
 from argcheck import tc_argcheck
+from async_resolver import CONCURRENCY, NAMESERVER_CONCURRENCY, AsyncResolverEngine, ResolverStats
+from batch_writer import batched_writes
 from json_util import conform_objects, refold
 from playbook_app import PlaybookApp  # Import default Playbook App Class (Required)
+from token_bucket import TokenBucket
 from trap_exception import trap
 
 TIMEOUT = 3
 
 
-class Throttle:
-    """Throttle Class"""
-
-    def __init__(self, rate=150):
-        """Create a throttle for a specific rate/sec"""
-
-        self.lock = Lock()
-        self.rate = rate
-        self.ts = None
-        self.count = 0
-
-    def __call__(self):
-        """Return when the throttle limit is acceptable"""
-
-        with self.lock:
-            now = time.time()
-            if self.ts is None:
-                self.ts = now
-
-            if now - self.ts >= 1.0:
-                self.count = 0
-                self.ts = now
-
-            self.count += 1
-
-            if self.count <= self.rate:
-                return
-
-            time.sleep(self.ts + 1 - now)
-
-
 class App(PlaybookApp):
     """Playbook App"""
 
@@ -69,6 +42,11 @@ class App(PlaybookApp):
         self.cache = dns.resolver.LRUCache()
         self.nameservers = None
         self.transform_ptr = True
+        self.resolver_mode = 'Threaded'
+        self.concurrency = CONCURRENCY
+        self.nameserver_concurrency = NAMESERVER_CONCURRENCY
+        self.stats = ResolverStats()
+        self.stats_lock = Lock()
 
     def add_output(self, name, value, jsonify=False):
         """Add an output to the output list"""
@@ -127,7 +105,14 @@ class App(PlaybookApp):
 
         self.tcex.log.debug(f'Queuing {len(self.questions)} for resolution')
 
-        self.batch_resolve()
+        if self.resolver_mode == 'Threaded':
+            self.batch_resolve()
+        else:
+            self.async_resolve()
+
+        stats = self.stats.summary()
+        stats['throttle'] = self.throttle.stats()
+        self.tcex.log.info(f'Resolver statistics: {stats}')
 
         result = {}
         cnames = {}
@@ -163,6 +148,7 @@ class App(PlaybookApp):
         self.add_output('dns.result.json', result, jsonify=True)
         self.add_output('dns.valid', sorted(list(valid_questions)))
         self.add_output('dns.invalid', sorted(list(invalid_questions)))
+        self.add_output('dns.stats', stats, jsonify=True)
 
     def fail(self, exit_message):
         """Exit with failure message, but after writing output"""
@@ -198,12 +184,28 @@ class App(PlaybookApp):
         rate_limit = tc_argcheck(
             self.tcex.rargs, 'rate_limit', required=True, types=int, default=150, tcex=self.tcex
         )
-        self.throttle = Throttle(rate_limit)
+        # allow a second's worth of requests at once, as the per-second window did
+        self.throttle = TokenBucket(rate_limit, period=1, capacity=rate_limit)
 
         self.transform_ptr = tc_argcheck(
             self.tcex.rargs, 'transform_ptr', default=True, types=bool, tcex=self.tcex
         )
 
+        self.resolver_mode = tc_argcheck(
+            self.tcex.rargs, 'resolver_mode', default='Threaded', tcex=self.tcex
+        )
+        self.concurrency = tc_argcheck(
+            self.tcex.rargs, 'concurrency', types=int, default=CONCURRENCY, tcex=self.tcex
+        )
+        self.nameserver_concurrency = tc_argcheck(
+            self.tcex.rargs,
+            'nameserver_concurrency',
+            label='Nameserver Concurrency',
+            types=int,
+            default=NAMESERVER_CONCURRENCY,
+            tcex=self.tcex,
+        )
+
         if isinstance(self.nameservers, str):
             self.nameservers = self.nameservers.split(',')
         if not isinstance(self.nameservers, list):
@@ -228,38 +230,77 @@ class App(PlaybookApp):
     def write_output(self) -> None:
         """Write the Playbook output variables."""
 
-        for prefix, value, jsonify in self.outputs:
-            if callable(value):
-                try:
-                    value = value()  # deferred action output
-                except Exception:
-                    self.tcex.log.error(
-                        f'Exception raised during output handling for {prefix}, '
-                        'writing null output'
-                    )
-                    value = None
-            if jsonify and isinstance(value, (list, dict)):
-                value = json.dumps(value)
-                self.tcex.log.debug(f'JSONifying output {prefix}')
-            if isinstance(value, (list, dict)):
-                value = conform_objects(value)
-                value = refold(value, prefix=prefix)
-                for name, inner_value in value.items():
-                    self.write_one(name, inner_value)
-            else:
-                self.write_one(prefix, value)
+        # the refolded outputs are written together, rather than one at a time
+        with batched_writes(self.tcex) as writer:
+            for prefix, value, jsonify in self.outputs:
+                if callable(value):
+                    try:
+                        value = value()  # deferred action output
+                    except Exception:
+                        self.tcex.log.error(
+                            f'Exception raised during output handling for {prefix}, '
+                            'writing null output'
+                        )
+                        value = None
+                if jsonify and isinstance(value, (list, dict)):
+                    value = json.dumps(value)
+                    self.tcex.log.debug(f'JSONifying output {prefix}')
+                if isinstance(value, (list, dict)):
+                    value = conform_objects(value)
+                    value = refold(value, prefix=prefix)
+                    for name, inner_value in value.items():
+                        self.write_one(name, inner_value)
+                else:
+                    self.write_one(prefix, value)
+
+        self.tcex.log.info(
+            f'Wrote {writer.writes} outputs ({writer.bytes} bytes) '
+            f'in {writer.round_trips} round trips'
+        )
 
         self.tcex.playbook.exit(self.exit_code, self.exit_message)
 
+    def async_resolve(self):
+        """Resolve the questions with the asyncio resolver engine"""
+
+        engine = AsyncResolverEngine(
+            self.nameservers,
+            self.tcex.log,
+            concurrency=self.concurrency,
+            nameserver_concurrency=self.nameserver_concurrency,
+            cache=self.cache,
+            throttle=self.throttle,
+            transform_ptr=self.transform_ptr,
+        )
+        self.stats = engine.stats
+
+        answers = engine.resolve_all(self.questions)
+
+        for question, answer in zip(self.questions, answers):
+            self.tcex.log.debug(f'Question: {question}')
+            self.answers.append(self.answer_result(question, answer))
+
     def batch_resolve(self, count=4):
         """Fire up count resolver threads, then join on them"""
 
+        work = queue.Queue()
+        for question in self.questions:
+            work.put(question)
+
         threads = []
         for n in range(count):
             threads.append(
-                Thread(group=None, target=self.resolver_thread, name=f'Resolver-{n+1}', daemon=True)
+                Thread(
+                    group=None,
+                    target=self.resolver_thread,
+                    args=(work,),
+                    name=f'Resolver-{n+1}',
+                    daemon=True,
+                )
             )
 
+        self.stats.start = time.perf_counter()
+
         for thread in threads:
             self.tcex.log.debug(f'Starting Resolver {thread.name}')
             thread.start()
@@ -268,10 +309,12 @@ class App(PlaybookApp):
             self.tcex.log.debug(f'Joining Resolver {thread.name}')
             thread.join()
 
-    def resolver_thread(self):
+        self.stats.end = time.perf_counter()
+
+    def resolver_thread(self, work):
         """Resolver Thread to handle DNS lookups"""
 
-        self.tcex.log.debug(f'Resolver starting... {len(self.questions)} questions remaining...')
+        self.tcex.log.debug(f'Resolver starting... {work.qsize()} questions remaining...')
 
         try:
             resolver = dns.resolver.Resolver(configure=False)
@@ -282,27 +325,38 @@ class App(PlaybookApp):
             self.tcex.log.error(f'Failed to create resolver: {e}')
             self.tcex.log.error(traceback.format_exc())
 
-        while self.questions:
-            question = self.questions.pop()
+        while True:
+            try:
+                question = work.get_nowait()
+            except queue.Empty:
+                break
 
-            self.throttle()
+            self.throttle.acquire()
 
             self.tcex.log.debug(f'Question: {question}')
+            start = time.perf_counter()
             answer = self.resolve(question, resolver)
-            cname = None
-            if answer:
-                result = []
-                for rdata in answer:
-                    data = rdata.to_text()
-                    if data.endswith('.'):
-                        data = data[:-1]
-                    result.append(data)
-                cname = str(answer.canonical_name)
-                if cname.endswith('.'):  # it will!
-                    cname = cname[:-1]
-                answer = result
-            self.tcex.log.debug(f'Answer: {question} ({cname})= {answer}')
-            self.answers.append((question, cname, answer))
+            with self.stats_lock:
+                self.stats.record('answer' if answer else 'failed', time.perf_counter() - start)
+            self.answers.append(self.answer_result(question, answer))
+
+    def answer_result(self, question, answer):
+        """Return the (question, cname, answers) result of a resolver answer"""
+
+        cname = None
+        if answer:
+            result = []
+            for rdata in answer:
+                data = rdata.to_text()
+                if data.endswith('.'):
+                    data = data[:-1]
+                result.append(data)
+            cname = str(answer.canonical_name)
+            if cname.endswith('.'):  # it will!
+                cname = cname[:-1]
+            answer = result
+        self.tcex.log.debug(f'Answer: {question} ({cname})= {answer}')
+        return (question, cname, answer)
 
     def resolve(self, question, resolver):
         """Resolve ONE question, in the form of (name, rrtype)"""
@@ -0,0 +1,213 @@
+"""Asynchronous DNS resolution engine"""
+
+# standard library
+import asyncio
+import math
+import time
+import traceback
+
+# third-party
+import dns.asyncresolver
+import dns.exception
+import dns.resolver
+
+TIMEOUT = 3
+CONCURRENCY = 32
+NAMESERVER_CONCURRENCY = 8
+
+
+def percentile(values, pct):
+    """Return the pct percentile (nearest rank) of the sorted list of values"""
+
+    if not values:
+        return None
+
+    rank = math.ceil(pct / 100 * len(values))
+    return values[min(max(rank, 1), len(values)) - 1]
+
+
+class ResolverStats:
+    """Throughput and latency statistics for a batch of questions"""
+
+    def __init__(self):
+        """Initialize class properties."""
+
+        self.start = None
+        self.end = None
+        self.latencies = []
+        self.outcomes = {}
+
+    def record(self, outcome, latency):
+        """Record the outcome and latency (in seconds) of one question"""
+
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+        self.latencies.append(latency)
+
+    def summary(self):
+        """Return a dictionary of the statistics"""
+
+        elapsed = (self.end or time.perf_counter()) - (self.start or time.perf_counter())
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+
+        return {
+            'questions': count,
+            'outcomes': dict(sorted(self.outcomes.items())),
+            'elapsed': round(elapsed, 3),
+            'qps': round(count / elapsed, 1) if elapsed > 0 else None,
+            'latency_ms': {
+                name: None if value is None else round(value * 1000, 1)
+                for name, value in (
+                    ('p50', percentile(latencies, 50)),
+                    ('p90', percentile(latencies, 90)),
+                    ('p99', percentile(latencies, 99)),
+                    ('max', latencies[-1] if latencies else None),
+                )
+            },
+        }
+
+
+class AsyncResolverEngine:
+    """Resolve a batch of (name, rrtype) questions with asyncio.
+
+    At most concurrency questions are in flight, taken from a work queue, and at
+    most nameserver_concurrency of those are sent to any one nameserver.  Each
+    question starts at the next nameserver in rotation, and moves on to the
+    following nameserver if one times out or fails, until the timeout for the
+    question is used up.  If throttle (a TokenBucket) is set, a token is
+    acquired for each question.
+    """
+
+    def __init__(
+        self,
+        nameservers,
+        log,
+        concurrency=CONCURRENCY,
+        nameserver_concurrency=NAMESERVER_CONCURRENCY,
+        timeout=TIMEOUT,
+        cache=None,
+        throttle=None,
+        transform_ptr=True,
+        port=53,
+    ):
+        """Initialize class properties."""
+
+        self.nameservers = list(nameservers)
+        self.log = log
+        self.concurrency = max(int(concurrency), 1)
+        self.nameserver_concurrency = max(int(nameserver_concurrency), 1)
+        self.timeout = timeout
+        self.cache = cache
+        self.throttle = throttle
+        self.transform_ptr = transform_ptr
+        self.port = port
+        self.stats = ResolverStats()
+        self.resolvers = None
+        self.limits = None
+
+    def create_resolvers(self):
+        """Create a resolver, and a concurrency limit, per nameserver"""
+
+        self.resolvers = []
+        self.limits = []
+        for nameserver in self.nameservers:
+            resolver = dns.asyncresolver.Resolver(configure=False)
+            resolver.port = self.port  # before the nameservers, which take the port
+            resolver.nameservers = [nameserver]
+            resolver.timeout = self.timeout
+            resolver.cache = self.cache
+            self.resolvers.append(resolver)
+            self.limits.append(asyncio.Semaphore(self.nameserver_concurrency))
+
+    async def query(self, resolver, name, rrtype, lifetime):
+        """Ask one resolver one question"""
+
+        if rrtype == 'PTR' and self.transform_ptr:
+            return await resolver.resolve_address(name, lifetime=lifetime, search=False)
+
+        return await resolver.resolve(name, rrtype, lifetime=lifetime, search=False)
+
+    async def resolve(self, index, question):
+        """Resolve ONE question, returning (answer, outcome)"""
+
+        name, rrtype = question
+        deadline = None
+        count = len(self.resolvers)
+        outcome = 'timeout' if count else 'no_nameservers'
+
+        for attempt in range(count):
+            n = (index + attempt) % count
+            async with self.limits[n]:
+                if deadline is None:
+                    deadline = time.perf_counter() + self.timeout
+                lifetime = deadline - time.perf_counter()
+                if lifetime <= 0:
+                    break
+                try:
+                    return await self.query(self.resolvers[n], name, rrtype, lifetime), 'answer'
+                except dns.exception.Timeout:
+                    self.log.debug(f'Timeout resolving {name} {rrtype} at {self.nameservers[n]}')
+                    outcome = 'timeout'
+                except dns.resolver.NoNameservers:
+                    self.log.debug(
+                        f'No nameservers resolving {name} {rrtype} at {self.nameservers[n]}'
+                    )
+                    outcome = 'no_nameservers'
+                except dns.resolver.NXDOMAIN:
+                    self.log.debug(f'NXDOMAIN resolving {name} {rrtype}')
+                    return None, 'nxdomain'
+                except dns.resolver.YXDOMAIN:
+                    self.log.debug(f'YXDOMAIN resolving {name} {rrtype}')
+                    return None, 'yxdomain'
+                except dns.resolver.NoAnswer:
+                    self.log.debug(f'No answer resolving {name} {rrtype}')
+                    return None, 'no_answer'
+                except Exception as e:
+                    self.log.error(f'Error resolving question: {e}')
+                    self.log.error(traceback.format_exc())
+                    return None, 'error'
+
+        return None, outcome
+
+    async def worker(self, queue, results):
+        """Resolve questions from the work queue until it is empty"""
+
+        while True:
+            try:
+                index, question = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+
+            if self.throttle is not None:
+                await self.throttle.acquire_async()
+
+            start = time.perf_counter()
+            answer, outcome = await self.resolve(index, question)
+            self.stats.record(outcome, time.perf_counter() - start)
+
+            results[index] = answer
+
+    async def run(self, questions):
+        """Resolve the questions, returning the list of answers (or None) in
+        the same order"""
+
+        self.create_resolvers()
+
+        queue = asyncio.Queue()
+        for item in enumerate(questions):
+            queue.put_nowait(item)
+
+        results = [None] * len(questions)
+        workers = min(self.concurrency, len(questions))
+
+        self.stats.start = time.perf_counter()
+        await asyncio.gather(*(self.worker(queue, results) for _ in range(workers)))
+        self.stats.end = time.perf_counter()
+
+        return results
+
+    def resolve_all(self, questions):
+        """Resolve the questions, returning the list of answers (or None) in
+        the same order"""
+
+        return asyncio.run(self.run(questions))
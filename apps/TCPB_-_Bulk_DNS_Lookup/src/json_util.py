@@ -3,9 +3,13 @@
 """Read a JSON document and kick out the equivalent output section of install.json"""
 
 # standard library
+from functools import lru_cache
 from warnings import warn
 
+SNAKE_CACHE_SIZE = 4096
 
+
+@lru_cache(maxsize=SNAKE_CACHE_SIZE)
 def camel2snake(s):
     """Convert a camelCase name to snake_case"""
     o = ''
@@ -102,74 +106,78 @@ def refold(v, prefix, depth=0, collection=None):
     elif isinstance(v, dict) or hasattr(v, 'keys'):
         keys = list(v.keys())
         keys.sort()
+        if prefix:
+            prefix = prefix + '.'
         for key in keys:
             s = v[key]
-            refold(s, f'{prefix}.{key}', depth, collection)
+            refold(s, f'{prefix}{key}', depth, collection)
 
     return collection
 
 
-def conform_objects(object_list, _path=None, _mapping=None, add_missing=False):
-    """Conform objects to a common structure.
-
-    Any simple field which is discovered is remembered, then a second pass through
-    the objects will add any *missing* fields.
+class Schema:
+    """A trie of the paths of keys through nested dictionaries (and lists, which
+    don't add to the path).  Each node has the simple fields found at its path, in
+    the order they were found, and the children of the keys whose values are lists
+    or dictionaries."""
 
-    Returns the conformed object list.
-    """
+    __slots__ = ('fields', 'children')
 
-    if _mapping is None:
-        mapping = set()
-    else:
-        mapping = _mapping
+    def __init__(self):
+        """Initializer"""
 
-    if _path is None:
-        path = []
-    else:
-        path = _path
+        self.fields = {}
+        self.children = {}
 
-    path = path.copy()
+    def child(self, key):
+        """Return the node for key, adding it if necessary"""
 
-    if isinstance(object_list, list):
-        result = []
-        for obj in object_list:
-            result.append(conform_objects(obj, path, mapping, add_missing=add_missing))
+        node = self.children.get(key)
+        if node is None:
+            node = self.children[key] = Schema()
+        return node
 
-        if _mapping is None:
-            result = conform_objects(result, path, mapping, add_missing=True)
 
-        return result
+def infer_schema(ob, schema=None, dicts=None):
+    """Add the paths of ob to the schema (a new Schema if None), in a single pass
+    over ob.  Returns the schema and the list of (dictionary, schema node) of each
+    dictionary in ob, to which dicts is appended if given."""
 
-    if isinstance(object_list, dict):
-        for key, value in object_list.items():
-            path.append(key)
-            if not isinstance(value, (list, dict)):
-                mk = ':'.join(path)
-                if mk not in mapping:
-                    mapping.add(mk)
-            else:
-                object_list[key] = conform_objects(value, path, mapping, add_missing=add_missing)
+    if schema is None:
+        schema = Schema()
+    if dicts is None:
+        dicts = []
 
-            path.pop()
+    if isinstance(ob, list):
+        for value in ob:
+            infer_schema(value, schema, dicts)
+    elif isinstance(ob, dict):
+        dicts.append((ob, schema))
+        fields = schema.fields
+        for key, value in ob.items():
+            if isinstance(value, (list, dict)):
+                infer_schema(value, schema.child(key), dicts)
+            elif key not in fields:
+                fields[key] = None
 
-        if add_missing:
-            add_missing_keys(object_list, path, mapping)
+    return schema, dicts
 
-        if _mapping is None:
-            object_list = conform_objects(object_list, path, mapping, add_missing=True)
 
-    return object_list
+def conform_objects(object_list, missing_value=None):
+    """Conform objects to a common structure.
 
+    Any simple field which is discovered is remembered, then any dictionary at the
+    same path which is missing that field (or has it as None) gets it, with a value
+    of missing_value.
 
-def add_missing_keys(obj: dict, path: list, mapping: set):
-    """Add missing keys to a dictionary-like obj"""
+    Returns the conformed object list.
+    """
 
-    lp = len(path) + 1
+    _, dicts = infer_schema(object_list)
 
-    for key in mapping:
-        key_parts = key.split(':')
+    for ob, node in dicts:
+        for key in node.fields:
+            if ob.get(key) is None:
+                ob[key] = missing_value
 
-        if len(key_parts) == lp and key_parts[:-1] == path:
-            mk = key_parts[-1]
-            if mk not in obj:
-                obj[mk] = None
+    return object_list
@@ -0,0 +1,290 @@
+"""Test the async resolver engine against local stub DNS servers"""
+
+# standard library
+import logging
+import queue
+import socket
+import threading
+import time
+
+# third-party
+import dns.flags
+import dns.message
+import dns.rcode
+import dns.rdatatype
+import dns.resolver
+import dns.rrset
+import pytest
+
+# first-party
+from async_resolver import AsyncResolverEngine, percentile
+
+LOG = logging.getLogger('test_async_resolver')
+
+
+class StubServer:
+    """A UDP DNS server answering A queries for hostN.example with 10.0.x.y,
+    NXDOMAIN for missing.example and nothing at all for drop.example.  If
+    servfail is set, every query gets SERVFAIL.  Responses are sent delay
+    seconds after the query, like a remote server."""
+
+    def __init__(self, address, port=0, servfail=False, delay=0):
+        """init"""
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        self.sock.bind((address, port))
+        self.address, self.port = self.sock.getsockname()
+        self.servfail = servfail
+        self.delay = delay
+        self.queries = 0
+        self.outbox = queue.Queue()
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+        self.sender = threading.Thread(target=self.send, daemon=True)
+        self.sender.start()
+
+    def answer(self, query):
+        """Return the response to query, or None to drop it"""
+
+        response = dns.message.make_response(query)
+        question = query.question[0]
+        name = question.name.to_text()
+
+        if self.servfail:
+            response.set_rcode(dns.rcode.SERVFAIL)
+        elif name == 'drop.example.':
+            return None
+        elif name.startswith('host') and question.rdtype == dns.rdatatype.A:
+            n = int(name[4:].split('.')[0])
+            address = f'10.0.{n // 256}.{n % 256}'
+            response.answer.append(dns.rrset.from_text(name, 60, 'IN', 'A', address))
+        elif name.endswith('.in-addr.arpa.') and question.rdtype == dns.rdatatype.PTR:
+            response.answer.append(dns.rrset.from_text(name, 60, 'IN', 'PTR', 'ptr.example.'))
+        elif name.startswith('host'):
+            pass  # no answer
+        else:
+            response.set_rcode(dns.rcode.NXDOMAIN)
+
+        response.flags |= dns.flags.AA
+        return response
+
+    def serve(self):
+        """Serve queries until the socket is closed"""
+
+        while True:
+            try:
+                wire, peer = self.sock.recvfrom(4096)
+            except OSError:
+                return
+            self.queries += 1
+            response = self.answer(dns.message.from_wire(wire))
+            if response is not None:
+                self.outbox.put((time.perf_counter() + self.delay, response.to_wire(), peer))
+
+    def send(self):
+        """Send the responses when they are due"""
+
+        while True:
+            item = self.outbox.get()
+            if item is None:
+                return
+            due, wire, peer = item
+            time.sleep(max(due - time.perf_counter(), 0))
+            try:
+                self.sock.sendto(wire, peer)
+            except OSError:
+                return
+
+    def close(self):
+        """Stop serving"""
+
+        self.outbox.put(None)
+        self.sock.close()
+
+
+def stub_servers(delay=0):
+    """Two stub servers on the same port"""
+
+    first = StubServer('127.0.0.1', delay=delay)
+    second = StubServer('127.0.0.2', first.port, delay=delay)
+    return first, second
+
+
+@pytest.fixture
+def servers():
+    """Two stub servers on the same port"""
+
+    pair = stub_servers()
+    yield pair
+    for server in pair:
+        server.close()
+
+
+def threaded_resolve(servers, questions, count=4):
+    """Resolve the questions the way the Threaded mode does"""
+
+    work = queue.Queue()
+    for question in questions:
+        work.put(question)
+    answers = []
+
+    def resolver_thread():
+        resolver = dns.resolver.Resolver(configure=False)
+        resolver.port = servers[0].port
+        resolver.nameservers = [server.address for server in servers]
+        resolver.timeout = 3
+        while True:
+            try:
+                name, rrtype = work.get_nowait()
+            except queue.Empty:
+                return
+            answers.append(resolver.resolve(name, rrtype, lifetime=3, search=False))
+
+    threads = [threading.Thread(target=resolver_thread) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return answers
+
+
+def engine(servers, **kwargs):
+    """An engine for the stub servers"""
+
+    return AsyncResolverEngine(
+        [server.address for server in servers], LOG, port=servers[0].port, **kwargs
+    )
+
+
+def texts(answer):
+    """The rdata of an answer as text"""
+
+    return None if answer is None else [rdata.to_text() for rdata in answer]
+
+
+class TestAsyncResolver:
+    """Test the async resolver engine"""
+
+    @staticmethod
+    def test_percentile():
+        """Nearest rank percentiles"""
+
+        values = list(range(1, 101))
+        assert percentile(values, 50) == 50
+        assert percentile(values, 99) == 99
+        assert percentile(values, 100) == 100
+        assert percentile([7], 90) == 7
+        assert percentile([], 50) is None
+
+    @staticmethod
+    def test_answers(servers):
+        """Answers are returned in question order, with outcomes counted"""
+
+        questions = [
+            ('host1.example', 'A'),
+            ('missing.example', 'A'),
+            ('host2.example', 'MX'),
+            ('10.0.0.1', 'PTR'),
+            ('host258.example', 'A'),
+        ]
+        resolver = engine(servers, concurrency=4)
+        answers = resolver.resolve_all(questions)
+
+        assert [texts(x) for x in answers] == [
+            ['10.0.0.1'],
+            None,
+            None,
+            ['ptr.example.'],
+            ['10.0.1.2'],
+        ]
+        stats = resolver.stats.summary()
+        assert stats['questions'] == 5
+        assert stats['outcomes'] == {'answer': 3, 'no_answer': 1, 'nxdomain': 1}
+        assert stats['latency_ms']['p50'] <= stats['latency_ms']['max']
+
+    @staticmethod
+    def test_failover(servers):
+        """A failing nameserver falls through to the next one"""
+
+        servers[0].servfail = True
+        resolver = engine(servers)
+        answers = resolver.resolve_all([(f'host{n}.example', 'A') for n in range(20)])
+
+        assert all(answer is not None for answer in answers)
+        assert servers[0].queries >= 10
+
+    @staticmethod
+    def test_timeout(servers):
+        """A question that times out doesn't hold up the others"""
+
+        resolver = engine(servers, timeout=0.5, concurrency=8)
+        questions = [('drop.example', 'A')] * 4 + [(f'host{n}.example', 'A') for n in range(100)]
+
+        start = time.perf_counter()
+        answers = resolver.resolve_all(questions)
+        elapsed = time.perf_counter() - start
+
+        assert answers[:4] == [None] * 4
+        assert all(answer is not None for answer in answers[4:])
+        assert resolver.stats.outcomes['timeout'] == 4
+        assert elapsed < 2
+
+    @staticmethod
+    def test_nameserver_concurrency(servers):
+        """No more than nameserver_concurrency queries go to one nameserver"""
+
+        active = {}
+        peak = {}
+
+        class CountingEngine(AsyncResolverEngine):
+            """Track the queries in flight to each nameserver"""
+
+            async def query(self, resolver, name, rrtype, lifetime):
+                """query"""
+
+                key = resolver.nameservers[0]
+                active[key] = active.get(key, 0) + 1
+                peak[key] = max(peak.get(key, 0), active[key])
+                try:
+                    return await super().query(resolver, name, rrtype, lifetime)
+                finally:
+                    active[key] -= 1
+
+        resolver = CountingEngine(
+            [server.address for server in servers],
+            LOG,
+            concurrency=64,
+            nameserver_concurrency=3,
+            port=servers[0].port,
+        )
+        resolver.resolve_all([(f'host{n}.example', 'A') for n in range(300)])
+
+        assert len(peak) == 2
+        assert max(peak.values()) == 3
+
+    @staticmethod
+    def test_throughput():
+        """Queries per second at 10k questions, from servers with 10ms latency,
+        against the Threaded mode"""
+
+        servers = stub_servers(delay=0.01)
+        try:
+            questions = [(f'host{n}.example', 'A') for n in range(10000)]
+
+            start = time.perf_counter()
+            threaded_resolve(servers, questions[:1000])
+            before = 1000 / (time.perf_counter() - start)
+
+            resolver = engine(servers, concurrency=64, nameserver_concurrency=32)
+            answers = resolver.resolve_all(questions)
+        finally:
+            for server in servers:
+                server.close()
+
+        assert all(answer is not None for answer in answers)
+        stats = resolver.stats.summary()
+        print(
+            f"\n10k questions: {before:.0f} -> {stats['qps']:.0f} queries/sec, "
+            f"latency p50 {stats['latency_ms']['p50']}ms p99 {stats['latency_ms']['p99']}ms"
+        )
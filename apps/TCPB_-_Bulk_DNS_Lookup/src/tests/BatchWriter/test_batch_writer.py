@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+"""Batched output writes"""
+
+# standard library
+import contextlib
+import json
+import logging
+from types import SimpleNamespace
+
+# third-party
+import tcex
+from tcex.key_value_store import KeyValueRedis
+from tcex.playbooks import Playbooks
+
+# first-party
+import app as app_module
+from app import App
+from batch_writer import BatchWriter, batched_writes
+
+CONTEXT = 'c0ffee00-4a56-4f1f-a1a2-3b9c3b1e0c6f'
+
+OUTPUT_VARIABLES = [
+    '#App:1234:dns.action!String',
+    '#App:1234:dns.invalid!StringArray',
+    '#App:1234:dns.result.json!String',
+    '#App:1234:dns.stats!String',
+    '#App:1234:dns.valid!StringArray',
+]
+
+
+class FakePipeline:
+    """Pipeline of the FakeRedis client"""
+
+    def __init__(self, client):
+        """Initialize class properties."""
+
+        self.client = client
+        self.commands = []
+
+    def hset(self, name, key=None, value=None, mapping=None):
+        """Queue an HSET"""
+
+        self.commands.append((name, key, value, mapping))
+        return self
+
+    def execute(self):
+        """Send the queued commands, in one round trip"""
+
+        self.client.round_trips += 1
+        for command in self.commands:
+            self.client.store(*command)
+        self.commands = []
+
+
+class FakeRedis:
+    """In-memory stand-in for the redis client, counting round trips"""
+
+    def __init__(self):
+        """Initialize class properties."""
+
+        self.hashes = {}
+        self.round_trips = 0
+
+    def store(self, name, key=None, value=None, mapping=None):
+        """Set the fields of a hash"""
+
+        values = dict(mapping or {})
+        if key is not None:
+            values[key] = value
+        for key, value in values.items():
+            if isinstance(value, str):
+                value = value.encode('utf-8')
+            self.hashes.setdefault(name, {})[key] = value
+        return len(values)
+
+    def hset(self, name, key=None, value=None, mapping=None):
+        """HSET"""
+
+        self.round_trips += 1
+        return self.store(name, key, value, mapping)
+
+    def hget(self, name, key):
+        """HGET"""
+
+        self.round_trips += 1
+        return self.hashes.get(name, {}).get(key)
+
+    def pipeline(self, transaction=True):  # pylint: disable=unused-argument
+        """A pipeline"""
+
+        return FakePipeline(self)
+
+
+class TcEx(tcex.TcEx):
+    """The parts of TcEx used by the App.  key_value_store is tcex's own, which
+    returns the store the App sets in its place."""
+
+    log = rargs = playbook = None
+
+    def __init__(self, client, output_variables=None):  # pylint: disable=super-init-not-called
+        """Initialize class properties."""
+
+        self.log = logging.getLogger('test_batch_writer')
+        self.rargs = SimpleNamespace(tc_action='Lookup DNS')
+        self._key_value_store = KeyValueRedis(client)
+        self.playbook = Playbooks(self, CONTEXT, output_variables or [])
+        self.exits = []
+        setattr(self.playbook, 'exit', lambda code, message: self.exits.append((code, message)))
+
+
+def make_app(client):
+    """A Lookup DNS App with outputs to write"""
+
+    app = App.__new__(App)
+    app.tcex = TcEx(client, OUTPUT_VARIABLES)
+    app.outputs = []
+    app.exit_code = 0
+    app.exit_message = 'Success.'
+    app.add_output('dns.result.json', [{'question': 'example.com', 'A': ['93.184.216.34']}], True)
+    app.add_output('dns.valid', ['example.com', 'example.net'])
+    app.add_output('dns.invalid', ['not a name'])
+    app.add_output('dns.stats', {'questions': 2, 'qps': 10.0}, True)
+    app.add_output('dns.action', lambda: app.tcex.rargs.tc_action)
+    return app
+
+
+class TestBatchWriter:
+    """Test Batch Writer"""
+
+    @staticmethod
+    def test_flush():
+        """Writes are pending until the flush, which is one round trip"""
+
+        client = FakeRedis()
+        tcex = TcEx(client)
+        store = tcex.key_value_store
+
+        with batched_writes(tcex) as writer:
+            assert tcex.key_value_store is writer
+            writer.create(CONTEXT, 'one', '"1"')
+            writer.create(CONTEXT, 'two', '"2"')
+            writer.create('other', 'three', '"3"')
+            assert writer.read(CONTEXT, 'one') == '"1"'
+            assert client.round_trips == 0
+
+        assert tcex.key_value_store is store
+        assert client.hashes == {
+            CONTEXT: {'one': b'"1"', 'two': b'"2"'},
+            'other': {'three': b'"3"'},
+        }
+        assert client.round_trips == 1
+        assert writer.stats() == {'writes': 3, 'bytes': 9, 'round_trips': 1}
+
+    @staticmethod
+    def test_flush_on_exception():
+        """Pending writes are flushed when the block raises"""
+
+        client = FakeRedis()
+        tcex = TcEx(client)
+
+        with contextlib.suppress(SystemExit), batched_writes(tcex) as writer:
+            writer.create(CONTEXT, 'one', '"1"')
+            raise SystemExit(1)
+
+        assert client.hashes == {CONTEXT: {'one': b'"1"'}}
+
+    @staticmethod
+    def test_no_client():
+        """Without a redis client, the values are written one at a time"""
+
+        written = []
+        store = SimpleNamespace(create=lambda *args: written.append(args))
+        writer = BatchWriter(store)
+        writer.create(CONTEXT, 'one', '"1"')
+        writer.create(CONTEXT, 'two', '"2"')
+        writer.flush()
+
+        assert written == [(CONTEXT, 'one', '"1"'), (CONTEXT, 'two', '"2"')]
+        assert writer.round_trips == 2
+
+    @staticmethod
+    def test_write_output(monkeypatch):
+        """Identical outputs, round trips before and after"""
+
+        client = FakeRedis()
+        app = make_app(client)
+        with monkeypatch.context() as patch:
+            patch.setattr(
+                app_module, 'batched_writes', lambda tcex: contextlib.nullcontext(BatchWriter(None))
+            )
+            app.write_output()
+        expected = client.hashes
+        before = client.round_trips
+
+        client = FakeRedis()
+        app = make_app(client)
+        app.write_output()
+        after = client.round_trips
+
+        assert client.hashes == expected
+        assert len(expected[CONTEXT]) == len(OUTPUT_VARIABLES)
+        assert json.loads(expected[CONTEXT]['#App:1234:dns.valid!StringArray']) == [
+            'example.com',
+            'example.net',
+        ]
+        assert app.tcex.exits == [(0, 'Success.')]
+        assert before == len(OUTPUT_VARIABLES)
+        assert after == 1
+        print(f'\nLookup DNS outputs: {before} -> {after} round trips per run')
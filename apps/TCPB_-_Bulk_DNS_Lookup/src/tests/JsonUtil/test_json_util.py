@@ -0,0 +1,140 @@
+"""Benchmark conforming and refolding DNS results with an inferred schema"""
+
+# standard library
+import copy
+import random
+
+# third-party
+import pytest
+
+# first-party
+import json_util
+from json_util import camel2snake, conform_objects, infer_schema, refold
+
+RECORDS = 10000
+
+
+def dns_results(records=RECORDS):
+    """DNS results, with the fields that a lookup didn't find left out"""
+
+    rng = random.Random(29)
+    results = []
+    for n in range(records):
+        result = {'question': f'host{n}.example.com', 'rrType': rng.choice(['A', 'AAAA', 'MX'])}
+        if rng.random() < 0.7:
+            result['answers'] = [f'10.{n % 256}.0.{i}' for i in range(rng.randrange(1, 4))]
+            result['ttl'] = rng.randrange(60, 3600)
+        if rng.random() < 0.2:
+            result['cName'] = f'alias{n}.example.net'
+        result['stats'] = {'elapsedMs': rng.randrange(1, 200)}
+        if rng.random() < 0.1:
+            result['stats']['retryCount'] = rng.randrange(1, 3)
+        results.append(result)
+    return results
+
+
+def legacy_conform_objects(object_list, _path=None, _mapping=None, add_missing=False):
+    """conform_objects() as it was, remembering the paths as strings and adding the
+    missing keys in a second pass"""
+
+    mapping = set() if _mapping is None else _mapping
+    path = [] if _path is None else _path.copy()
+
+    if isinstance(object_list, list):
+        result = [legacy_conform_objects(obj, path, mapping, add_missing) for obj in object_list]
+        if _mapping is None:
+            result = legacy_conform_objects(result, path, mapping, True)
+        return result
+
+    if isinstance(object_list, dict):
+        for key, value in object_list.items():
+            path.append(key)
+            if not isinstance(value, (list, dict)):
+                mapping.add(':'.join(path))
+            else:
+                object_list[key] = legacy_conform_objects(value, path, mapping, add_missing)
+            path.pop()
+
+        if add_missing:
+            for key in mapping:
+                key_parts = key.split(':')
+                if len(key_parts) == len(path) + 1 and key_parts[:-1] == path:
+                    if key_parts[-1] not in object_list:
+                        object_list[key_parts[-1]] = None
+
+        if _mapping is None:
+            object_list = legacy_conform_objects(object_list, path, mapping, True)
+
+    return object_list
+
+
+class TestJsonUtil:
+    """Benchmark conforming and refolding DNS results"""
+
+    @staticmethod
+    def test_conform_objects():
+        """Identical results"""
+
+        results = dns_results()
+
+        expected = legacy_conform_objects(copy.deepcopy(results))
+        conformed = conform_objects(copy.deepcopy(results))
+
+        assert conformed == expected
+        fields = {'question', 'rrType', 'ttl', 'cName', 'stats'}
+        assert all(set(result) - {'answers'} == fields for result in conformed)
+        assert all(set(result['stats']) == {'elapsedMs', 'retryCount'} for result in conformed)
+
+    @staticmethod
+    def test_refold():
+        """Every record is refolded into the columns"""
+
+        result = refold(conform_objects(dns_results()), 'dns.result')
+
+        assert len(result['dns.result.question']) == RECORDS
+        assert len(result['dns.result.c_name']) == RECORDS
+        assert len(result['dns.result.stats.retry_count']) == RECORDS
+
+    @staticmethod
+    @pytest.mark.benchmark
+    def test_conform_objects_time(timed, record_property):
+        """Time before and after"""
+
+        results = dns_results()
+
+        _, before = timed(legacy_conform_objects, copy.deepcopy(results))
+        _, after = timed(conform_objects, copy.deepcopy(results))
+
+        record_property(
+            'benchmark',
+            f'conform_objects x {RECORDS}: {before * 1000:.0f} -> {after * 1000:.0f} ms',
+        )
+
+    @staticmethod
+    @pytest.mark.benchmark
+    def test_refold_time(monkeypatch, timed, record_property):
+        """Identical outputs, and time with and without the camel2snake cache"""
+
+        conformed = conform_objects(dns_results())
+
+        with monkeypatch.context() as patch:
+            patch.setattr(json_util, 'camel2snake', camel2snake.__wrapped__)
+            expected, before = timed(refold, conformed, 'dns.result')
+        camel2snake.cache_clear()
+        result, after = timed(refold, conformed, 'dns.result')
+
+        assert result == expected
+        record_property(
+            'benchmark', f'refold x {RECORDS}: {before * 1000:.0f} -> {after * 1000:.0f} ms'
+        )
+
+    @staticmethod
+    def test_schema():
+        """The schema has the fields of each path in the order they were found"""
+
+        schema, dicts = infer_schema(dns_results(100))
+
+        assert list(schema.fields) == ['question', 'rrType', 'ttl', 'cName']
+        assert list(schema.children) == ['answers', 'stats']
+        assert list(schema.children['stats'].fields) == ['elapsedMs', 'retryCount']
+        assert len(dicts) == 200
@@ -8,7 +8,11 @@ import traceback
 
 from lark_expr import Expression
 from argcheck import tc_argcheck
+from batch_writer import batched_writes
+from methods import compile_jmespath, compile_regex
+from prefetch import PrefetchStore
 from trap_exception import trap
+from vectorize import evaluate_columns
 
 # Import default Playbook Class (Required)
 from playbook_app import PlaybookApp
@@ -132,6 +136,34 @@ class App(PlaybookApp):
         if force_exit or not return_none_on_failure:
             self.tcex.playbook.exit(1, str(exception))
 
+    def prefetch(self, *varnames):
+        """Read the TC variables used by the named args (KeyValueLists of
+        expressions, or an expression) in bulk: one read for the args, and one
+        for the variables referenced by their expressions"""
+
+        try:
+            store = self.tcex.key_value_store
+            if not isinstance(store, PrefetchStore):
+                store = PrefetchStore(store)
+                # as in batched_writes, tcex.key_value_store returns _key_value_store
+                setattr(self.tcex, '_key_value_store', store)
+
+            args = [tc_argcheck(self.tcex.args, varname, tcex=self.tcex) for varname in varnames]
+            count = self.engine.prefetch(args)
+
+            expressions = []
+            for arg in args:
+                if arg:
+                    for item in self.tcex.playbook.read(arg, array=True, embedded=False):
+                        if isinstance(item, dict):
+                            expressions.append(item.get('value'))
+            count += self.engine.prefetch(expressions)
+        except Exception as e:
+            self.tcex.log.debug(f'Unable to prefetch variables: {e}')
+            return
+
+        self.tcex.log.debug(f'Prefetched {count} variables in {store.round_trips} round trips')
+
     def setup_loops(self, varname):
         """Read the Key Value Array in, and setup iter_control"""
 
@@ -245,27 +277,15 @@ class App(PlaybookApp):
             self.tcex.log.debug(f'... {name} = {value!r}')
             self.engine.set(name, value)
 
-    def loop_over_iter(self, iter_control, exprs=None):
-        """Loop over iter_control variables, returns a dict of outputs"""
-
-        if exprs is None:
-            exprs = {}
-
-        if isinstance(exprs, str):
-            exprs = {'output': exprs}
-
-        for key in exprs:
-            self.tcex.log.debug(f'Loop expression "{key}": "{exprs[key]}"')
-
-        outdict = {}
+    def iterations(self, iter_control):
+        """Walk iter_control, returning a list of the loop variables to set for
+        each iteration, and the variables set by the final (completing) pass"""
 
         looping = True
         loopcount = 0
         get_next = False
-
-        # 1.0.6 -- set individual loop values with leading underscore to None
-        for key in exprs:
-            self.engine.set('_' + key, None)
+        rows = []
+        updates = {}
 
         while looping:
             # t  Trackers are ordered from shortest to longest
@@ -275,6 +295,7 @@ class App(PlaybookApp):
             if loopcount:
                 get_next = True
             self.tcex.log.trace('***Calculating next iteration***')
+            updates = {}
             while this_iter:
                 tracker = this_iter.pop(0)
 
@@ -294,39 +315,120 @@ class App(PlaybookApp):
                         looping = False
 
                 if vars_:
-                    for key, value in vars_.items():
-                        self.tcex.log.trace(f'Setting value {key} to {value!r}')
-                        self.engine.set(key, value)
+                    updates.update(vars_)
 
             if looping or loopcount == 0:
-                for expr_key, expr_value in exprs.items():
-                    self.tcex.log.trace(f'Evaluating... {expr_key} = {expr_value}')
-                    try:
-                        result = self.engine.eval(expr_value)
-                    except Exception as e:
-                        result = self.handle_exception(f'Evaluation of "{expr_key}" failed: {e}')
-                    self.tcex.log.trace(f'... = {result!r}')
-
-                    # 1.0.6 -- add individual loop result with leading underscore
-                    self.engine.set('_' + expr_key, result)
-
-                    out = outdict.get(expr_key, [])
-
-                    # 1.0.6 - Don't flatten tuples, just lists
-                    if isinstance(result, list):
-                        out.extend(result)
-                    else:
-                        out.append(result)
-                    outdict[expr_key] = out
+                rows.append(updates)
+                updates = {}
 
             loopcount += 1
 
+        return rows, updates
+
+    def loop_vectorized(self, iterations, exprs):
+        """Evaluate the loop expressions a column at a time, if they are all
+        vectorizable.  Returns a dict of outputs, or None if the loop must be
+        evaluated one iteration at a time."""
+
+        if not iterations or not iterations[0]:
+            return None
+
+        columns = {}
+        current = {}
+        for updates in iterations:
+            current.update(updates)
+            for key, value in current.items():
+                columns.setdefault(key, []).append(value)
+
+        excluded = {'_' + key for key in exprs}
+
+        results = {}
+        for expr_key, expr_value in exprs.items():
+            result = evaluate_columns(self.engine, expr_value, columns, excluded)
+            if result is None:
+                return None
+            results[expr_key] = result
+
+        outdict = {}
+        for expr_key, result in results.items():
+            self.tcex.log.debug(f'Vectorized loop expression "{expr_key}"')
+            out = []
+            for value in result:
+                # 1.0.6 - Don't flatten tuples, just lists
+                if isinstance(value, list):
+                    out.extend(value)
+                else:
+                    out.append(value)
+            outdict[expr_key] = out
+            self.engine.set('_' + expr_key, result[-1])
+
+        for key, value in current.items():
+            self.engine.set(key, value)
+
+        return outdict
+
+    def loop_over_iter(self, iter_control, exprs=None):
+        """Loop over iter_control variables, returns a dict of outputs"""
+
+        if exprs is None:
+            exprs = {}
+
+        if isinstance(exprs, str):
+            exprs = {'output': exprs}
+
+        for key in exprs:
+            self.tcex.log.debug(f'Loop expression "{key}": "{exprs[key]}"')
+
+        # 1.0.6 -- set individual loop values with leading underscore to None
+        for key in exprs:
+            self.engine.set('_' + key, None)
+
+        iterations, remainder = self.iterations(iter_control)
+
+        outdict = self.loop_vectorized(iterations, exprs)
+        if outdict is not None:
+            for key, value in remainder.items():
+                self.engine.set(key, value)
+            return outdict
+
+        outdict = {}
+
+        for updates in iterations:
+            for key, value in updates.items():
+                self.tcex.log.trace(f'Setting value {key} to {value!r}')
+                self.engine.set(key, value)
+
+            for expr_key, expr_value in exprs.items():
+                self.tcex.log.trace(f'Evaluating... {expr_key} = {expr_value}')
+                try:
+                    result = self.engine.eval(expr_value)
+                except Exception as e:
+                    result = self.handle_exception(f'Evaluation of "{expr_key}" failed: {e}')
+                self.tcex.log.trace(f'... = {result!r}')
+
+                # 1.0.6 -- add individual loop result with leading underscore
+                self.engine.set('_' + expr_key, result)
+
+                out = outdict.get(expr_key, [])
+
+                # 1.0.6 - Don't flatten tuples, just lists
+                if isinstance(result, list):
+                    out.extend(result)
+                else:
+                    out.append(result)
+                outdict[expr_key] = out
+
+        for key, value in remainder.items():
+            self.engine.set(key, value)
+
         return outdict
 
     @trap()
     def Evaluate(self):
         """Evaluate an expression"""
 
+        self.prefetch('expression')
+
         expr = tc_argcheck(self.tcex.args, 'expression', required=True, tcex=self.tcex)
         try:
             self.expression = self.tcex.playbook.read(expr, embedded=True)
@@ -350,6 +452,8 @@ class App(PlaybookApp):
     def evaluate_in_loop(self):
         """Evaluate an expression in a loop"""
 
+        self.prefetch('loop_variables', 'loop_expression')
+
         iter_control = self.setup_loops('loop_variables')
 
         expr = tc_argcheck(
@@ -370,6 +474,20 @@ class App(PlaybookApp):
     def evaluate_many(self):
         """Evaluate many expressions"""
 
+        self.prefetch(
+            'variables',
+            'outputs',
+            'stringarray_outputs',
+            'binary_outputs',
+            'binary_array_outputs',
+            'kv_outputs',
+            'kv_array_outputs',
+            'tce_outputs',
+            'tce_array_outputs',
+            'tcee_outputs',
+            'tcee_array_outputs',
+        )
+
         self.setup_vars('variables')
         self.setup_outputs('outputs')
         self.setup_outputs('stringarray_outputs', required=False, output_type='StringArray')
@@ -388,6 +506,22 @@ class App(PlaybookApp):
     def evaluate_many_with_loop(self):
         """Evaluate many expressions with loop variables"""
 
+        self.prefetch(
+            'variables',
+            'loop_variables',
+            'loop_expressions',
+            'additional_outputs',
+            'stringarray_outputs',
+            'binary_outputs',
+            'binary_array_outputs',
+            'kv_outputs',
+            'kv_array_outputs',
+            'tce_outputs',
+            'tce_array_outputs',
+            'tcee_outputs',
+            'tcee_array_outputs',
+        )
+
         self.setup_vars('variables')
         iter_control = self.setup_loops('loop_variables')
 
@@ -468,19 +602,42 @@ class App(PlaybookApp):
         configuration file.
         """
 
-        self.tcex.playbook.create_output('expression.action', self.tcex.args.tc_action, 'String')
-        if self.expression:
+        # the outputs are written together, rather than one at a time
+        with batched_writes(self.tcex) as writer:
             self.tcex.playbook.create_output(
-                'expression.expression', str(self.expression), 'String'
+                'expression.action', self.tcex.args.tc_action, 'String'
             )
-        if self.output:
-            self.write_one('expression.result.0', self.output[0], 'String')
-            self.write_one('expression.result.array', self.output, 'StringArray')
-        if self.outlist:
-            for name, value, output_type in self.outlist:
-                self.write_one(name, value, output_type)
-        if self.outloop:
-            for name, value in self.outloop.items():
-                self.write_one(name, value, 'StringArray')
-        if self.errors:
-            self.tcex.playbook.create_output('expression.errors', self.errors, 'StringArray')
+            if self.expression:
+                self.tcex.playbook.create_output(
+                    'expression.expression', str(self.expression), 'String'
+                )
+            if self.output:
+                self.write_one('expression.result.0', self.output[0], 'String')
+                self.write_one('expression.result.array', self.output, 'StringArray')
+            if self.outlist:
+                for name, value, output_type in self.outlist:
+                    self.write_one(name, value, output_type)
+            if self.outloop:
+                for name, value in self.outloop.items():
+                    self.write_one(name, value, 'StringArray')
+            if self.errors:
+                self.tcex.playbook.create_output('expression.errors', self.errors, 'StringArray')
+
+        self.tcex.log.info(
+            f'Wrote {writer.writes} outputs ({writer.bytes} bytes) '
+            f'in {writer.round_trips} round trips'
+        )
+
+    def teardown(self):
+        """Perform cleanup/teardown logic."""
+
+        cache = getattr(self.engine, 'indicator_types_cache', None)
+        if cache is not None:
+            self.tcex.log.info(f'Indicator type cache {cache.path}: {cache.stats}')
+
+        self.tcex.log.info(
+            f'Compile caches: regex {compile_regex.cache_info()}, '
+            f'jmespath {compile_jmespath.cache_info()}'
+        )
+
+        super().teardown()
@@ -0,0 +1,96 @@
+"""Batched playbook output writes
+
+Each playbook output is written to the key value store by its own create call,
+so an App with hundreds of outputs pays a round trip for each of them.  Within
+batched_writes(), the (validated and serialized) values are collected instead,
+and flushed when it exits: with the Redis key value store, as one pipelined
+HSET per context.  The TC key value API has no bulk write, so the values are
+then written one at a time.
+"""
+
+# standard library
+from contextlib import contextmanager
+
+
+class BatchWriter:
+    """Key value store collecting writes to flush at once"""
+
+    def __init__(self, store):
+        """Initialize class properties."""
+
+        self.store = store
+        self.pending = {}  # context: {key: value}
+
+        # counters
+        self.writes = 0
+        self.bytes = 0
+        self.round_trips = 0
+
+    def __getattr__(self, name):
+        """Pass any other methods through to the store"""
+
+        return getattr(self.store, name)
+
+    def create(self, context, key, value):
+        """Collect a write; a later write to the same key replaces it"""
+
+        self.pending.setdefault(context, {})[key] = value
+
+    def read(self, context, key, *args, **kwargs):
+        """Read the value for key, including pending writes"""
+
+        value = self.pending.get(context, {}).get(key)
+        if value is not None:
+            return value
+        return self.store.read(context, key, *args, **kwargs)
+
+    def flush(self):
+        """Write the pending values"""
+
+        pending, self.pending = self.pending, {}
+        if not pending:
+            return
+
+        for values in pending.values():
+            self.writes += len(values)
+            for value in values.values():
+                if isinstance(value, str):
+                    value = value.encode('utf-8')
+                self.bytes += len(value)
+
+        # KeyValueRedis doesn't wrap pipelines, so use its client
+        client = getattr(self.store, '_redis_client', None)
+        if client is None:
+            for context, values in pending.items():
+                for key, value in values.items():
+                    self.store.create(context, key, value)
+                    self.round_trips += 1
+            return
+
+        pipeline = client.pipeline(transaction=False)
+        for context, values in pending.items():
+            pipeline.hset(context, mapping=values)
+        pipeline.execute()
+        self.round_trips += 1
+
+    def stats(self):
+        """Return a dictionary of the counters"""
+
+        return {'writes': self.writes, 'bytes': self.bytes, 'round_trips': self.round_trips}
+
+
+@contextmanager
+def batched_writes(tcex):
+    """Collect the playbook writes made within the block, and flush them
+    when it exits (even by an exception, e.g. from playbook.exit)"""
+
+    store = tcex.key_value_store
+    writer = BatchWriter(store)
+    # tcex.key_value_store is a read-only property returning _key_value_store
+    # (as of the tcex version pinned in requirements.txt)
+    setattr(tcex, '_key_value_store', writer)
+    try:
+        yield writer
+    finally:
+        setattr(tcex, '_key_value_store', store)
+        writer.flush()
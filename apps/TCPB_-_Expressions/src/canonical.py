@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""Canonical keys for comparing values
+
+Two values have the same canonical key when they serialize to the same sorted
+JSON, e.g. dictionaries with the same keys and values in a different order, or
+a list and a tuple with the same items.  The key is built without serializing:
+strings (the common case) are their own key, other scalars are tagged with
+their type, so that 1, 1.0 and True stay distinct, and dictionaries and lists
+become frozensets and tuples of the keys of their contents, which Python hashes
+structurally.
+"""
+
+import json
+
+# the key JSON gives to a non-string dictionary key
+_JSON_KEYS = {True: 'true', False: 'false', None: 'null'}
+
+_BOOL_KEYS = {True: (bool, True), False: (bool, False)}
+
+
+def _json_key(key):
+    """The string JSON uses for a dictionary key"""
+
+    if isinstance(key, str):
+        return key
+    if key is None or isinstance(key, bool):
+        return _JSON_KEYS[key]
+    if isinstance(key, float):
+        return json.dumps(key)
+    return str(key)
+
+
+def canonical_key(value):
+    """Return a hashable key for value, equal to the key of any value that
+    serializes to the same sorted JSON"""
+
+    kind = type(value)
+    if kind is str or value is None:
+        return value
+    if kind is dict:
+        # strings are inlined, as most keys and many values are strings
+        return (
+            dict,
+            frozenset(
+                [
+                    (
+                        k if type(k) is str else _json_key(k),
+                        v if type(v) is str else canonical_key(v),
+                    )
+                    for k, v in value.items()
+                ]
+            ),
+        )
+    if kind is list or kind is tuple:
+        return (list, tuple([v if type(v) is str else canonical_key(v) for v in value]))
+    if kind is bool:
+        return _BOOL_KEYS[value]
+    if kind is int:
+        return (int, value)
+
+    # subclasses, and the rarer types
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return _BOOL_KEYS[value]
+    if isinstance(value, int):
+        return (int, int(value))
+    if isinstance(value, float):
+        # JSON tells -0.0 from 0.0, and writes every NaN the same way
+        return (float, repr(value))
+    if isinstance(value, dict):
+        return canonical_key(dict(value))
+    if isinstance(value, (list, tuple)):
+        return canonical_key(list(value))
+
+    return (object, json.dumps(value, sort_keys=True, ensure_ascii=False))
+
+
+def unique(values):
+    """Return the values without duplicates, keeping the first of each"""
+
+    seen = set()
+    result = []
+    for value in values:
+        key = value if type(value) is str else canonical_key(value)
+        if key not in seen:
+            seen.add(key)
+            result.append(value)
+
+    return result
+
+
+def key_set(values):
+    """Return the set of canonical keys of values"""
+
+    return set(map(canonical_key, values))
+
+
+def group(values, by=None):
+    """Return a dictionary of canonical key: (group value, [values]), in the
+    order the groups were first seen, where by(value) is the value to group
+    by (the value itself by default)"""
+
+    groups = {}
+    for value in values:
+        group_value = value if by is None else by(value)
+        key = canonical_key(group_value)
+        try:
+            groups[key][1].append(value)
+        except KeyError:
+            groups[key] = (group_value, [value])
+
+    return groups
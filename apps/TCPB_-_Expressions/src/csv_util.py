@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""CSV Parsing Utilities
+
+Records are read as they are needed, so only as many as are asked for are
+parsed.  Numeric values are converted by a converter per column, chosen from a
+sample of the records: a column of integers is converted by int(), a column of
+numbers by float(), and a column of text only tries a conversion for values
+that could be numbers.  Every converter falls back to convert_value() for a
+value it doesn't expect, so the result doesn't depend on the sample.
+"""
+
+# standard library
+import csv
+from io import BytesIO, TextIOWrapper
+from itertools import islice
+
+SAMPLE_ROWS = 100
+
+# integers beyond this are returned as floats, as float() doesn't hold them exactly
+MAX_EXACT_INT = 1 << 53
+
+
+def convert_value(value: str):
+    """Return value as an int or float if it is a number, otherwise as-is"""
+
+    try:
+        f = float(value)
+    except ValueError:
+        return value
+
+    try:
+        i = int(value)
+    except ValueError:
+        return f
+
+    if i != f:
+        return f
+    return i
+
+
+def convert_int(value: str):
+    """convert_value() for a column of integers"""
+
+    try:
+        i = int(value)
+    except ValueError:
+        return convert_value(value)
+
+    if -MAX_EXACT_INT <= i <= MAX_EXACT_INT:
+        return i
+    return convert_value(value)
+
+
+def convert_float(value: str):
+    """convert_value() for a column of numbers"""
+
+    try:
+        f = float(value)
+    except ValueError:
+        return value
+
+    if f.is_integer():
+        return convert_value(value)  # 2 or 2.0
+    return f
+
+
+def convert_text(value: str):
+    """convert_value() for a column of text"""
+
+    # only infinity and nan are numbers starting with a letter
+    if not value or value[0].isalpha() and value[0] not in 'iInN':
+        return value
+    return convert_value(value)
+
+
+def column_converter(values: list):
+    """Return the converter for a column with the sample values"""
+
+    kinds = {type(convert_value(value)) for value in values}
+    if kinds == {int}:
+        return convert_int
+    if kinds and kinds <= {int, float}:
+        return convert_float
+    return convert_text
+
+
+def convert_records(records, sample_rows=SAMPLE_ROWS):
+    """Convert the values of the (lists of) records, choosing the converter
+    for each column from the first sample_rows records"""
+
+    records = iter(records)
+    sample = list(islice(records, sample_rows))
+    width = max((len(record) for record in sample), default=0)
+    converters = [
+        column_converter([record[n] for record in sample if n < len(record)]) for n in range(width)
+    ]
+
+    for record in sample:
+        yield [convert(value) for convert, value in zip(converters, record)] + [
+            convert_value(value) for value in record[width:]
+        ]
+
+    for record in records:
+        result = [convert(value) for convert, value in zip(converters, record)]
+        if len(record) > width:
+            result.extend(convert_value(value) for value in record[width:])
+        yield result
+
+
+def lines(data: str):
+    """Iterate over the lines of data, like a StringIO, without copying all
+    of it first"""
+
+    start = 0
+    while True:
+        end = data.find('\n', start) + 1
+        if not end:
+            if start < len(data):
+                yield data[start:]
+            return
+        yield data[start:end]
+        start = end
+
+
+def read_csv(data, header=False, convert=True, delimiter=',', quote='"', rows=0, columns=0):
+    """Return (names, records): the header record if header is true (else
+    None), and an iterator of the other records (lists of values) of the CSV
+    data.  If rows or columns is nonzero, the records are truncated to that
+    number of rows or columns.  If convert is true, numeric values are
+    converted to numbers."""
+
+    if isinstance(data, bytes):
+        buffer = TextIOWrapper(BytesIO(data), encoding='utf-8', newline='\n')
+    else:
+        buffer = lines(data)
+
+    records = csv.reader(buffer, delimiter=delimiter, quotechar=quote)
+    names = None
+    if header:
+        names = next(records, None)
+    if rows:
+        records = islice(records, rows)
+    if columns:
+        if names is not None:
+            names = names[:columns]
+        records = (record[:columns] for record in records)
+    if convert:
+        records = convert_records(records)
+
+    return names, records
+
+
+def columnar(records, names=None):
+    """Return a dictionary of the columns of the records, keyed by the names,
+    or by column number for columns without a name.  Short records are padded
+    with None."""
+
+    if names is not None and len(set(names)) != len(names):
+        raise ValueError('Duplicate column names in header')
+
+    result = {}
+    for n, record in enumerate(records):
+        for name, value in enumerate(record):
+            if names is not None and name < len(names):
+                name = names[name]
+            column = result.get(name)
+            if column is None:
+                column = result[name] = [None] * n
+            column.append(value)
+        for column in result.values():
+            if len(column) <= n:
+                column.append(None)
+
+    return result
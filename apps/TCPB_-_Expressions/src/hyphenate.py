@@ -12,12 +12,20 @@ which hyphens can be placed.
 
 """
 # standard library
+from functools import lru_cache
+import hashlib
+import marshal
+import os
 import re
+import sys
 
 __version__ = '1.1.1.dev0'
 
 # pylint: disable=too-many-nested-blocks
 
+PATTERNS_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'hyphenate.cache')
+HYPHENATE_CACHE_SIZE = 4096
+
 
 class Hyphenator:
     """An object that hyphenates based on pre-computed patterns.
@@ -30,59 +38,128 @@ class Hyphenator:
     one of these words, it uses the given hyphenation instead of the
     hyphenation that would have been computed by the standard algorithm.
 
+    The patterns are compiled into a table of the letters of each pattern
+    and its points the first time a word is hyphenated.  If `cache` is a
+    file name, the table is loaded from there while it was built (see
+    :meth:`build`) from the same patterns.  The hyphenations of the last
+    `cache_size` words are kept in an LRU cache.
+
     """
 
-    def __init__(self, patterns, exceptions=''):
-        self.tree = {}
+    def __init__(self, patterns, exceptions='', cache=None, cache_size=HYPHENATE_CACHE_SIZE):
+        self.source = (patterns, exceptions)
+        self.cache = cache
+        self.patterns = None
+        self.exceptions = None
+        self.max_length = 0
+        self.split = lru_cache(maxsize=cache_size)(self._split)
+
+    @staticmethod
+    def compile(patterns, exceptions=''):
+        """Compile the patterns and exceptions into a table of
+        {'patterns': {letters: (offset, points)}, 'exceptions': {word: points}},
+        where the points of a pattern are trimmed of leading and trailing zeros,
+        and offset is the number of leading zeros trimmed."""
+
+        table = {}
         for pattern in patterns.split():
-            self._insert_pattern(pattern)
+            # Convert the a pattern like 'a1bc3d4' into a string of chars 'abcd'
+            # and a list of points [ 0, 1, 0, 3, 4 ].
+            chars = re.sub('[0-9]', '', pattern)
+            points = [int(d or 0) for d in re.split('[.a-z]', pattern)]
+
+            start = 0
+            end = len(points)
+            while start < end and not points[start]:
+                start += 1
+            while end > start and not points[end - 1]:
+                end -= 1
+            if start < end:
+                table[chars] = (start, tuple(points[start:end]))
 
-        self.exceptions = {}
+        exception_points = {}
         for ex in exceptions.split():
             # Convert the hyphenated pattern into a point array for use later.
             points = [0] + [int(h == '-') for h in re.split(r'[a-z]', ex)]
-            self.exceptions[ex.replace('-', '')] = points
-
-    def _insert_pattern(self, pattern):
-        # Convert the a pattern like 'a1bc3d4' into a string of chars 'abcd'
-        # and a list of points [ 0, 1, 0, 3, 4 ].
-        chars = re.sub('[0-9]', '', pattern)
-        points = [int(d or 0) for d in re.split('[.a-z]', pattern)]
-
-        # Insert the pattern into the tree.  Each character finds a dict
-        # another level down in the tree, and leaf nodes have the list of
-        # points.
-        t = self.tree
-        for c in chars:
-            if c not in t:
-                t[c] = {}
-            t = t[c]
-        t[None] = points
+            exception_points[ex.replace('-', '')] = points
+
+        return {'patterns': table, 'exceptions': exception_points}
+
+    def digest(self):
+        """The digest of the patterns and exceptions, which the cache is keyed by"""
+
+        patterns, exceptions = self.source
+        return hashlib.sha256(f'{patterns}\0{exceptions}'.encode('utf-8')).hexdigest()
+
+    def build(self, path=None):
+        """Compile the patterns and save the table to path (by default, the
+        cache), e.g. when packaging the App"""
+
+        table = self.compile(*self.source)
+        table['digest'] = self.digest()
+        with open(path or self.cache, 'wb') as f:
+            marshal.dump(table, f)
+        return table
+
+    def load(self):
+        """Load the compiled patterns from the cache, which is only read.  If
+        it is missing, can't be read, or was built from other patterns, the
+        patterns are compiled in memory."""
+
+        digest = self.digest()
+
+        table = None
+        if self.cache:
+            try:
+                with open(self.cache, 'rb') as f:
+                    table = marshal.loads(f.read())
+                if table.get('digest') != digest:
+                    table = None
+            except Exception:
+                table = None
+
+        if table is None:
+            table = self.compile(*self.source)
+
+        self.exceptions = table['exceptions']
+        self.max_length = max(map(len, table['patterns']), default=0)
+        self.patterns = table['patterns']
 
     def hyphenate_word(self, word):
         """Given a word, returns a list of pieces, broken at the possible
         hyphenation points.
         """
+
+        return list(self.split(word))
+
+    def _split(self, word):
+        """hyphenate_word(), returning a tuple"""
+
         # Short words aren't hyphenated.
         if len(word) <= 4:
-            return [word]
+            return (word,)
+
+        if self.patterns is None:
+            self.load()
+
         # If the word is an exception, get the stored points.
         if word.lower() in self.exceptions:
             points = self.exceptions[word.lower()]
         else:
             work = '.' + word.lower() + '.'
-            points = [0] * (len(work) + 1)
-            for i in range(len(work)):
-                t = self.tree
-                for c in work[i:]:
-                    if c in t:
-                        t = t[c]
-                        if None in t:
-                            p = t[None]
-                            for j, p_j in enumerate(p):
-                                points[i + j] = max(points[i + j], p_j)
-                    else:
-                        break
+            size = len(work)
+            points = [0] * (size + 1)
+            patterns = self.patterns
+            for i in range(size):
+                # Apply the points of every pattern that matches at i
+                for j in range(i + 1, min(i + self.max_length, size) + 1):
+                    match = patterns.get(work[i:j])
+                    if match:
+                        k = i + match[0]
+                        for p in match[1]:
+                            if p > points[k]:
+                                points[k] = p
+                            k += 1
             # No hyphens in the first two chars or the last two.
             points[1] = points[2] = points[-2] = points[-3] = 0
 
@@ -92,7 +169,7 @@ class Hyphenator:
             pieces[-1] += c
             if p % 2:
                 pieces.append('')
-        return pieces
+        return tuple(pieces)
 
 
 PATTERNS = (
@@ -554,8 +631,14 @@ presents project projects reci-procity re-cog-ni-zance ref-or-ma-tion
 ret-ri-bu-tion ta-ble
 """
 
-hyphenator = Hyphenator(PATTERNS, EXCEPTIONS)
+hyphenator = Hyphenator(PATTERNS, EXCEPTIONS, cache=PATTERNS_CACHE)
 hyphenate_word = hyphenator.hyphenate_word
 
 del PATTERNS
 del EXCEPTIONS
+
+if __name__ == '__main__':
+    if '--build-patterns' in sys.argv:
+        # compile the patterns to be packaged with the App
+        hyphenator.build()
+        sys.exit(0)
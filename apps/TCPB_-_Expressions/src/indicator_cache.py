@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""Disk cache for ThreatConnect indicator types and patterns
+
+The indicator types, and the patterns derived from them, rarely change but
+take one API request per parsable type to build.  They are cached in a file
+shared by app executions on the same host, per ThreatConnect API.
+
+Cached types are used as-is until they are older than the TTL, then they are
+revalidated with a single request for the types (using the ETag if the API
+returned one).  If the types are unchanged, as determined by the ETag or by a
+hash of the types, the cached patterns remain valid.
+
+The cached patterns are compiled and run, so the file is kept in the App's
+temp path, or else in a directory of the system temp directory that only the
+user can access, and is written readable only by the user.  A cache file
+owned by another user, or that others could have written, is ignored, and if
+no private directory is available, nothing is cached.
+"""
+
+import hashlib
+import json
+import os
+import stat
+import tempfile
+import time
+
+CACHE_VERSION = 1
+DEFAULT_TTL = 24 * 60 * 60
+
+
+def digest(ob):
+    """Return a hash of a JSON-serializable object"""
+
+    return hashlib.sha256(json.dumps(ob, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def private_directory(parent=None):
+    """Return a directory of parent (by default, the system temp directory)
+    that only this user can access, creating it if need be, or None if there
+    isn't one"""
+
+    if parent is None:
+        parent = tempfile.gettempdir()
+
+    path = os.path.join(parent, f'tcpb_expressions_{os.getuid()}')
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    except OSError:
+        return None
+
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return None
+
+    if not stat.S_ISDIR(st.st_mode) or not private(st):
+        return None
+
+    return path
+
+
+def private(st):
+    """Return true if the file with os.stat() result st belongs to this user,
+    and no one else can write to it"""
+
+    return st.st_uid == os.getuid() and not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+class IndicatorCache:
+    """Disk-backed cache of indicator types and patterns"""
+
+    def __init__(self, api_path, directory=None, ttl=DEFAULT_TTL):
+        """init"""
+
+        if directory is None:
+            directory = private_directory()
+
+        key = hashlib.sha256(str(api_path).encode('utf-8')).hexdigest()[:16]
+        self.path = None  # not cached on disk
+        if directory is not None:
+            self.path = os.path.join(directory, f'tcpb_expressions_indicators_{key}.json')
+        self.ttl = ttl
+        self.entry = None
+        self.served = set()
+        self.stats = {'hits': 0, 'misses': 0, 'revalidated': 0, 'reused': 0, 'errors': 0}
+
+    def hit(self, part):
+        """Count a use of the cached part ('types' or 'patterns'): a hit the first
+        time it is served from the disk cache, and reuse in memory after that"""
+
+        if part in self.served:
+            self.stats['reused'] += 1
+        else:
+            self.served.add(part)
+            self.stats['hits'] += 1
+
+    def load(self):
+        """Load the cache entry from disk, returning None if there isn't a
+        valid entry"""
+
+        if self.path is None:
+            return None
+
+        try:
+            with open(self.path, 'r') as f:
+                if not private(os.fstat(f.fileno())):
+                    self.stats['errors'] += 1
+                    return None
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            self.stats['errors'] += 1
+            return None
+
+        if not isinstance(entry, dict) or entry.get('version') != CACHE_VERSION:
+            return None
+
+        if entry.get('checksum') != digest([entry.get('types'), entry.get('patterns')]):
+            self.stats['errors'] += 1
+            return None
+
+        return entry
+
+    def save(self):
+        """Write the cache entry to disk, atomically, readable only by the user"""
+
+        if self.path is None:
+            return
+
+        entry = dict(self.entry)
+        if not entry.get('complete', True):
+            entry['patterns'] = None
+        entry['version'] = CACHE_VERSION
+        entry['checksum'] = digest([entry.get('types'), entry.get('patterns')])
+
+        directory = os.path.dirname(self.path)
+        try:
+            # mkstemp creates the file with mode 0600
+            fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(entry, f)
+                os.replace(temp_path, self.path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+        except OSError:
+            self.stats['errors'] += 1
+
+    def types(self, fetch):
+        """Return the indicator types, calling fetch(etag) to retrieve them if
+        they are not cached or are stale.  fetch returns (types, etag), or
+        (None, etag) if the ETag still matches."""
+
+        if self.entry is None:
+            self.entry = self.load()
+
+        entry = self.entry
+        if entry is not None and time.time() - entry.get('time', 0) < self.ttl:
+            self.hit('types')
+            return entry['types']
+
+        types, etag = fetch(entry.get('etag') if entry else None)
+
+        if entry is not None and (types is None or digest(types) == entry.get('types_hash')):
+            # stale, but unchanged
+            self.stats['revalidated'] += 1
+            self.served.add('types')
+            entry['time'] = time.time()
+            entry['etag'] = etag or entry.get('etag')
+            self.save()
+            return entry['types']
+
+        self.stats['misses'] += 1
+        self.served = {'types'}
+        self.entry = {
+            'time': time.time(),
+            'etag': etag,
+            'types': types,
+            'types_hash': digest(types),
+            'patterns': None,
+            'complete': True,
+        }
+        self.save()
+        return types
+
+    def patterns(self, fetch):
+        """Return the indicator patterns for the cached types, calling
+        fetch(types) to build them if they are not cached.  fetch returns
+        (patterns, complete), and incomplete patterns are not saved to disk."""
+
+        if self.entry.get('patterns') is not None:
+            self.hit('patterns')
+            return self.entry['patterns']
+
+        self.stats['misses'] += 1
+        self.served.add('patterns')
+        patterns, complete = fetch(self.entry['types'])
+        self.entry['patterns'] = patterns
+        self.entry['complete'] = complete
+        self.save()
+        return patterns
@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+"""Indicator of Compromise scanning
+
+An IndicatorScanner is built once for a set of indicator patterns, and compiles
+each pattern once per mode (str or bytes).  Before a pattern is run over the
+data, a prefilter checks that the literal text every match of the pattern
+must contain (e.g. '@' for an email address, or '://' for a URL) is present in
+the data, so patterns that cannot match are skipped without a regex pass.  If
+the pattern cannot match across lines and its literal is rare in the data,
+only the lines containing the literal are scanned.
+
+Data may also be scanned as a stream of chunks, with an overlap between chunks
+so that indicators spanning a chunk boundary are still found.
+"""
+
+import functools
+import re
+
+try:
+    import re._parser as sre_parse  # Python 3.11+
+except ImportError:  # pragma: no cover
+    import sre_parse  # pylint: disable=deprecated-module
+
+# inline global flags, e.g. (?i)
+global_flags_re = re.compile(r'(?<!\\)\(\?([aiLmsux]+)\)')
+
+REPEATS = tuple(
+    getattr(sre_parse, name)
+    for name in ('MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT')
+    if hasattr(sre_parse, name)
+)
+
+# character categories which include the newline character
+NEWLINE_CATEGORIES = {
+    'CATEGORY_SPACE',
+    'CATEGORY_NOT_DIGIT',
+    'CATEGORY_NOT_WORD',
+    'CATEGORY_LINEBREAK',
+}
+
+# scan only the lines containing a pattern's anchor literal if the anchor occurs
+# at most once per SPARSE characters of the data
+SPARSE = 1000
+
+
+def compile_pattern(pattern, flags):
+    """Compile pattern.  Older Pythons applied an inline global flag anywhere in
+    a pattern to the whole pattern, which Python 3.11 rejects, and some
+    ThreatConnect patterns rely on it, so those flags are moved to the start."""
+
+    try:
+        return re.compile(pattern, flags)
+    except re.error:
+        text = pattern.decode('latin-1') if isinstance(pattern, bytes) else pattern
+        found = global_flags_re.findall(text)
+        if not found:
+            raise
+        text = '(?' + ''.join(found) + ')' + global_flags_re.sub('', text)
+        if isinstance(pattern, bytes):
+            text = text.encode('latin-1')
+        return re.compile(text, flags)
+
+
+def required_literals(parsed, bytesmode):
+    """Return the literal strings that must appear in any match of the parsed
+    pattern"""
+
+    result = []
+    run = []
+
+    def end_run():
+        if run:
+            result.append(bytes(run) if bytesmode else ''.join(map(chr, run)))
+            run.clear()
+
+    for op, av in parsed:
+        if op is sre_parse.LITERAL:
+            run.append(av)
+            continue
+        end_run()
+        if op is sre_parse.SUBPATTERN:
+            _, add_flags, del_flags, pattern = av
+            if not (add_flags | del_flags) & re.IGNORECASE:
+                result.extend(required_literals(pattern, bytesmode))
+        elif op in REPEATS:
+            minimum, _, pattern = av
+            if minimum >= 1:
+                result.extend(required_literals(pattern, bytesmode))
+
+    end_run()
+
+    return result
+
+
+def set_matches_newline(items):
+    """Return True if the character set items may match a newline"""
+
+    negate = False
+    contains = False
+    for op, av in items:
+        if op is sre_parse.NEGATE:
+            negate = True
+        elif op is sre_parse.LITERAL:
+            contains = contains or av == 10
+        elif op is sre_parse.RANGE:
+            contains = contains or av[0] <= 10 <= av[1]
+        elif op is sre_parse.CATEGORY:
+            contains = contains or str(av) in NEWLINE_CATEGORIES
+        else:
+            return True
+
+    return contains != negate
+
+
+def matches_newline(parsed, dotall):
+    """Return True if the parsed pattern may match (or look around) a newline,
+    or depends on the start or end of the whole string"""
+
+    for op, av in parsed:
+        if op is sre_parse.LITERAL:
+            if av == 10:
+                return True
+        elif op is sre_parse.NOT_LITERAL:
+            if av != 10:
+                return True
+        elif op is sre_parse.ANY:
+            if dotall:
+                return True
+        elif op is sre_parse.IN:
+            if set_matches_newline(av):
+                return True
+        elif op is sre_parse.AT:
+            if str(av) in ('AT_BEGINNING_STRING', 'AT_END_STRING'):
+                return True
+        elif op is sre_parse.SUBPATTERN:
+            _, add_flags, del_flags, pattern = av
+            subpattern_dotall = (dotall or add_flags & re.DOTALL) and not del_flags & re.DOTALL
+            if matches_newline(pattern, subpattern_dotall):
+                return True
+        elif op in REPEATS:
+            if matches_newline(av[2], dotall):
+                return True
+        elif op is sre_parse.BRANCH:
+            if any(matches_newline(pattern, dotall) for pattern in av[1]):
+                return True
+        elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            if matches_newline(av[1], dotall):
+                return True
+        elif op is not sre_parse.GROUPREF:
+            return True
+
+    return False
+
+
+class IndicatorPattern:
+    """A compiled indicator pattern"""
+
+    __slots__ = ('key', 'names', 'regex', 'literals', 'line_local', 'newline')
+
+    def __init__(self, key, source, bytesmode, flags):
+        """init"""
+
+        self.key = key
+        self.names = (source,)
+        if bytesmode:
+            source = bytes(source, 'utf-8')
+            self.names += (source,)
+        self.regex = compile_pattern(source, flags)
+
+        parsed = sre_parse.parse(self.regex.pattern, self.regex.flags)
+        literals = required_literals(parsed, bytesmode)
+        if self.regex.flags & re.IGNORECASE:
+            # only caseless literals can be checked with a substring search
+            literals = [x for x in literals if x.lower() == x.upper()]
+        self.literals = tuple(dict.fromkeys(literals))
+
+        # matches of a line local pattern are within a single line, and can be
+        # found by scanning just the lines containing one of its literals
+        self.line_local = (
+            bool(self.literals)
+            and parsed.getwidth()[0] > 0
+            and not matches_newline(parsed, self.regex.flags & re.DOTALL)
+        )
+        self.newline = b'\n' if bytesmode else '\n'
+
+    def ignored(self, ignore):
+        """Return True if this pattern is on the ignore list"""
+
+        return any(name in ignore for name in self.names)
+
+    def possible(self, data):
+        """Return True unless the prefilter rules out a match in data"""
+
+        for literal in self.literals:
+            if literal not in data:
+                return False
+        return True
+
+    def finditer(self, data):
+        """Iterate over the matches in data"""
+
+        if not self.line_local:
+            if self.possible(data):
+                yield from self.regex.finditer(data)
+            return
+
+        count, anchor = min((data.count(literal), literal) for literal in self.literals)
+
+        if count * SPARSE > len(data):
+            yield from self.regex.finditer(data)
+            return
+
+        position = data.find(anchor)
+        while position >= 0:
+            start = data.rfind(self.newline, 0, position) + 1
+            end = data.find(self.newline, position)
+            if end < 0:
+                end = len(data)
+            yield from self.regex.finditer(data, start, end + 1)
+            position = data.find(anchor, end)
+
+
+class IndicatorScanner:
+    """Scan data for indicators matching a set of patterns"""
+
+    def __init__(self, patterns: dict):
+        """init"""
+
+        self.patterns = patterns
+        self.compiled = {}
+
+    def compile(self, bytesmode):
+        """Return the list of IndicatorPatterns for the mode"""
+
+        compiled = self.compiled.get(bytesmode)
+        if compiled is None:
+            if bytesmode:
+                flags = re.MULTILINE | re.DOTALL
+            else:
+                flags = re.MULTILINE
+            compiled = [
+                IndicatorPattern(key, value, bytesmode, flags)
+                for key, value in self.patterns.items()
+            ]
+            self.compiled[bytesmode] = compiled
+        return compiled
+
+    def scan(self, data, ignore=()):
+        """Yield (key, hit) for all indicators in data, pattern by pattern.
+        Patterns in ignore are skipped."""
+
+        for pattern in self.compile(isinstance(data, bytes)):
+            if pattern.ignored(ignore):
+                continue
+            for match in pattern.finditer(data):
+                yield pattern.key, match.group()
+
+    def scan_stream(self, chunks, ignore=(), overlap=1024):
+        """Yield (key, hit) for all indicators in an iterable of chunks, which
+        must all be str, or all bytes.  A match is only taken once overlap
+        characters past it have been read, and overlap characters before the
+        unscanned data are kept, so indicators (and their surrounding context)
+        up to overlap characters long are found even when they span chunks.  As
+        for scan, results are returned pattern by pattern."""
+
+        hits = {}
+        resume = {}  # stream offset at which to resume each pattern
+        buffer = None
+        base = 0  # stream offset of the buffer
+
+        chunks = iter(chunks)
+        chunk = next(chunks, None)
+        while chunk is not None:
+            buffer = chunk if buffer is None else buffer + chunk
+            chunk = next(chunks, None)
+            final = chunk is None
+
+            # matches ending past the tail wait for more data
+            tail = len(buffer) if final else max(len(buffer) - overlap, 0)
+
+            for pattern in self.compile(isinstance(buffer, bytes)):
+                if pattern.ignored(ignore):
+                    continue
+                position = base + tail
+                if pattern.possible(buffer):
+                    start = max(resume.get(pattern.key, 0) - base, 0)
+                    for match in pattern.regex.finditer(buffer, start):
+                        if match.end() > tail and not final:
+                            position = base + match.start()
+                            break
+                        hits.setdefault(pattern.key, []).append(match.group())
+                        position = base + max(match.end(), match.start() + 1, tail)
+                resume[pattern.key] = max(position, resume.get(pattern.key, 0))
+
+            keep = max(min(resume.values(), default=base + tail) - overlap - base, 0)
+            base += keep
+            buffer = buffer[keep:]
+
+        for pattern in self.compile(isinstance(buffer, bytes)):
+            for hit in hits.get(pattern.key, ()):
+                yield pattern.key, hit
+
+
+@functools.lru_cache(maxsize=8)
+def indicator_scanner(patterns: tuple) -> IndicatorScanner:
+    """Return the (cached) scanner for a tuple of (key, pattern) items"""
+
+    return IndicatorScanner(dict(patterns))
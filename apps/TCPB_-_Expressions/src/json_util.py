@@ -4,9 +4,13 @@
 """Read a JSON document and kick out the equivalent output section of install.json"""
 
 # standard library
+from functools import lru_cache
 from warnings import warn
 
+SNAKE_CACHE_SIZE = 4096
 
+
+@lru_cache(maxsize=SNAKE_CACHE_SIZE)
 def camel2snake(s):
     """Convert a camelCase name to snake_case"""
     o = ''
@@ -112,79 +116,69 @@ def refold(v, prefix, depth=0, collection=None):
     return collection
 
 
-def conform_objects(object_list, _path=None, _mapping=None, add_missing=False, missing_value=None):
-    """Conform objects to a common structure.
+class Schema:
+    """A trie of the paths of keys through nested dictionaries (and lists, which
+    don't add to the path).  Each node has the simple fields found at its path, in
+    the order they were found, and the children of the keys whose values are lists
+    or dictionaries."""
 
-    Any simple field which is discovered is remembered, then a second pass through
-    the objects will add any *missing* fields.
+    __slots__ = ('fields', 'children')
 
-    Returns the conformed object list.
-    """
+    def __init__(self):
+        """Initializer"""
 
-    if _mapping is None:
-        mapping = set()
-    else:
-        mapping = _mapping
+        self.fields = {}
+        self.children = {}
 
-    if _path is None:
-        path = []
-    else:
-        path = _path
-
-    path = path.copy()
-
-    if isinstance(object_list, list):
-        result = []
-        for obj in object_list:
-            result.append(
-                conform_objects(
-                    obj, path, mapping, add_missing=add_missing, missing_value=missing_value
-                )
-            )
-
-        if _mapping is None:
-            result = conform_objects(
-                result, path, mapping, add_missing=True, missing_value=missing_value
-            )
-
-        return result
-
-    if isinstance(object_list, dict):
-        for key, value in object_list.items():
-            path.append(key)
-            if not isinstance(value, (list, dict)):
-                mk = ':'.join(path)
-                if mk not in mapping:
-                    mapping.add(mk)
-            else:
-                object_list[key] = conform_objects(
-                    value, path, mapping, add_missing=add_missing, missing_value=missing_value
-                )
-
-            path.pop()
-
-        if add_missing:
-            add_missing_keys(object_list, path, mapping, missing_value)
-
-        if _mapping is None:
-            object_list = conform_objects(
-                object_list, path, mapping, add_missing=True, missing_value=missing_value
-            )
+    def child(self, key):
+        """Return the node for key, adding it if necessary"""
 
-    return object_list
+        node = self.children.get(key)
+        if node is None:
+            node = self.children[key] = Schema()
+        return node
+
+
+def infer_schema(ob, schema=None, dicts=None):
+    """Add the paths of ob to the schema (a new Schema if None), in a single pass
+    over ob.  Returns the schema and the list of (dictionary, schema node) of each
+    dictionary in ob, to which dicts is appended if given."""
 
+    if schema is None:
+        schema = Schema()
+    if dicts is None:
+        dicts = []
 
-def add_missing_keys(obj: dict, path: list, mapping: set, missing_value=None):
-    """Add missing keys to a dictionary-like obj"""
+    if isinstance(ob, list):
+        for value in ob:
+            infer_schema(value, schema, dicts)
+    elif isinstance(ob, dict):
+        dicts.append((ob, schema))
+        fields = schema.fields
+        for key, value in ob.items():
+            if isinstance(value, (list, dict)):
+                infer_schema(value, schema.child(key), dicts)
+            elif key not in fields:
+                fields[key] = None
 
-    lp = len(path) + 1
+    return schema, dicts
 
-    for key in mapping:
-        key_parts = key.split(':')
 
-        if len(key_parts) == lp and key_parts[:-1] == path:
-            mk = key_parts[-1]
-            value = obj.get(mk, None)
-            if value is None:
-                value = missing_value
-                obj[mk] = value
+def conform_objects(object_list, missing_value=None):
+    """Conform objects to a common structure.
+
+    Any simple field which is discovered is remembered, then any dictionary at the
+    same path which is missing that field (or has it as None) gets it, with a value
+    of missing_value.
+
+    Returns the conformed object list.
+    """
+
+    _, dicts = infer_schema(object_list)
+
+    for ob, node in dicts:
+        for key in node.fields:
+            if ob.get(key) is None:
+                ob[key] = missing_value
+
+    return object_list
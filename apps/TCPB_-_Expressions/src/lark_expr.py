@@ -10,21 +10,77 @@ except Exception:
     readline = None
 
 import ast
+import functools
+import hashlib
 import json
+import os
 import re
 import sys
 import traceback
 import operator
+import pickle  # nosec
 from typing import Union
 
-from lark import Lark, Transformer, v_args
+from lark import Lark, Transformer, Tree, v_args
 import lark.exceptions
 
 from methods import coerce, ExpressionMethods
+from lazyvar import LazyDict, LazyList, materialize, view
 from literal import literal, tcvar
 
 
 TCVARIABLE_RE = re.compile(r'#[A-Za-z]+:\d+:[A-Za-z0-9_.]+!\w+')
+GRAMMAR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'grammar.lark')
+PARSER_CACHE = GRAMMAR + '.cache'
+COMPILE_CACHE_SIZE = 1024
+
+# nodes whose result may be a lazy view of a TC variable, and the number of
+# leading operands each node takes as a view (the rest are materialized)
+VIEW_NODES = {
+    'tcvariable',
+    'function',
+    'get',
+    'getattr',
+    'get_slice',
+    'logical_or',
+    'logical_and',
+    'tuple_freeze',
+}
+VIEW_OPERANDS = {
+    'get': 1,
+    'getattr': 1,
+    'get_slice': 1,
+    'logical_or': 2,
+    'logical_and': 2,
+    'tuple_freeze': 1,
+}
+
+# builtins that only look into their positional arguments, which are passed
+# to them as lazy views (see compile_view_function)
+VIEW_FUNCTIONS = {'len', 'keys'}
+
+# left associative binary operators; a chain of them (e.g. a + b + c ...) is
+# a deep left spine of the parse tree, which is compiled into one loop
+CHAIN_NODES = {
+    'logical_or',
+    'logical_and',
+    'equals',
+    'not_equals',
+    'less_than',
+    'greater_than',
+    'less_than_equal_to',
+    'greater_than_equal_to',
+    'in_',
+    'not_in_',
+    'add',
+    'sub',
+    'mul',
+    'div',
+    'int_div',
+    'mod',
+    'pow',
+    'concat_string',
+}
 
 
 class kwarg(object):
@@ -227,7 +283,7 @@ class Evaluate(Transformer):
                 base = json.loads(tcvar)
             except Exception:
                 pass
-        if isinstance(base, dict):
+        if isinstance(base, (dict, LazyDict)):
             return base.get(name)
         return getattr(base, name)
 
@@ -312,6 +368,263 @@ class Evaluate(Transformer):
         return result
 
 
+def parser_key():
+    """Return the key of the serialized parser: a hash of the grammar and the
+    version of lark that serialized it"""
+
+    with open(GRAMMAR, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    return f'{digest} {lark.__version__}'.encode('ascii')
+
+
+def build_parser(path=PARSER_CACHE):
+    """Serialize the parser tables to path, e.g. when packaging the App"""
+
+    parser = Lark.open(GRAMMAR, parser='lalr', start='start')
+    with open(path, 'wb') as f:
+        f.write(parser_key() + b'\n')
+        parser.save(f)
+    return parser
+
+
+@functools.lru_cache(maxsize=1)
+def get_parser():
+    """Return the (shared) expression parser, which produces parse trees.
+
+    The LALR tables are loaded from PARSER_CACHE, which is built by
+    'python lark_expr.py --build-parser' and packaged with the App.  The file
+    is only read; if it is missing, or was built from another grammar or lark
+    version, the tables are built in memory.
+    """
+
+    try:
+        with open(PARSER_CACHE, 'rb') as f:
+            if f.readline().rstrip(b'\n') == parser_key():
+                return Lark.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        pass
+
+    return Lark.open(GRAMMAR, parser='lalr', start='start')
+
+
+def list_items(node):
+    """Return the item subtrees of a list_ node.
+
+    Lists are left recursive in the grammar, so a long list (e.g. a JSON
+    document) is a deep chain of list_ nodes, which is walked without recursion.
+    """
+
+    items = []
+    while True:
+        children = node.children
+        if children and isinstance(children[0], Tree) and children[0].data == 'list_':
+            items.extend(reversed(children[1:]))
+            node = children[0]
+        else:
+            items.extend(reversed(children))
+            return items[::-1]
+
+
+def arguments(node):
+    """Return the argument subtrees of a function call's argument list"""
+
+    if isinstance(node, Tree) and node.data == 'list_':
+        return list_items(node)
+    return [node]
+
+
+def compile_choice(node, lazy):
+    """Compile a call to choice(condition, true_result, false_result) so that
+    only the chosen result is evaluated.
+
+    Returns None if the call has keyword arguments or the wrong number of
+    arguments, which are left to the usual (eager) call.  If choice is not the
+    builtin when the expression is evaluated, e.g. it is shadowed by a loop
+    variable, all of the arguments are evaluated.
+    """
+
+    args = arguments(node.children[1])
+    if not 2 <= len(args) <= 3:
+        return None
+    if any(isinstance(arg, Tree) and arg.data == 'set_kwarg' for arg in args):
+        return None
+
+    condition = compile_operand(args[0], lazy)
+    results = [compile_operand(arg, lazy, True) for arg in args[1:]]
+
+    def choice(evaluator):
+        if evaluator.namespace.get('choice') is not ExpressionMethods.f_choice:
+            values = [condition(evaluator)]
+            values.extend(materialize(result(evaluator)) for result in results)
+        else:
+            values = [condition(evaluator), None, None][: len(args)]
+            chosen = 1 if values[0] else 2
+            if chosen < len(args):
+                values[chosen] = results[chosen - 1](evaluator)
+        return evaluator.function('choice', open_list(values))
+
+    return choice
+
+
+def compile_view_function(node, lazy):
+    """Compile a call to a builtin in VIEW_FUNCTIONS, e.g. len(), so that a
+    TC variable is passed to it as a lazy view, and only the parts of the
+    variable it reads are resolved.
+
+    If the name is not the builtin when the expression is evaluated, e.g. it
+    is shadowed by a loop variable, the arguments are materialized as usual.
+    """
+
+    name = str(node.children[0])
+    builtin = getattr(ExpressionMethods, f'f_{name}')
+    args = [compile_operand(arg, lazy, True) for arg in arguments(node.children[1])]
+
+    def function(evaluator):
+        values = [arg(evaluator) for arg in args]
+        if evaluator.namespace.get(name) is not builtin:
+            values = [materialize(value) for value in values]
+        return evaluator.function(name, open_list(values))
+
+    return function
+
+
+def compile_operand(node, lazy, keep_view=False):
+    """Compile an operand, materializing it if it may be a lazy view that the
+    operation can't take"""
+
+    code = compile_tree(node, lazy)
+    if keep_view or not (isinstance(node, Tree) and node.data in VIEW_NODES):
+        return code
+    return lambda evaluator: materialize(code(evaluator))
+
+
+def compile_chain(node, lazy):
+    """Compile a chain of left associative binary operations, e.g. a + b - c,
+    walking the left spine of the parse tree without recursion.
+
+    The result evaluates the leftmost operand, then applies each operation in
+    turn to the value so far and its right operand, so neither compiling nor
+    evaluating a long chain exhausts the recursion limit.
+    """
+
+    steps = []
+    while isinstance(node, Tree) and node.data in CHAIN_NODES:
+        steps.append(node)
+        node = node.children[0]
+    steps.reverse()
+
+    first = compile_operand(node, lazy, VIEW_OPERANDS.get(steps[0].data, 0) > 0)
+
+    operations = []
+    for n, step in enumerate(steps):
+        method = str(step.data)
+        views = VIEW_OPERANDS.get(method, 0)
+        # the value so far is materialized if it may be a view this operation can't take
+        flatten = n > 0 and not views and steps[n - 1].data in VIEW_NODES
+        operations.append((method, flatten, compile_operand(step.children[1], lazy, views > 1)))
+
+    def chain(evaluator):
+        value = first(evaluator)
+        for method, flatten, operand in operations:
+            if flatten:
+                value = materialize(value)
+            if lazy and method == 'logical_or':
+                value = value or operand(evaluator)
+            elif lazy and method == 'logical_and':
+                value = value and operand(evaluator)
+            else:
+                value = getattr(evaluator, method)(value, operand(evaluator))
+        return value
+
+    return chain
+
+
+def compile_tree(node, lazy=True):
+    """Compile a parse tree into a closure tree.
+
+    The result is a callable taking an Evaluate instance, which calls the
+    Evaluate method named by each tree node with the results of its
+    (compiled) children, in the same order the inline transformer would.
+    A TC variable stays a lazy view through get, getattr, slices, choice()
+    and the VIEW_FUNCTIONS builtins, and is materialized when any other
+    operation uses it.
+
+    If lazy is set, and/or and choice() short-circuit like Python's and, or
+    and conditional expressions: the operand or result that doesn't decide
+    the value is not evaluated, so calls in the dead branch are never made.
+    """
+
+    if not isinstance(node, Tree):
+        return lambda evaluator: node  # a token; constant
+
+    method = str(node.data)
+
+    if lazy and method == 'function' and str(node.children[0]) == 'choice':
+        compiled = compile_choice(node, lazy)
+        if compiled is not None:
+            return compiled
+
+    if method == 'function' and str(node.children[0]) in VIEW_FUNCTIONS:
+        return compile_view_function(node, lazy)
+
+    if method == 'list_':
+        # the items of the nested list_ nodes are collected into one call
+        items = [compile_operand(item, lazy) for item in list_items(node)]
+        return lambda evaluator: evaluator.list_(*[x(evaluator) for x in items])
+
+    if method in CHAIN_NODES:
+        left = node.children[0]
+        if isinstance(left, Tree) and left.data in CHAIN_NODES:
+            return compile_chain(node, lazy)
+
+    views = VIEW_OPERANDS.get(method, 0)
+    children = [compile_operand(child, lazy, n < views) for n, child in enumerate(node.children)]
+
+    if lazy and method == 'logical_or':
+        a, b = children
+        return lambda evaluator: a(evaluator) or b(evaluator)
+
+    if lazy and method == 'logical_and':
+        a, b = children
+        return lambda evaluator: a(evaluator) and b(evaluator)
+
+    if not children:
+        return lambda evaluator: getattr(evaluator, method)()
+
+    if len(children) == 1:
+        (a,) = children
+        return lambda evaluator: getattr(evaluator, method)(a(evaluator))
+
+    if len(children) == 2:
+        a, b = children
+        return lambda evaluator: getattr(evaluator, method)(a(evaluator), b(evaluator))
+
+    return lambda evaluator: getattr(evaluator, method)(*[x(evaluator) for x in children])
+
+
+@functools.lru_cache(maxsize=COMPILE_CACHE_SIZE)
+def parse_expression(expression):
+    """Parse an expression into a parse tree.
+
+    Parse trees are kept in a bounded LRU cache keyed by the expression text,
+    for compile_expression and the other consumers of the tree (e.g. loop
+    vectorization), which must not change them.
+    """
+
+    return get_parser().parse(str(expression))
+
+
+@functools.lru_cache(maxsize=COMPILE_CACHE_SIZE)
+def compile_expression(expression):
+    """Parse an expression once into a reusable compiled form.
+
+    Compiled expressions are kept in a bounded LRU cache keyed by the expression
+    text, so repeated evaluations (e.g. loop expressions) only pay for the parse once.
+    """
+
+    return compile_tree(parse_expression(expression))
+
+
 class Expression(ExpressionMethods):
     """expression parser"""
 
@@ -319,12 +632,10 @@ class Expression(ExpressionMethods):
         self.variables = {}
         self.stack = []
         self.evaluator = Evaluate(self, self.redis_fetch)
-        self.parser = Lark.open(
-            'grammar.lark', parser='lalr', start='start', transformer=self.evaluator
-        )
         self.tcex = tcex
         self.cache = {}
         self.trace = None
+        self.parsed_json = None  # id(JSON string): (string, value), per evaluation
 
     true = True
     false = False
@@ -367,12 +678,19 @@ class Expression(ExpressionMethods):
         if isinstance(ob, (int, float)):
             return ob
 
+        if isinstance(ob, (LazyDict, LazyList)):
+            return ob.resolve(self.deencapsulate)
+
         if isinstance(ob, tcvar):
-            try:
-                return self.eval(ob)
-            except Exception:
-                pass
-            return str(ob)
+            # the tcvars of a view are kept, so each is only resolved once
+            resolved = ob.__dict__.get('resolved', __notfound__)
+            if resolved is __notfound__:
+                try:
+                    resolved = self.eval(ob)
+                except Exception:
+                    resolved = str(ob)
+                ob.resolved = resolved
+            return resolved
 
         if isinstance(ob, tuple):
             result = [self.deencapsulate(x) for x in ob]
@@ -389,6 +707,22 @@ class Expression(ExpressionMethods):
 
         return ob
 
+    def variable_view(self, ob):
+        """Return a lazy view of a TC variable value, with its strings as
+        tcvars, or the resolved value of a string.  A JSON document is loaded
+        rather than parsed as an expression, which gives the same (literal)
+        values much faster."""
+
+        if isinstance(ob, str):
+            if ob.lstrip()[:1] in ('{', '['):
+                try:
+                    return view(json.loads(ob), literal)
+                except ValueError:
+                    pass
+            return self.deencapsulate(tcvar(ob))
+
+        return view(ob, tcvar)
+
     def redis_fetch(self, variable):
         """Fetch a TC variable from Redis"""
 
@@ -417,34 +751,44 @@ class Expression(ExpressionMethods):
         else:
             result = None
 
-        # Encapsulating the result will mark any strings or internal strings
-        # to the object as tcvar
-
         if self.trace:
             self.trace(f'=E= {result}')
-        result = self.encapsulate(result)
 
-        # Now, as long as the top level thing is encapsulated, deencapsulate it
+        # The strings in a structured result are only wrapped as tcvars when
+        # they are accessed, and the view is cached, so every reference shares
+        # them (and their resolved values)
 
-        while isinstance(result, tcvar):
-            if self.trace:
-                tracecd = 'R'
-                if isinstance(result, tcvar):
-                    tracecd = 'T'
-                self.trace(f'={tracecd}= {result!r}')
-
-            result = self.deencapsulate(result)
+        result = self.variable_view(result)
 
-            if self.trace:
-                tracecd = 'D'
-                if isinstance(result, tcvar):
-                    tracecd = 'T'
-                self.trace(f'={tracecd}= {result!r}')
+        if self.trace:
+            tracecd = 'V' if isinstance(result, (LazyDict, LazyList)) else 'D'
+            self.trace(f'={tracecd}= {result!r}')
 
         self.cache[variable] = result
 
         return result
 
+    def prefetch(self, expressions):
+        """Read the TC variables referenced by the expressions, which aren't
+        cached yet, in bulk (if the key value store supports it).  Only the
+        raw values are kept by the store; a variable is decoded and resolved
+        when it is first used, so variables in branches that aren't taken are
+        never evaluated.  Returns the number of variables read in bulk."""
+
+        variables = []
+        for expression in expressions:
+            if isinstance(expression, str):
+                variables.extend(TCVARIABLE_RE.findall(expression))
+        variables = [
+            variable for variable in dict.fromkeys(variables) if variable not in self.cache
+        ]
+
+        prefetch = getattr(self.tcex.key_value_store, 'prefetch', None) if self.tcex else None
+        if not variables or prefetch is None:
+            return 0
+
+        return prefetch(self.tcex.default_args.tc_playbook_db_context, variables)
+
     def get(self, variable, default=None):
         """Get a variable"""
 
@@ -482,45 +826,70 @@ class Expression(ExpressionMethods):
     def eval(self, expression, context=None):
         """Evaluate an expression"""
 
-        if context:
-            self.stack.insert(0, context)
+        return self.compiled(expression)(context)
+
+    def compiled(self, expression):
+        """Parse an expression once, returning a function of a context that
+        evaluates it like eval(expression, context).  Syntax errors are raised
+        here, rather than on each evaluation."""
 
         if not isinstance(expression, str):
-            result = self.deencapsulate(self.encapsulate(expression))  # hmm passed non-string
 
-            if self.trace:
-                self.trace(f'>R>{result}')
+            def passed(context=None):
+                result = self.deencapsulate(self.encapsulate(expression))  # hmm passed non-string
+
+                if self.trace:
+                    self.trace(f'>R>{result}')
                 return result
 
-        if self.trace:
-            self.trace(f'<?< {expression}')
+            return passed
 
         try:
-            result = self.parser.parse(expression)
+            code = compile_expression(expression)
         except lark.exceptions.UnexpectedToken as e:
             if self.trace:
+                self.trace(f'<?< {expression}')
                 self.trace(f'-X- Unexpected token {e.token} at line {e.line}, column {e.column}')
             raise SyntaxError(
                 f'Unexpected token {e.token} at line {e.line}, column {e.column}.'
             ) from e
         except Exception as e:
             if self.trace:
+                self.trace(f'<?< {expression}')
                 self.trace(f'-X- {e}')
             raise
-        finally:
+
+        def evaluate(context=None):
+            if self.trace:
+                self.trace(f'<?< {expression}')
+
             if context:
-                self.stack.pop(0)
+                self.stack.insert(0, context)
 
-        if self.trace:
-            tracecd = 'R'
-            if isinstance(result, tcvar):
-                tracecd = 'T'
-            elif isinstance(result, literal):
-                tracecd = 'L'
-            self.trace(f'>{tracecd}> {result!r}')
-        result = self.deencapsulate(result)
+            # JSON strings are parsed once per evaluation
+            self.parsed_json = None
 
-        return result
+            try:
+                result = code(self.evaluator)
+            except Exception as e:
+                if self.trace:
+                    self.trace(f'-X- {e}')
+                raise
+            finally:
+                if context:
+                    self.stack.pop(0)
+
+            if self.trace:
+                tracecd = 'R'
+                if isinstance(result, tcvar):
+                    tracecd = 'T'
+                elif isinstance(result, literal):
+                    tracecd = 'L'
+                self.trace(f'>{tracecd}> {result!r}')
+
+            return self.deencapsulate(result)
+
+        return evaluate
 
 
 def interactive(record=False, trace=False):
@@ -595,6 +964,11 @@ def interactive(record=False, trace=False):
 
 
 if __name__ == '__main__':
+    if '--build-parser' in sys.argv:
+        # serialize the parser tables to be packaged with the App
+        build_parser()
+        sys.exit(0)
+
     record_flag = bool('--record' in sys.argv)
     trace_flag = bool('--trace' in sys.argv)
     interactive(record=record_flag, trace=trace_flag)
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""Lazy views of ThreatConnect variables
+
+A structured variable read from the playbook may be large, and only a small
+part of it may be used by an expression.  A view wraps a key or value (e.g. as
+a tcvar) only when it is accessed by get, getattr or a slice, and keeps the
+result, so every reference to the variable shares the work.
+
+materialize() turns a view into plain dictionaries and lists of wrapped values,
+e.g. when it is passed to a function that doesn't take views, and resolve()
+computes (once) the fully resolved value, e.g. when a view is the result of an
+expression.  A view is resolved from its items, and nested views keep their
+own resolved values, so a part of a variable that was read on its own is not
+resolved again.
+"""
+
+from collections.abc import Mapping, Sequence
+
+
+def view(value, wrap):
+    """Return a lazy view of a dictionary or list, wrap(value) for a string,
+    or any other value as-is"""
+
+    if isinstance(value, dict):
+        return LazyDict(value, wrap)
+    if isinstance(value, (list, tuple)):
+        return LazyList(value, wrap)
+    if isinstance(value, str):
+        return wrap(value)
+    return value
+
+
+def materialize(value):
+    """Turn a view into plain dictionaries and lists; other values are
+    returned as-is"""
+
+    if isinstance(value, (LazyDict, LazyList)):
+        return value.materialize()
+    return value
+
+
+class LazyView:
+    """Common behaviour of the views"""
+
+    def __init__(self, raw, wrap):
+        """init"""
+
+        self._raw = raw
+        self._wrap = wrap
+        self._value = None
+        self._resolved = None
+
+    def materialize(self):
+        """Return the plain dictionary or list"""
+
+        if self._value is None:
+            self._value = self._materialize()
+        return self._value
+
+    def resolve(self, resolve):
+        """Return the value with each item (and key) replaced by resolve(item),
+        computed once"""
+
+        if self._resolved is None:
+            self._resolved = self._resolve(resolve)
+        return self._resolved
+
+    def __repr__(self):
+        """repr"""
+
+        return f'{self.__class__.__name__}({self._raw!r})'
+
+
+class LazyDict(LazyView, Mapping):
+    """Read-only view of a dictionary, wrapping keys and values on access"""
+
+    def __init__(self, raw: dict, wrap):
+        """init"""
+
+        super().__init__(raw, wrap)
+        self._keys = None  # wrapped key: raw key
+        self._values = {}  # raw key: wrapped value
+
+    def _keymap(self):
+        """Wrap the keys (all of them, as any may match a lookup)"""
+
+        if self._keys is None:
+            self._keys = {view(key, self._wrap): key for key in self._raw}
+        return self._keys
+
+    def __getitem__(self, key):
+        """Wrap the value for key"""
+
+        raw_key = self._keymap()[key]
+        try:
+            return self._values[raw_key]
+        except KeyError:
+            value = self._values[raw_key] = view(self._raw[raw_key], self._wrap)
+            return value
+
+    def __iter__(self):
+        """Iterate over the wrapped keys"""
+
+        return iter(self._keymap())
+
+    def __len__(self):
+        """len"""
+
+        return len(self._raw)
+
+    def _materialize(self):
+        """Build the plain dictionary"""
+
+        return {key: materialize(self[key]) for key in self}
+
+    def _resolve(self, resolve):
+        """Build the resolved dictionary"""
+
+        return {resolve(key): resolve(self[key]) for key in self}
+
+
+class LazyList(LazyView, Sequence):
+    """Read-only view of a list or tuple, wrapping items on access.  Slices
+    are views of the same items."""
+
+    def __init__(self, raw, wrap, indices=None, items=None):
+        """init"""
+
+        super().__init__(raw, wrap)
+        self._indices = range(len(raw)) if indices is None else indices
+        self._items = {} if items is None else items  # raw index: wrapped item
+
+    def __getitem__(self, index):
+        """Wrap the item at index, or return a view of a slice"""
+
+        if isinstance(index, slice):
+            return LazyList(self._raw, self._wrap, self._indices[index], self._items)
+
+        n = self._indices[index]
+        try:
+            return self._items[n]
+        except KeyError:
+            item = self._items[n] = view(self._raw[n], self._wrap)
+            return item
+
+    def __len__(self):
+        """len"""
+
+        return len(self._indices)
+
+    def __repr__(self):
+        """repr"""
+
+        return f'{self.__class__.__name__}({[self._raw[n] for n in self._indices]!r})'
+
+    def _materialize(self):
+        """Build the plain list (or tuple)"""
+
+        items = [materialize(item) for item in self]
+        return tuple(items) if isinstance(self._raw, tuple) else items
+
+    def _resolve(self, resolve):
+        """Build the resolved list (or tuple)"""
+
+        items = [resolve(item) for item in self]
+        return tuple(items) if isinstance(self._raw, tuple) else items
@@ -19,12 +19,17 @@ it uses to denote a quoted literal value, which will NOT be coerced.
 
 Attributes defined on the ExpressionMethod class are available
 as constants to the expression handler, *without* the f_ prefix.
+
+Modules which are slow to import (chardet, ioc_fanger, jmespath, requests, and
+the tcex date utilities) are imported by the functions that use them, so that
+an evaluation only pays for what it calls.
 """
 
-# pylint: disable=no-member
+# pylint: disable=no-member,import-outside-toplevel
 
 import base64
 from collections import OrderedDict, deque
+import concurrent.futures
 import csv
 import functools
 import hashlib
@@ -33,6 +38,7 @@ from io import StringIO
 import json
 import locale as locale_
 import math
+import os
 from pprint import pformat
 import re
 import urllib.parse
@@ -40,133 +46,206 @@ import uuid
 import typing
 from typing import Union, List
 
-import chardet
-import ioc_fanger
-import jmespath
-import requests
-
-from tcex.utils.date_utils import DatetimeUtils
-
+import canonical
+import csv_util
 import json_util
 import structure
 from literal import literal
 
 from spamspy.spamsum import spamsum
-from spamspy.edit_dist import edit_dist
+from spamspy.edit_dist import edit_dist, edit_dist_many
+from spamspy.ngram import INDEX_SUFFIX, NgramIndex
 
+from indicator_cache import IndicatorCache
+from ioc_scan import indicator_scanner
 from mergearray import mergearray
 from reporting import Reporting
-from rexxparse import RexxParser
-from smartdict import SmartDict, smart_format
+from rexxparse import convert_value, RexxParser
+from smartdict import SmartDict, smart_format, smart_format_many
 from throttle import Throttle
-from xml_util import xml_to_dict, dict_to_xml
-
-tzutil = DatetimeUtils()
+from xml_util import xml_select, xml_to_dict, dict_to_xml
 
 NoneType = type(None)
 
 aliases = ('spammatch', 'spamsum', 'spamdist', 'json')
 THROTTLE_SEC = 3
+FETCH_WORKERS = 8
+COMPILE_CACHE_SIZE = 256
 
+# indicator field: (API path suffix, data key, default value)
+INDICATOR_FIELDS = {
+    'owners': ('/owners', 'owner', None),
+    'observationCount': ('/observationCount', 'observationCount', None),
+    'attribute': ('/attributes', 'attribute', None),
+    'securityLabel': ('/securityLabels', 'securityLabel', None),
+    'associations': ('/groups', 'group', []),
+    'tag': ('/tags', 'tag', None),
+}
 
-def strbytes(value, annotation):
-    """Convert value between str and bytes depending on annotation"""
 
-    if not isinstance(value, (bytes, str)):
-        return value
+@functools.lru_cache(maxsize=1)
+def get_tzutil():
+    """Return the tcex datetime utilities, importing tcex on first use"""
+
+    from tcex.utils.date_utils import DatetimeUtils
+
+    return DatetimeUtils()
+
+
+@functools.lru_cache(maxsize=64)
+def regex_flags(flags):
+    """Return the re flags for flags, either an int, or a string of flag
+    letters (e.g. 'im')"""
+
+    f = 0
+    if isinstance(flags, int):
+        f = flags
+    elif isinstance(flags, str):
+        for c in flags:
+            c = c.upper()
+            i = getattr(re, c, None)
+            if i:
+                f += i
+
+    return f
+
+
+@functools.lru_cache(maxsize=COMPILE_CACHE_SIZE)
+def compile_regex(pattern, flags=0):
+    """Return the compiled regular expression, from the cache if it has been
+    compiled before"""
+
+    return re.compile(pattern, flags)
+
+
+@functools.lru_cache(maxsize=COMPILE_CACHE_SIZE)
+def compile_jmespath(path):
+    """Return the compiled JMESPath expression, from the cache if it has been
+    compiled before"""
+
+    import jmespath
+
+    return jmespath.compile(path)
+
+
+def annotation_types(annotation):
+    """Return the annotation of a parameter as a tuple of types, or None if
+    the parameter is not annotated"""
+
+    if annotation is inspect.Parameter.empty or not annotation:
+        return None
+
+    if hasattr(annotation, '_subs_tree'):
+        annotation = annotation._subs_tree()[1:]  # this is a Union
+    elif hasattr(typing, 'get_args'):
+        union_args = typing.get_args(annotation)  # pylint: disable=E1101
+        if union_args:
+            annotation = union_args
 
-    if isinstance(value, str) and bytes in annotation and str not in annotation:
-        return bytes(str(value), 'utf-8')
+    if not isinstance(annotation, tuple):
+        annotation = (annotation,)
 
-    if isinstance(value, bytes) and str in annotation and bytes not in annotation:
-        return value.decode('utf-8')
+    return annotation
+
+
+def coerce_value(value, plan):
+    """Coerce one value according to a (types, to_bytes, to_str) plan"""
+
+    annotation, to_bytes, to_str = plan
+
+    # special case to deal with bytes inputs with no bytes but str in annotations
+    if to_bytes and isinstance(value, str):
+        value = bytes(str(value), 'utf-8')
+    elif to_str and isinstance(value, bytes):
+        value = value.decode('utf-8')
+
+    if isinstance(value, annotation):
+        return value
+
+    for constructor in annotation:
+        try:
+            return constructor(value)
+        except Exception:
+            pass
 
     return value
 
 
 def coerce(f):
-    """Coerce the arguments of f to the signatures in inspect.signatures"""
+    """Coerce the arguments of f to the signatures in inspect.signatures
+
+    The signature is inspected once, when the function is decorated, to build
+    a conversion plan for each annotated parameter; calls only apply the plan.
+    """
+
+    func = f
+    # staticmethods ... argh
+    static = isinstance(f, staticmethod)
+    if static:
+        func = f.__func__
+
+    sig = inspect.signature(func, follow_wrapped=True)
+
+    positional = []  # plan (or None) by position
+    keyword = {}  # plan by keyword name
+    var_positional = None
+    var_keyword = None
+
+    for param in sig.parameters.values():
+        annotation = annotation_types(param.annotation)
+        plan = None
+        if annotation:
+            plan = (
+                annotation,
+                bytes in annotation and str not in annotation,
+                str in annotation and bytes not in annotation,
+            )
+
+        if param.kind is inspect.Parameter.VAR_POSITIONAL:
+            var_positional = plan
+        elif param.kind is inspect.Parameter.VAR_KEYWORD:
+            var_keyword = plan
+        else:
+            if param.kind is not inspect.Parameter.KEYWORD_ONLY:
+                positional.append(plan)
+            if param.kind is not inspect.Parameter.POSITIONAL_ONLY and plan:
+                keyword[param.name] = plan
+
+    npositional = len(positional)
+
+    if not any(positional) and not keyword and not var_positional and not var_keyword:
+        # nothing to coerce
+        @functools.wraps(f)
+        def passthrough(*args, **kwargs):
+            """argument coercion wrapper"""
+            if static:
+                args = args[1:]
+            return func(*args, **kwargs)
+
+        return passthrough
 
     @functools.wraps(f)
     def wrapper(*args, **kwargs):
         """argument coercion wrapper"""
-        func = f
-        # staticmethods ... argh
-        if isinstance(f, staticmethod):
-            func = f.__func__
-            args = tuple(args[1:])
-        sig = inspect.signature(func, follow_wrapped=True)
-        bindings = sig.bind(*args, **kwargs)
-        bindings.apply_defaults()
-
-        # print(f'\n>>>Coercing for {func}')
-        for param in bindings.arguments:
-            value = bindings.arguments[param]
-
-            annotation = sig.parameters[param].annotation
-            kind = sig.parameters[param].kind
-
-            # print(f'>>>Inspecting {param} with value {value}, type {kind}, '
-            #      f'annotations {annotation}')
-            if not annotation:
-                continue
+        if static:
+            args = args[1:]
 
-            if hasattr(annotation, '_subs_tree'):
-                annotation = annotation._subs_tree()[1:]  # this is a Union
-            elif hasattr(typing, 'get_args'):
-                union_args = typing.get_args(annotation)  # pylint: disable=E1101
-                if union_args:
-                    annotation = union_args
-
-            if not isinstance(annotation, tuple):
-                annotation = (annotation,)
-
-            # print(f'Annotation is {annotation!r}')
-
-            if kind is inspect.Parameter.VAR_POSITIONAL:
-                # *args
-                result = []
-                for v in value:
-                    # print(f'>?>{v} -> {annotation}')
-                    # special case to deal with bytes inputs with no bytes but str in annotations
-                    v = strbytes(v, annotation)
-                    if not isinstance(v, annotation):
-                        for constructor in annotation:
-                            try:
-                                v = constructor(v)
-                                # print(f'>!>{v}')
-                                break
-                            except Exception:
-                                pass
-                    result.append(v)
-                bindings.arguments[param] = result
-            elif kind is inspect.Parameter.VAR_KEYWORD:
-                # **kwargs
-                for k, v in value.items():
-                    # special case to deal with bytes inputs with no bytes but str in annotations
-                    v = strbytes(v, annotation)
-                    if not isinstance(v, annotation):
-                        for constructor in annotation:
-                            try:
-                                v = constructor(v)
-                                break
-                            except Exception:
-                                pass
-                        value[k] = v
+        coerced = []
+        for index, value in enumerate(args):
+            if index < npositional:
+                plan = positional[index]
             else:
-                # special case to deal with bytes inputs with no bytes but str in annotations
-                value = strbytes(value, annotation)
-                if not isinstance(value, annotation):
-                    for constructor in annotation:
-                        try:
-                            value = constructor(value)
-                            break
-                        except Exception:
-                            pass
+                plan = var_positional
+            if plan:
+                value = coerce_value(value, plan)
+            coerced.append(value)
 
-                bindings.arguments[param] = value
+        for name, value in kwargs.items():
+            plan = keyword.get(name, var_keyword)
+            if plan:
+                kwargs[name] = coerce_value(value, plan)
 
-        return func(*bindings.args, **bindings.kwargs)
+        return func(*coerced, **kwargs)
 
     return wrapper
 
@@ -353,11 +432,14 @@ class ExpressionMethods:
         of byteseq, the confidence of the encoding, and the estimated
         language."""
 
+        import chardet
+
         return chardet.detect(byteseq)
 
     @staticmethod
     def f_choice(condition, true_result=None, false_result=None):
-        """Choice of true_result or false_result based on condition"""
+        """Choice of true_result or false_result based on condition.
+        Only the chosen result is evaluated."""
 
         if condition:
             return true_result
@@ -400,50 +482,40 @@ class ExpressionMethods:
         return math.cosh(x)
 
     @staticmethod
-    def f_csvread(data, header=False, convert=True, delimiter=',', quote='"', rows=0, columns=0):
+    def f_csvread(
+        data,
+        header=False,
+        convert=True,
+        delimiter=',',
+        quote='"',
+        rows=0,
+        columns=0,
+        columnar=False,
+    ):
         """Process data as a CSV File.  Return the data as a list of rows of columns,
         or if rows=1, return a list of columns).  If header is true, the first record
         is discarded.  If rows or columns is nonzero, the row or column count will
         be truncated to that number of rows or columns. If convert is True, numeric
-        values will be returned as numbers, not strings"""
+        values will be returned as numbers, not strings.  Only the rows that are
+        returned are read.
 
-        if isinstance(data, bytes):
-            data = data.decode('utf-8')
+        If columnar is true, return a dictionary of columns (lists of values) instead,
+        keyed by the header names if header is true, or by column number."""
 
-        buffer = StringIO(data)
+        names, records = csv_util.read_csv(
+            data,
+            header=header,
+            convert=convert,
+            delimiter=delimiter,
+            quote=quote,
+            rows=rows,
+            columns=columns,
+        )
 
-        result = []
+        if columnar:
+            return csv_util.columnar(records, names)
 
-        reader = csv.reader(buffer, delimiter=delimiter, quotechar=quote)
-        for rowdata in reader:
-            if columns and len(rowdata) > columns:
-                rowdata = rowdata[:columns]
-
-            if convert:
-                rd = []
-                for value in rowdata:
-                    i = None
-                    f = None
-                    try:
-                        f = float(value)
-                        i = int(value)
-                    except ValueError:
-                        pass
-                    if i is not None or f is not None:
-                        if f and i != f:
-                            value = f
-                        else:
-                            value = i
-                    rd.append(value)
-                rowdata = rd
-
-            result.append(rowdata)
-
-        if header and result:
-            result.pop(0)
-
-        if rows and len(result) > rows:
-            result = result[:rows]
+        result = list(records)
 
         if rows == 1 or rows == 0 and len(result) == 1:
             return result[0]
@@ -466,13 +538,15 @@ class ExpressionMethods:
     def f_datetime(datetime, date_format=None, tz=None):
         """Format a datetime object according to a format string"""
 
-        return tzutil.format_datetime(datetime, tz=tz, date_format=date_format)
+        return get_tzutil().format_datetime(datetime, tz=tz, date_format=date_format)
 
     @staticmethod
     def f_defang(s: str):
         """Return a defanged representation of string, ie, one with
         textual indicators of compromise converted to the defanged state"""
 
+        import ioc_fanger
+
         return ioc_fanger.defang(s)
 
     @coerce
@@ -492,6 +566,26 @@ class ExpressionMethods:
 
         return d
 
+    @staticmethod
+    def f_difference(array, *arrays):
+        """Return the unique elements of array that are not in any of the other arrays.
+        Elements are compared like unique(), so dictionaries with the same keys and
+        values but different order are the same."""
+
+        for ob in (array,) + arrays:
+            if not isinstance(ob, (list, tuple)):
+                raise TypeError('arrays must be lists or tuples')
+
+        seen = set().union(*map(canonical.key_set, arrays))
+        result = []
+        for element in array:
+            key = canonical.canonical_key(element)
+            if key not in seen:
+                seen.add(key)
+                result.append(element)
+
+        return result
+
     @coerce
     @staticmethod
     def f_erf(x: Union[int, float]):
@@ -522,7 +616,14 @@ class ExpressionMethods:
 
     @coerce
     def f_extract_indicators(
-        self, data: Union[bytes, str], ignore=None, dedup=True, fang=False, convert=True
+        self,
+        data: Union[bytes, str, list, tuple],
+        ignore=None,
+        dedup=True,
+        fang=False,
+        convert=True,
+        chunked=False,
+        overlap=1024,
     ):
         """Extract IOCs from data, which may be bytes or string.
         If fang is true, data is re-fanged before processing. This option is
@@ -531,7 +632,13 @@ class ExpressionMethods:
         If convert is true, bytesmode matches will be converted to utf-8, or
         the specified conversion e.g. convert='latin-1'.
         Returns a list of (indicator, value) tuples.  If dedup is True,
-        duplicate results are not returned."""
+        duplicate results are not returned.
+
+        If data is a list, each item is scanned separately.  If chunked is
+        true, the list is instead taken as the chunks (all bytes or all
+        strings) of one larger input, which are scanned in turn with an overlap
+        of overlap characters, so indicators up to that length spanning chunks
+        are found."""
 
         results = []
         result_set = set()
@@ -542,13 +649,7 @@ class ExpressionMethods:
         if not isinstance(ignore, list):
             ignore = [ignore]
 
-        regexes = self.f_indicator_patterns()
-
-        bytesmode = isinstance(data, bytes)
-        if bytesmode:
-            flags = re.MULTILINE | re.DOTALL
-        else:
-            flags = re.MULTILINE
+        scanner = indicator_scanner(tuple(self.f_indicator_patterns().items()))
 
         encoding = convert if isinstance(convert, str) else 'utf-8'
 
@@ -557,21 +658,38 @@ class ExpressionMethods:
             if isinstance(ignorable, bytes):
                 extra_ignore.append(ignorable.decode(encoding))
 
-        ignore.extend(extra_ignore)
+        ignore = ignore + extra_ignore
 
-        if fang and not bytesmode:
-            data = ioc_fanger.fang(data)
+        if not isinstance(data, (list, tuple)):
+            items = [data]
+            chunked = False
+        elif chunked:
+            items = [data]
+        else:
+            items = data
 
-        for key, value in regexes.items():
-            if value in ignore:
-                continue
-            if bytesmode:
-                value = bytes(value, 'utf-8')
-                if value in ignore:
-                    continue
-            all_hits = re.finditer(value, data, flags)
-            for match in all_hits:
-                hit = data[match.start() : match.end()]
+        for item in items:
+            if chunked:
+                bytesmode = bool(item) and isinstance(item[0], bytes)
+            else:
+                if not isinstance(item, (bytes, str)):
+                    item = str(item)
+                bytesmode = isinstance(item, bytes)
+
+            if fang and not bytesmode:
+                import ioc_fanger
+
+                if chunked:
+                    item = [ioc_fanger.fang(chunk) for chunk in item]
+                else:
+                    item = ioc_fanger.fang(item)
+
+            if chunked:
+                hits = scanner.scan_stream(item, ignore, overlap)
+            else:
+                hits = scanner.scan(item, ignore)
+
+            for key, hit in hits:
                 if bytesmode and convert:
                     hit = hit.decode(encoding)
                 v = (key, hit)
@@ -593,25 +711,32 @@ class ExpressionMethods:
         """Return a fanged representation of string, ie, one with
         textual indicators of compromise reverted from the defanged state"""
 
+        import ioc_fanger
+
         return ioc_fanger.fang(s)
 
-    @functools.lru_cache(32)
     def indicator_name_to_branch(self, name):
         """Convert the indicator name to the API branch"""
 
         if '.' in name:
             name = name.split('.', 1)[0]
+        name = name.lower()
 
         indicator_types = self.f_indicator_types()
 
         for indicator_type in indicator_types:
-            if indicator_type.get('name') == name:
+            if indicator_type.get('name', '').lower() == name:
                 return indicator_type.get('apiBranch')
 
         return None
 
+    def fetch_json(self, path, params=None):
+        """Fetch path from the ThreatConnect API, returning the JSON data"""
+
+        return self.tcex.session.get(path, params=params).json()
+
     def f_fetch_indicators(
-        self, *search_values: Union[list, tuple], default_type=None
+        self, *search_values: Union[list, tuple], default_type=None, fields=None
     ) -> List[dict]:
         """Fetches available indicators from ThreatConnect based on
         search_values.  A search value is either an indicator value (which uses
@@ -621,6 +746,13 @@ class ExpressionMethods:
         Returns a list of [(indicator_type, indicator_value, api_entity, indicator), ...],
         but the api_entity, result, and owners will be None if that
         indicator was not found.
+
+        If fields is specified, it is a field name or list of field names to
+        fetch for each indicator, out of owners, observationCount, attribute,
+        securityLabel, associations, and tag.  By default, all are fetched.
+
+        Indicators are fetched concurrently, and are only fetched once per
+        run for the same indicator type and value.
         """
 
         # pylint: disable=no-member
@@ -628,7 +760,19 @@ class ExpressionMethods:
         if not self.tcex:
             raise RuntimeError('TCEX not initialized, cannot retrieve indicators')
 
-        result = []
+        if fields is None:
+            fields = list(INDICATOR_FIELDS)
+        elif isinstance(fields, str):
+            fields = [fields]
+
+        for field in fields:
+            if field not in INDICATOR_FIELDS:
+                raise ValueError(f'{field} is not a known indicator field')
+
+        cache = getattr(self, 'fetched_indicators', None)
+        if cache is None:
+            cache = {}
+            setattr(self, 'fetched_indicators', cache)
 
         if len(search_values) == 1:  # did we get passed in a nested list?
             if isinstance(search_values[0], (list, tuple)):
@@ -639,98 +783,81 @@ class ExpressionMethods:
                         # if the first word in the tuple isn't a type, un-nest it
                         search_values = search_values[0]  # un-nest
 
+        keys = []
+        paths = {}
         for search_value in search_values:
             source = search_value
 
             if not isinstance(source, (list, tuple)):
                 source = [default_type, source]
 
-            self.tcex.log.debug(f'Looking up indicator {source!r}')
-
             indicator_name = source[0]
             indicator_value = source[1]
             api_branch = self.indicator_name_to_branch(indicator_name)
             if not api_branch:
                 raise ValueError(f'{indicator_name} is not a known indicator type')
 
-            path = (
-                f'/v2/indicators/{urllib.parse.quote_plus(api_branch)}/'
-                f'{urllib.parse.quote_plus(indicator_value)}'
-            )
-            indicator = self.tcex.session.get(path, params={'includeAdditional': 'true'}).json()
-            if indicator['status'] != 'Success':
-                api_entity = None
-                answer = None
-                self.tcex.log.debug(f'Failed fetching {path}: {indicator}')
-            else:
-                answer = indicator.get('data')
-                api_entity = list(answer.keys())[0]
-                answer = answer.get(api_entity)
-
-            if answer:
-                owners = self.tcex.session.get(
-                    path + '/owners',
-                ).json()
-                if owners.get('status') != 'Success':
-                    owners = None
-                else:
-                    owners = owners.get('data', {}).get('owner', None)
-
-                answer['owners'] = owners
-
-                observationCount = self.tcex.session.get(
-                    path + '/observationCount',
-                ).json()
-                if observationCount.get('status') != 'Success':
-                    observationCount = None
-                else:
-                    observationCount = observationCount.get('data', {}).get(
-                        'observationCount', None
-                    )
-
-                answer['observationCount'] = observationCount
-
-                attributes = self.tcex.session.get(
-                    path + '/attributes',
-                ).json()
-                if attributes.get('status') != 'Success':
-                    attributes = None
-                else:
-                    attributes = attributes.get('data', {}).get('attribute', None)
-
-                answer['attribute'] = attributes
-
-                securitylabels = self.tcex.session.get(
-                    path + '/securityLabels',
-                ).json()
-                if securitylabels.get('status') != 'Success':
-                    securitylabels = None
-                else:
-                    securitylabels = securitylabels.get('data', {}).get('securityLabel', None)
-
-                answer['securityLabel'] = securitylabels
-
-                groups = self.tcex.session.get(
-                    path + '/groups',
-                ).json()
-                if groups.get('status') != 'Success':
-                    groups = None
+            # the cache is keyed by API branch, so any spelling of a type shares it
+            key = (api_branch, indicator_value)
+            keys.append((indicator_name, key))
+            if key not in cache:
+                paths[key] = (
+                    f'/v2/indicators/{urllib.parse.quote_plus(api_branch)}/'
+                    f'{urllib.parse.quote_plus(indicator_value)}'
+                )
+
+        with concurrent.futures.ThreadPoolExecutor(FETCH_WORKERS) as executor:
+            futures = {}
+            for key, path in paths.items():
+                self.tcex.log.debug(f'Looking up indicator {key!r}')
+                futures[key] = executor.submit(self.fetch_json, path, {'includeAdditional': 'true'})
+
+            for key, future in futures.items():
+                indicator = future.result()
+                if indicator['status'] != 'Success':
+                    self.tcex.log.debug(f'Failed fetching {paths[key]}: {indicator}')
+                    cache[key] = {'api_entity': None, 'answer': None}
                 else:
-                    groups = groups.get('data', {}).get('group', [])
-
-                answer['associations'] = groups
-
-                tags = self.tcex.session.get(
-                    path + '/tags',
-                ).json()
-                if tags.get('status') != 'Success':
-                    tags = None
+                    answer = indicator.get('data')
+                    api_entity = list(answer.keys())[0]
+                    cache[key] = {
+                        'api_entity': api_entity,
+                        'answer': answer.get(api_entity),
+                        'path': paths[key],
+                        'fields': {},
+                    }
+
+            # fetch the fields of found indicators that haven't been fetched yet
+            futures = {}
+            for key in dict.fromkeys(key for _, key in keys):
+                cached = cache[key]
+                if not cached['answer']:
+                    continue
+                for field in fields:
+                    if field not in cached['fields']:
+                        subpath = INDICATOR_FIELDS[field][0]
+                        futures[key, field] = executor.submit(
+                            self.fetch_json, cached['path'] + subpath
+                        )
+
+            for (key, field), future in futures.items():
+                _, data_key, default = INDICATOR_FIELDS[field]
+                value = future.result()
+                if value.get('status') != 'Success':
+                    value = None
                 else:
-                    tags = tags.get('data', {}).get('tag', None)
-
-                answer['tag'] = tags
+                    value = value.get('data', {}).get(data_key, default)
+                cache[key]['fields'][field] = value
 
-            result.append((indicator_name, indicator_value, api_entity, answer))
+        result = []
+        for indicator_name, key in keys:
+            cached = cache[key]
+            answer = cached['answer']
+            if answer:
+                answer = dict(answer)
+                for field in fields:
+                    answer[field] = cached['fields'][field]
+            result.append((indicator_name, key[1], cached['api_entity'], answer))
 
         return result
 
@@ -759,9 +886,21 @@ class ExpressionMethods:
         structure elements may be accessed with dot or bracket notation and without quotes
         around key names, e.g. `blob[0][events][0][source][device][ipAddress]`
         or `blob[0].events[0].source.device.ipAddress`.  If default is set,
-        that value will be used for any missing value."""
+        that value will be used for any missing value, otherwise missing values
+        are formatted as an empty string."""
+
+        if default is not __notfound__:
+            kwargs['_default'] = default
+        return smart_format(s, *args, _context=self, **kwargs)
 
-        return smart_format(s, *args, _default=default, _context=self, **kwargs)
+    def f_format_many(self, s: str, records: list, default=__notfound__, **kwargs):
+        """Format string S, as format() does, once for each of the records (dictionaries),
+        with the values of the record and any other keyword arguments.  The format string
+        is parsed only once."""
+
+        if default is not __notfound__:
+            kwargs['_default'] = default
+        return smart_format_many(s, records, _context=self, **kwargs)
 
     @staticmethod
     def f_fuzzydist(hash1, hash2):
@@ -769,9 +908,61 @@ class ExpressionMethods:
 
         return edit_dist(hash1, hash2)
 
+    @staticmethod
+    def f_fuzzydist_many(hash1, hashes, limit=None):
+        """Return the list of edit distances between a fuzzy hash and each
+        of a list of fuzzy hashes.  If limit is set, distances over the
+        limit are returned as null."""
+
+        return edit_dist_many(hash1, hashes, limit=limit)
+
+    def f_fuzzysearch(self, hash1, corpus, k=10, limit=None):
+        """Return the k fuzzy hashes in corpus most similar to hash1, closest
+        first, as a list of {source, digest, distance}.  Corpus is either a
+        list of fuzzy hashes (the source is the position in the list), a
+        dictionary of source: fuzzy hash, or the path of an index file built
+        by spamspy.ngram, whose name must end in .ngram; it is opened read-only.
+        If limit is set, hashes with an edit distance over the limit are
+        excluded."""
+
+        if isinstance(corpus, str):
+            indexes = getattr(self, 'fuzzy_indexes', None)
+            if indexes is None:
+                indexes = {}
+                setattr(self, 'fuzzy_indexes', indexes)
+            index = indexes.get(corpus)
+            if index is None:
+                if not os.path.realpath(corpus).endswith(INDEX_SUFFIX):
+                    raise ValueError(f'{corpus} is not a fuzzy hash index ({INDEX_SUFFIX} file)')
+                if not os.path.isfile(corpus):
+                    raise FileNotFoundError(f'No fuzzy hash index at {corpus}')
+                index = indexes[corpus] = NgramIndex(corpus, readonly=True)
+        else:
+            if isinstance(corpus, dict):
+                entries = [(digest, source) for source, digest in corpus.items()]
+            else:
+                entries = [(digest, source) for source, digest in enumerate(corpus)]
+
+            # the index of the most recent corpus is kept for repeated searches
+            cached = getattr(self, 'fuzzy_corpus', None)
+            if cached is not None and cached[0] == entries:
+                index = cached[1]
+            else:
+                if cached is not None:
+                    cached[1].close()
+                index = NgramIndex()
+                index.add_many(entries)
+                setattr(self, 'fuzzy_corpus', (entries, index))
+
+        results = index.search(hash1, k=k, limit=limit)
+        return [
+            {'source': source, 'digest': digest, 'distance': distance}
+            for source, digest, distance in results
+        ]
+
     @staticmethod
     def f_fuzzyhash(data):
-        """Return the fuzzy hash of data"""
+        """Return the fuzzy hash of data, which may be a string or bytes"""
 
         return spamsum(data)
 
@@ -804,6 +995,26 @@ class ExpressionMethods:
         """Greatest Common Denominator of A and B"""
         return math.gcd(a, b)
 
+    @staticmethod
+    def f_group_by(array, key=None):
+        """Group the elements of array by the value of their key, or by the element itself
+        if key is not given, returning a list of dictionaries with the group value as the
+        'key' and the list of elements in the group as the 'value', in the order the groups
+        were first seen.  Values are compared like unique()."""
+
+        if not isinstance(array, (list, tuple)):
+            raise TypeError('array must be a list or tuple')
+
+        if key is None:
+            groups = canonical.group(array)
+        else:
+            for item in array:
+                if not isinstance(item, dict):
+                    raise TypeError('array must only contain dictionaries')
+            groups = canonical.group(array, lambda item: item.get(key))
+
+        return [{'key': value, 'value': items} for value, items in groups.values()]
+
     @coerce
     @staticmethod
     def f_hex(n: int, sign=True):
@@ -845,30 +1056,101 @@ class ExpressionMethods:
             return int(s, radix)
         return int(s)
 
-    @functools.lru_cache(maxsize=1)
-    def f_indicator_patterns(self):
-        """Returns a dictionary of regular expression patterns for indicators
-        of compromise, based on ThreatConnect Data."""
+    @staticmethod
+    def f_intersect(array, *arrays):
+        """Return the unique elements of array that are in all of the other arrays.
+        Elements are compared like unique(), so dictionaries with the same keys and
+        values but different order are the same."""
 
-        # pylint: disable=no-member
+        for ob in (array,) + arrays:
+            if not isinstance(ob, (list, tuple)):
+                raise TypeError('arrays must be lists or tuples')
 
-        if not self.tcex:
-            raise RuntimeError('TCEX not initialized, cannot retrieve patterns')
+        common = [canonical.key_set(ob) for ob in arrays]
+        seen = set()
+        result = []
+        for element in array:
+            key = canonical.canonical_key(element)
+            if key not in seen and all(key in keys for keys in common):
+                seen.add(key)
+                result.append(element)
 
-        result = {}
+        return result
+
+    def parse_json(self, data: str):
+        """Return json.loads(data), parsed once per evaluation for the same string"""
+
+        memo = self.parsed_json
+        if memo is None:
+            memo = self.parsed_json = {}
+
+        # the memo keeps a reference to data, so its id isn't reused
+        entry = memo.get(id(data))
+        if entry is None:
+            entry = memo[id(data)] = (data, json.loads(data))
+
+        return entry[1]
+
+    def indicator_cache(self):
+        """Return the indicator type and pattern cache"""
+
+        cache = getattr(self, 'indicator_types_cache', None)
+        if cache is None:
+            default_args = getattr(self.tcex, 'default_args', None)
+            cache = IndicatorCache(
+                getattr(default_args, 'tc_api_path', None),
+                getattr(default_args, 'tc_temp_path', None) or None,
+            )
+            setattr(self, 'indicator_types_cache', cache)
+
+        return cache
 
-        types = self.f_indicator_types()
+    def fetch_indicator_types(self, etag=None):
+        """Fetch the indicator types, returning (types, etag), or (None, etag) if
+        the types are unchanged since etag"""
 
+        headers = {'If-None-Match': etag} if etag else None
+        response = self.tcex.session.get(
+            '/v2/types/indicatorTypes', params={'includeAdditional': 'true'}, headers=headers
+        )
+        if response.status_code == 304:
+            return None, etag
+
+        types = response.json()
+        if types['status'] != 'Success':
+            raise RuntimeError('Failed to retrieve indicator types')
+
+        return types.get('data', {}).get('indicatorType', []), response.headers.get('ETag')
+
+    def fetch_indicator_patterns(self, types):
+        """Fetch the regular expression patterns for the parsable indicator types,
+        returning (patterns, complete)"""
+
+        parsable = []
         for ioc_type in types:
             entityName = ioc_type.get('apiEntity')
             self.tcex.log.debug(f'IndicatorType {entityName} = {ioc_type}')
-            if ioc_type.get('parsable', 'false') != 'true':
-                continue
-            ioc_data = self.tcex.session.get(
-                f'/v2/types/indicatorTypes/{entityName}', params={'includeAdditional': 'true'}
-            ).json()
+            if ioc_type.get('parsable', 'false') == 'true':
+                parsable.append(ioc_type)
+
+        with concurrent.futures.ThreadPoolExecutor(FETCH_WORKERS) as executor:
+            futures = [
+                executor.submit(
+                    self.fetch_json,
+                    f'/v2/types/indicatorTypes/{ioc_type.get("apiEntity")}',
+                    {'includeAdditional': 'true'},
+                )
+                for ioc_type in parsable
+            ]
+
+        result = {}
+        complete = True
+
+        for ioc_type, future in zip(parsable, futures):
+            ioc_data = future.result()
             self.tcex.log.debug(f'Indicator Data: {ioc_data}')
             if ioc_data['status'] != 'Success':
+                complete = False
                 continue
             type_keys = ioc_type.get('keys', {})
             ioc_name = ioc_type.get('name')
@@ -884,9 +1166,21 @@ class ExpressionMethods:
                 result[key] = value
         self.tcex.log.debug(f'IOC Regexes: {result}')
 
-        return result
+        return result, complete
+
+    def f_indicator_patterns(self):
+        """Returns a dictionary of regular expression patterns for indicators
+        of compromise, based on ThreatConnect Data."""
+
+        # pylint: disable=no-member
+
+        if not self.tcex:
+            raise RuntimeError('TCEX not initialized, cannot retrieve patterns')
+
+        cache = self.indicator_cache()
+        cache.types(self.fetch_indicator_types)
+        return cache.patterns(self.fetch_indicator_patterns)
 
-    @functools.lru_cache(maxsize=1)
     def f_indicator_types(self):
         """Return the ThreatConnect Indicator Types"""
         # pylint: disable=no-member
@@ -894,13 +1188,7 @@ class ExpressionMethods:
         if not self.tcex:
             raise RuntimeError('TCEX not initialized, cannot retrieve types')
 
-        types = self.tcex.session.get(
-            '/v2/types/indicatorTypes', params={'includeAdditional': 'true'}
-        ).json()
-        if types['status'] != 'Success':
-            raise RuntimeError('Failed to retrieve indicator types')
-
-        return types.get('data', {}).get('indicatorType', [])
+        return self.indicator_cache().types(self.fetch_indicator_types)
 
     @staticmethod
     def f_items(ob: dict):
@@ -908,14 +1196,20 @@ class ExpressionMethods:
 
         return list(ob.items())
 
-    @staticmethod
-    def f_jmespath(path, ob):
+    def f_jmespath(self, path, ob):
         """JMESPath search"""
 
         if isinstance(ob, str):
-            ob = json.loads(ob)
+            ob = self.parse_json(ob)
+
+        return compile_jmespath(path).search(ob)
+
+    def f_jmespath_many(self, path, obs):
+        """Return the list of JMESPath searches of each of a list of objects (or JSON strings),
+        compiling the path once"""
 
-        return jmespath.search(path, ob)
+        expression = compile_jmespath(path)
+        return [expression.search(self.parse_json(ob) if isinstance(ob, str) else ob) for ob in obs]
 
     @staticmethod
     def f_join(separator, *elements):
@@ -1284,18 +1578,10 @@ class ExpressionMethods:
     def f_refindall(pattern, string, flags=''):
         """Find all instances of the regular expression in source"""
 
-        f = 0
-        if isinstance(flags, int):
-            f = flags
-        elif isinstance(flags, str):
-            for c in flags:
-                c = c.upper()
-                i = getattr(re, c, None)
-                if i:
-                    f += i
+        regex = compile_regex(pattern, regex_flags(flags))
 
         result = []
-        match_iter = re.finditer(pattern, string, flags=f)
+        match_iter = regex.finditer(string)
         for m in match_iter:
             result.append(m.group())
 
@@ -1304,21 +1590,19 @@ class ExpressionMethods:
 
         return None
 
+    @staticmethod
+    def f_refindall_many(pattern, strings, flags=''):
+        """Return the list of refindall() results for each of a list of strings,
+        compiling the pattern once"""
+
+        regex = compile_regex(pattern, regex_flags(flags))
+        return [[m.group() for m in regex.finditer(string)] or None for string in strings]
+
     @staticmethod
     def f_rematch(pattern, string, flags=''):
         """Regular expression match pattern to source"""
 
-        f = 0
-        if isinstance(flags, int):
-            f = flags
-        elif isinstance(flags, str):
-            for c in flags:
-                c = c.upper()
-                i = getattr(re, c, None)
-                if i:
-                    f += i
-
-        m = re.match(pattern, string, flags=f)
+        m = compile_regex(pattern, regex_flags(flags)).match(string)
         if m:
             return m.group()
         return None
@@ -1405,17 +1689,7 @@ class ExpressionMethods:
     def f_research(pattern, string, flags=''):
         """Regular expression search pattern to source"""
 
-        f = 0
-        if isinstance(flags, int):
-            f = flags
-        elif isinstance(flags, str):
-            for c in flags:
-                c = c.upper()
-                i = getattr(re, c, None)
-                if i:
-                    f += i
-
-        m = re.search(pattern, string, flags=f)
+        m = compile_regex(pattern, regex_flags(flags)).search(string)
         if m:
             return m.group()
         return None
@@ -1433,18 +1707,30 @@ class ExpressionMethods:
         result = rp.parse(source, context=context)
         if strip or convert:
             for key, value in result.items():
-                if strip:
-                    value = value.strip()
-                if convert:
-                    try:
-                        ov = value
-                        value = float(value)
-                        if int(value) == value and '.' not in ov:
-                            value = int(value)
-                    except (TypeError, ValueError):
-                        pass
+                result[key] = convert_value(value, strip=strip, convert=convert)
+        return result
+
+    def f_rexxparse_many(self, lines, template: str, strip=False, convert=False, **kwargs):
+        """REXX parse of each of lines, which is a list of strings or a string of lines,
+        using template.  The result is a dictionary of the list of values of each variable
+        in the template, one value for each line.  The template is parsed only once; strip,
+        convert and any other keyword arguments are as for rexxparse()."""
+
+        if isinstance(lines, bytes):
+            lines = lines.decode('utf-8')
+        if isinstance(lines, str):
+            lines = lines.splitlines()
+
+        rp = RexxParser(template, context=SmartDict(self, kwargs))
+        result = {name: [] for name in rp.names}
+        columns = list(result.values())
+        for line in lines:
+            values = rp.parse(str(line)).values()
+            if strip or convert:
+                values = [convert_value(value, strip=strip, convert=convert) for value in values]
+            for column, value in zip(columns, values):
+                column.append(value)
 
-                result[key] = value
         return result
 
     @coerce
@@ -1571,7 +1857,7 @@ class ExpressionMethods:
     def f_timedelta(datetime_1, datetime_2):
         """Return the delta between time 1 and time 2"""
 
-        return tzutil.timedelta(datetime_1, datetime_2)
+        return get_tzutil().timedelta(datetime_1, datetime_2)
 
     @coerce
     @staticmethod
@@ -1644,23 +1930,14 @@ class ExpressionMethods:
     @staticmethod
     def f_unique(*args):
         """Return the list of unique elements of arguments, which may be a list of arguments, or a
-        single argument that is a list.  Inputs are compared by converting them to
+        single argument that is a list.  Inputs are compared as if they were converted to
         sorted JSON objects, so dictionaries with the same keys and values but different
         order will count as duplicates."""
 
         if len(args) == 1 and isinstance(args[0], (list, tuple)):
             args = args[0]
 
-        seen = set()
-        result = []
-        for element in args:
-            key = json.dumps(element, sort_keys=True, ensure_ascii=False)
-            if key in seen:
-                continue
-            result.append(element)
-            seen.add(key)
-
-        return result
+        return canonical.unique(args)
 
     @staticmethod
     def f_unnest(iterable):
@@ -1701,7 +1978,7 @@ class ExpressionMethods:
         The stream argument will *always* be set to True.
         The proxies argument will default to the system specified proxies.
 
-        URL requests are throttled to one request every 3 seconds.
+        URL requests are throttled to 20 requests per minute.
 
         If there is a json result, the json method on the result will
         be replaced with a json attribute that is the result of the json
@@ -1711,6 +1988,7 @@ class ExpressionMethods:
             rate=request rate per period  (default: 20)
             period=number of seconds in a period (default: 60)
             burst=number of requests to burst before throttling (default: 0)
+            per_host=throttle each host separately (default: False)
 
         Only one rate throttle is maintained; switching throttles with multiple
         url function expressions will not yield intended results.
@@ -1726,6 +2004,8 @@ class ExpressionMethods:
             session = getattr(self, 'session', None)
 
         if session is None:
+            import requests
+
             session = requests.Session()
             setattr(self, 'session', session)
 
@@ -1737,6 +2017,7 @@ class ExpressionMethods:
         rate = kwargs.pop('rate', 20)
         period = kwargs.pop('period', 60)
         burst = kwargs.pop('burst', 0)
+        per_host = kwargs.pop('per_host', False)
         throttle = getattr(self, 'throttle', None)
 
         if throttle is None:
@@ -1748,7 +2029,7 @@ class ExpressionMethods:
             throttle = Throttle(rate, period, burst)
             setattr(self, 'throttle', throttle)
 
-        throttle()
+        throttle(urllib.parse.urlsplit(url).hostname if per_host else None)
 
         if self.tcex:
             self.tcex.log.debug(f'URL: {method} {url} {kwargs}')
@@ -1823,7 +2104,9 @@ class ExpressionMethods:
 
     @coerce
     @staticmethod
-    def f_xmlread(xmldata: str, namespace=False, strip=True, convert=True, compact=False):
+    def f_xmlread(
+        xmldata: str, namespace=False, strip=True, convert=True, compact=False, select=None
+    ):
         """Constructs an object from XML data.  The XML data should have
         a single root node.  If namespace is True, the resolved namespace will
         be prefixed to tag names in braces, i.e. {namespace}tag.  If strip
@@ -1832,8 +2115,24 @@ class ExpressionMethods:
         equivalents.  If compact is true, the object will be compacted to
         a more condensed form if possible.  Attribute names will be prefixed
         with @ in the corresponding output.
+
+        If select is a path of tag names, e.g. 'Indicators/Indicator', the XML
+        data is read incrementally, and the result is the list of objects for the
+        elements matching the end of the path (or the whole path, if it starts
+        with /).  Only those elements are kept in memory, so large documents can
+        be read this way.  A path element of * matches any tag.
         """
 
+        if select:
+            return xml_select(
+                xmldata,
+                select,
+                namespace=namespace,
+                strip=strip,
+                convert=convert,
+                compact=compact,
+            )
+
         return xml_to_dict(
             xmldata,
             namespace=namespace,
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""Bulk reads of playbook variables
+
+Playbook variables are read one at a time, so each TC variable an expression
+references costs a round trip to the key value store.  A PrefetchStore wraps
+the App's key value store: prefetch() reads many variables with a single HMGET,
+and later reads of those variables are served from memory, so they are still
+decoded by the usual playbook read methods.
+
+Only the Redis key value store supports bulk reads; with the TC key value API,
+prefetch() does nothing and every read goes to the store.
+"""
+
+
+class PrefetchStore:
+    """Key value store serving reads from values read in bulk"""
+
+    def __init__(self, store):
+        """init"""
+
+        self.store = store
+        self.values = {}  # (context, key): raw value
+        self.round_trips = 0
+
+    def __getattr__(self, name):
+        """Pass any other methods through to the store"""
+
+        return getattr(self.store, name)
+
+    def prefetch(self, context, keys):
+        """Read the keys that haven't been read yet with one round trip,
+        returning the number of keys read"""
+
+        # KeyValueRedis doesn't wrap HMGET, so use its client
+        client = getattr(self.store, '_redis_client', None)
+        keys = [key for key in dict.fromkeys(keys) if (context, key) not in self.values]
+        if client is None or not keys:
+            return 0
+
+        values = client.hmget(context, keys)
+        self.round_trips += 1
+        for key, value in zip(keys, values):
+            self.values[(context, key)] = value
+
+        return len(keys)
+
+    def read(self, context, key, decode='utf-8'):
+        """Read the value for key, from memory if it was prefetched"""
+
+        try:
+            value = self.values[(context, key)]
+        except KeyError:
+            self.round_trips += 1
+            return self.store.read(context, key, decode=decode)
+
+        if isinstance(value, bytes) and decode:
+            value = value.decode(decode)
+        return value
+
+    def create(self, context, key, value):
+        """Create key/value pair, forgetting any prefetched value"""
+
+        self.values.pop((context, key), None)
+        return self.store.create(context, key, value)
+
+    def delete(self, context, key):
+        """Delete key, forgetting any prefetched value"""
+
+        self.values.pop((context, key), None)
+        return self.store.delete(context, key)
@@ -5,10 +5,9 @@
 from collections import OrderedDict
 from functools import lru_cache
 import re
-from typing import List
+from typing import Iterator, List
 
 # third-party
-from attrdict import AttrDict
 from hyphenate import hyphenate_word
 
 
@@ -17,6 +16,13 @@ optionsRE = re.compile(r'((?:[^/\\]|\\.)+)')
 DECODE = {'n': '\n', 'r': '\r', 't': '\t', 'b': '\b', 'f': '\f'}
 
 
+class Specifier(dict):
+    """Parsed column specifier, with attribute access to the options.  Options
+    that aren't given are None."""
+
+    __getattr__ = dict.get
+
+
 class Report:
     """Report Class"""
 
@@ -190,27 +196,11 @@ class Report:
         # print(f'hyphenate({value!r}) = {word!r}, {remainder!r}')
         return word, remainder
 
-    def pad_block(self, value, specifier):
-        """Pad this value to the width of the field"""
-
-        if not value:
-            value = ''
-        value = str(value)
-        # ovalue = value
-
-        width = self.parse_specifier(specifier).width
-
-        value += ' ' * width
-        value = value[:width]
-
-        # print(f'pad_block({ovalue!r}, {specifier!r}) = {value!r}')
-        return value
-
     @lru_cache(50)
     def parse_specifier(self, specifier):  # pylint: disable=no-self-use
         """Parse a Specifier"""
 
-        result = AttrDict()
+        result = Specifier()
 
         if not isinstance(specifier, str):
             specifier = str(specifier)
@@ -227,8 +217,8 @@ class Report:
 
         width, height = specifier.split(':', 1)
 
-        result.width = int(width)
-        result.height = int(height)
+        result['width'] = int(width)
+        result['height'] = int(height)
         for option in options:
             if '=' in option:
                 name, value = option.split('=', 1)
@@ -241,60 +231,62 @@ class Report:
     def render(self) -> str:
         """Render this report"""
 
+        return '\n'.join(self.render_iter())
+
+    def render_iter(self) -> Iterator[str]:
+        """Render this report a line at a time"""
+
         if not self.data:
-            return ''
+            return
+
+        lines = self.render_lines()
+        if self.fixedwidth:
+            lines = (line[: self.fixedwidth] for line in lines)
+
+        yield from lines
+
+    def render_lines(self) -> Iterator[str]:
+        """The lines of this report, before trimming to the report width"""
 
-        result = []
         if self.title:
             title_row = self.title.center(self.width)
-            result.append('')
-            result.append('')
-            result.append(title_row)
-            underscores = ''.join(['-' if c != ' ' else ' ' for c in title_row])
-            result.append(underscores)
-            result.append('')
+            yield ''
+            yield ''
+            yield title_row
+            yield ''.join(['-' if c != ' ' else ' ' for c in title_row])
+            yield ''
 
         if self.prolog:
-            result.append('')
-            result.extend(self.render_data(self.prolog, str(self.width)))
-            result.append('')
+            yield ''
+            yield from self.render_data(self.prolog, str(self.width))
+            yield ''
 
         if self.headers:
-            line = ''
+            titles = []
+            rules = []
             for name, specification in self.fields[0].items():
                 spec = self.parse_specifier(specification)
                 title = spec.label or self.format_heading(name)
-                line += title.ljust(spec.width)[: spec.width] + ' '
-            result.append(line)
-
-            line = ''
-            for name, specification in self.fields[0].items():
-                spec = self.parse_specifier(specification)
-                line += ''.ljust(spec.width, '-')[: spec.width] + ' '
-            result.append(line)
+                titles.append(title.ljust(spec.width)[: spec.width] + ' ')
+                rules.append('-' * spec.width + ' ')
+            yield ''.join(titles)
+            yield ''.join(rules)
 
         self.lineno = 1
         for item in self.data:
             self.record = item
-            result.extend(self.render_row(item))
+            yield from self.render_row(item)
             self.lineno += 1
 
         if self.epilog:
-            result.append('')
-            result.extend(self.render_data(self.epilog, str(self.width)))
-            result.append('')
-
-        if self.fixedwidth:
-            result = [x[: self.fixedwidth] for x in result]
-
-        # print(f'render: {result!r}')
-        return '\n'.join(result)
+            yield ''
+            yield from self.render_data(self.epilog, str(self.width))
+            yield ''
 
     def render_data(self, value, specifier) -> List[str]:
         """Render a specific value to a block (list) of strings"""
 
-        # N.B. the phantoms in attrdict take care of missing
-        # values
+        # N.B. missing options in the specifier are None
 
         result = []
         spec = self.parse_specifier(specifier)
@@ -358,28 +350,20 @@ class Report:
         result = []
 
         line_blocks = []
-
         for name, specifier in fields.items():
-            value = self.render_data(item.get(name, ''), specifier)
-            line_blocks.append((value, specifier))
-
-        row = 0
-        while True:
-            line = ''
-            found = False
-            for block, specifier in line_blocks:
-                # print(f'block: {block}, {len(block)}')
+            block = self.render_data(item.get(name, ''), specifier)
+            width = self.parse_specifier(specifier).width
+            line_blocks.append((block, width, ' ' * width))
+
+        rows = max((len(block) for block, _, _ in line_blocks), default=0)
+        for row in range(rows):
+            line = []
+            for block, width, padding in line_blocks:
                 if len(block) > row:
-                    line += self.pad_block(block[row], specifier) + ' '
-                    found = True
+                    line.append((block[row] + padding)[:width])
                 else:
-                    line += self.pad_block('', specifier) + ' '
-            row += 1
-
-            if found:
-                result.append(line[:-1])
-            else:
-                break
+                    line.append(padding)
+            result.append(' '.join(line))
 
         # print(f'render_fields({item!r}): {result!r}')
         return result
@@ -2,6 +2,7 @@
 """Reporting class to handle various reporting types"""
 
 from collections import OrderedDict
+from functools import partial
 import math
 import re
 
@@ -10,6 +11,9 @@ from report import Report
 from smartdict import smart_format
 
 
+# report_autowidth sizes columns from a sample of this many rows
+SAMPLE_ROWS = 1000
+
 formatRE = re.compile(r'([^{]*) (?: { ((?:[^}\\] | \\.)*) } (.*))?', re.VERBOSE)
 
 
@@ -21,6 +25,7 @@ class Reporting:
 
         self.context = context
         self.data = None
+        self.compiled_expressions = {}
 
     def count_depth(self, thing, depth=0):
         """Count how deep the thing is"""
@@ -190,7 +195,7 @@ class Reporting:
                     expr = expr[:bang]
 
                 try:
-                    expr = self.context.eval(expr, data)
+                    expr = self.compiled(expr)(data)
                 except Exception as e:
                     result = f'#Error {e!r}'
                     break
@@ -268,41 +273,63 @@ class Reporting:
         return result
 
     @staticmethod
-    def report_autowidth(data, line_width, headers=None):
-        """Generate the width of the report columns by looking at the data"""
+    def report_autowidth(data, line_width, headers=None, sample_rows=SAMPLE_ROWS):
+        """Generate the width of the report columns by looking at the data.  Large
+        data is sized from an evenly spaced sample of at most sample_rows rows."""
 
         column_length = {}
         max_width = {}
         average_width = {}
         rows = {}
 
-        for row in data:
-            if isinstance(row, dict):
-                for name in row:
-                    name = str(name)
-                    max_width[name] = max(max_width.get(name, 0), len(name))
+        def measure(block, only=None):
+            """Add the widths of the values in the rows of block (of the only
+            columns, if given)"""
 
-                for name, value in row.items():
-                    value = str(value)
-                    name = str(name)
-                    for v in value.split('\n'):
-                        column_length[name] = column_length.get(name, 0) + len(v)
-                        rows[name] = rows.get(name, 0) + 1
-                        max_width[name] = max(max_width.get(name, 0), len(v))
-            else:
-                columnno = 0
-                for value in row:
-                    name = data[0][columnno]
-                    name = str(name)
-                    columnno += 1
+            for row in block:
+                if isinstance(row, dict):
+                    values = [(str(name), value) for name, value in row.items()]
+                else:
+                    values = [(str(data[0][columnno]), value) for columnno, value in enumerate(row)]
 
+                for name, value in values:
+                    if only is not None and name not in only:
+                        continue
                     value = str(value)
-
+                    if isinstance(row, dict):
+                        max_width[name] = max(max_width.get(name, 0), len(name))
                     for v in value.split('\n'):
                         column_length[name] = column_length.get(name, 0) + len(v)
                         rows[name] = rows.get(name, 0) + 1
                         max_width[name] = max(max_width.get(name, 0), len(v))
 
+        if sample_rows and len(data) > sample_rows:
+            # the columns are those of every row; only their widths are sampled
+            names = {}
+            for row in data:
+                if isinstance(row, dict):
+                    names.update(dict.fromkeys(row))
+            names = dict.fromkeys(str(name) for name in names)
+
+            measure(data[:: -(-len(data) // sample_rows)])
+
+            missing = set(names) - set(max_width)
+            if missing:
+                # columns with no values in the sample are sized from their rows
+                measure(
+                    (
+                        row
+                        for row in data
+                        if isinstance(row, dict) and not missing.isdisjoint(map(str, row))
+                    ),
+                    only=missing,
+                )
+
+            names.update(dict.fromkeys(max_width))
+            max_width = {name: max_width[name] for name in names}
+        else:
+            measure(data)
+
         column_names = list(max_width.keys())
         if headers:
             colno = 0
@@ -364,18 +391,37 @@ class Reporting:
 
         return [columns]
 
+    def compiled(self, expression):
+        """Return a function of a record that evaluates the expression in the
+        context of that record, parsing the expression only once"""
+
+        evaluate = self.compiled_expressions.get(expression)
+        if evaluate is None:
+            if hasattr(self.context, 'compiled'):
+                evaluate = self.context.compiled(expression)
+            else:
+                evaluate = partial(self.context.eval, expression)
+            self.compiled_expressions[expression] = evaluate
+        return evaluate
+
     def sort_and_filter(self, data, sort=None, filter=None):
         """Filter and sort the data dictionaries"""
 
         if filter and hasattr(self.context, 'eval'):
             result = []
-            for record in data:
-                try:
-                    if self.context.eval(filter, record):
-                        result.append(record)
-                except Exception:
-                    # Bad filters don't halt report generation, they just exclude records
-                    pass
+            try:
+                predicate = self.compiled(filter)
+            except Exception:
+                predicate = None  # a filter that doesn't parse excludes every record
+
+            if predicate is not None:
+                for record in data:
+                    try:
+                        if predicate(record):
+                            result.append(record)
+                    except Exception:
+                        # Bad filters don't halt report generation, they just exclude records
+                        pass
             data = result
 
         if sort:
@@ -384,6 +430,7 @@ class Reporting:
             sort = list(sort)
             sort.reverse()  # process sort in reverse column order
 
+            # N.B. a stable sort per column is faster than one sort on a tuple key
             for sortcolumn in sort:
                 reverse = False
                 if sortcolumn.startswith('-'):
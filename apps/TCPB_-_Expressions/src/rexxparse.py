@@ -6,6 +6,7 @@ Derived from https://www.ibm.com/docs/en/zos/2.3.0?topic=parsing-details-steps-i
 """
 
 from collections import deque
+from functools import lru_cache
 import re
 
 tokenize_re = re.compile(
@@ -57,6 +58,18 @@ class reference(str):
         return f'<reference "{self}">'
 
 
+PLAN_CACHE_SIZE = 256
+
+# the steps of a parse plan are (trigger, operand, targets): the targets (the
+# variables and placeholders before the trigger) are assigned from the source
+# up to where the trigger moves the match position to.  Triggers are
+#   '+', '-'    relative positions, by operand columns
+#   '='         absolute position, at column operand
+#   'literal'   the next occurrence of the string operand
+#   ','         source change
+#   None        the end of the source
+
+
 class RexxParser:
     """Rexx Parser Object"""
 
@@ -64,21 +77,27 @@ class RexxParser:
         """Initializer"""
 
         self.source = None
-        self.pattern = None
+        self.plan = None
 
         if pattern:
-            self.pattern = self.tokenize(pattern)
-
-        self.start = None
-        self.end = None
-        self.length = None
-        self.match_start = None
-        self.match_end = None
-        self.match_position = None
+            self.plan = compile_template(pattern)
+
         self.context = context
         self.variables = None
 
-    def tokenize(self, pattern):
+    @property
+    def names(self):
+        """The names of the variables assigned by the template, in order"""
+
+        names = {}
+        for _, _, targets in self.plan or ():
+            for name in targets:
+                if name != '.':
+                    names[name] = None
+        return list(names)
+
+    @classmethod
+    def tokenize(cls, pattern):
         """Return a list of pattern tokens"""
 
         intermediate = deque()
@@ -87,7 +106,7 @@ class RexxParser:
             match = tokenize_re.match(pattern)
             if match:
                 token = match.groups()[0]
-                intermediate.append(self.encode_token(token))
+                intermediate.append(cls.encode_token(token))
                 pattern = pattern[match.end() :]
 
         result = []
@@ -141,175 +160,119 @@ class RexxParser:
 
         return variable(string)
 
-    def parse(self, source, pattern=None, context=None):
-        """Parse a source string with a pattern"""
-
-        if pattern:
-            self.pattern = self.tokenize(pattern)
-
-        self.source = source
-        self.start = 1
-        self.end = len(source) + 1
-        self.length = len(source)
-        self.match_start = 1
-        self.match_end = 1
-        self.match_position = 0
-        if context is not None:
-            self.context = context
-
-        self.variables = {}
-
-        tokens = deque(self.pattern)
-        while tokens:
-            pattern = self.next_pattern(tokens)
-            self.word_parse(pattern)
-
-        return self.variables
-
-    def next_pattern(self, tokens):
-        """Get the next pattern"""
-
-        # pylint: disable=too-many-return-statements
-
-        pattern = deque()
-
-        if not tokens:
-            self.start = self.match_end
-            self.match_start = self.length + 1
-            self.match_end = self.length + 1
-            return pattern
+    @classmethod
+    def compile(cls, pattern):
+        """Compile a pattern into a parse plan, a tuple of (trigger, operand, targets) steps"""
 
+        steps = []
+        targets = []
+        tokens = deque(cls.tokenize(pattern))
         while tokens:
             token = tokens.popleft()
-            if token == '.' and not isinstance(token, literal) or isinstance(token, variable):
-                pattern.append(token)
+            if isinstance(token, literal):
+                trigger = 'literal'
+            elif token == '.' or isinstance(token, variable):
+                targets.append(str(token))
                 continue
-
-            if token == '+' and not isinstance(token, literal):
-                token = tokens.popleft()
+            elif token in ('+', '-', '='):
+                trigger = token
+                token = tokens.popleft() if tokens else None
                 if not isinstance(token, (int, reference)):
                     raise ValueError(
-                        '+ in pattern must be followed by an integer or indirect variable reference'
+                        f'{trigger} in pattern must be followed by an integer or indirect '
+                        'variable reference'
                     )
-                if isinstance(token, reference):
-                    token = self.dereference(token, types=int)
-
-                # print(f'?+ start={self.start}, match_start={self.match_start}, '
-                # f'match_end={self.match_end}, '
-                # f'match={self.source[self.match_start-1:self.match_end-1]}')
-                # self.start = self.match_end
-                self.start = self.match_start
-                self.match_start = min(self.length + 1, self.match_start + token)
-                self.match_end = self.match_start
-                # print(f'+ start={self.start}, match_start={self.match_start}, '
-                # f'match_end={self.match_end}')
-                return pattern
-            if token == '-' and not isinstance(token, literal):
-                token = tokens.popleft()
-                if not isinstance(token, (int, reference)):
-                    raise ValueError(
-                        '- in pattern must be followed by an integer or indirect variable reference'
-                    )
-                if isinstance(token, reference):
-                    token = self.dereference(token, types=int)
-
-                self.start = self.match_start
-                self.match_start = max(1, self.match_start - token)
-                self.match_end = self.match_start
-                return pattern
-            if token == '=' and not isinstance(token, literal):
-                token = tokens.popleft()
-                if not isinstance(token, (int, reference)):
-                    raise ValueError(
-                        '= in pattern must be followed by an integer or indirect variable reference'
-                    )
-                if isinstance(token, reference):
-                    token = self.dereference(token, types=int)
+            elif isinstance(token, int):
+                trigger = '='
+            elif isinstance(token, reference):
+                trigger = 'literal'
+            elif token == ',':
+                trigger = ','
+            else:
+                raise RuntimeError(f'Unexpected token {token}')
 
-                self.start = self.match_end
-                self.match_start = min(self.length + 1, token)
-                self.match_end = self.match_start
-                return pattern
-            if isinstance(token, int):
-                self.start = self.match_end
-                self.match_start = min(self.length + 1, token)
-                self.match_end = self.match_start
-                return pattern
-            if isinstance(token, (literal, reference)):
-                if isinstance(token, reference):
-                    token = self.dereference(token, types=str)
+            steps.append((trigger, token, tuple(targets)))
+            targets = []
 
-                if self.start < self.match_end:
-                    self.start = self.match_end
+        if targets:
+            steps.append((None, None, tuple(targets)))
 
-                idx = self.source.find(str(token), self.start - 1) + 1
+        return tuple(steps)
 
-                # print(f'# find {token} at {idx}, start={self.start}')
+    def parse(self, source, pattern=None, context=None):
+        """Parse a source string with a pattern"""
 
-                if idx > 0:
-                    # self.start = self.match_start
-                    self.start = self.match_end
-                    self.match_start = idx
-                    self.match_end = idx + len(token)
-                    return pattern
-                self.start = self.match_end
-                self.match_start = self.length + 1
-                self.match_end = self.length + 1
-                return pattern
-            if token == ',':
-                self.match_start = self.length + 1
-                self.match_end = self.length + 1
-                return pattern
-
-            raise RuntimeError(f'Unexpected token {token}')
-
-        self.start = self.match_end
-        self.match_start = self.length + 1
-        self.match_end = self.length + 1
-
-        return pattern
-
-    def word_parse(self, tokens):
-        """Parse pattern word"""
-
-        if self.match_end <= self.start:
-            self.end = self.length + 1
-        else:
-            self.end = self.match_start
+        # pylint: disable=too-many-branches
 
-        substring = self.source[self.start - 1 : self.end - 1]
-        # print(f'{tokens} of {substring}')
-        while tokens:
-            token = tokens.popleft()
-            if not (token == '.' or isinstance(token, variable)):
-                return
+        if pattern:
+            self.plan = compile_template(pattern)
 
-            if not tokens:
-                self.assign(token, substring)
-                continue
+        self.source = source
+        if context is not None:
+            self.context = context
 
-            if not (tokens[0] == '.' or isinstance(tokens[0], variable)):
-                self.assign(token, substring)
-                continue
+        self.variables = variables = {}
 
-            if not substring:
-                self.assign(token, None)
-                continue
+        length = len(source)
+        start = match_start = match_end = 1
 
-            substring = substring.lstrip()
+        for trigger, operand, targets in self.plan:
+            if isinstance(operand, reference):
+                operand = self.dereference(operand, types=str if trigger == 'literal' else int)
 
-            if not substring:
-                self.assign(token, None)
-                continue
-
-            if ' ' not in substring:
-                self.assign(token, substring)
-                continue
+            if trigger == 'literal':
+                if start < match_end:
+                    start = match_end
+                idx = source.find(operand, start - 1) + 1
+                start = match_end
+                if idx > 0:
+                    match_start = idx
+                    match_end = idx + len(operand)
+                else:
+                    match_start = match_end = length + 1
+            elif trigger == '+':
+                start = match_start
+                match_start = match_end = min(length + 1, match_start + operand)
+            elif trigger == '-':
+                start = match_start
+                match_start = match_end = max(1, match_start - operand)
+            elif trigger == '=':
+                start = match_end
+                match_start = match_end = min(length + 1, operand)
+            elif trigger == ',':
+                match_start = match_end = length + 1
+            else:
+                start = match_end
+                match_start = match_end = length + 1
+
+            if targets:
+                end = length + 1 if match_end <= start else match_start
+                self.word_parse(targets, source[start - 1 : end - 1], variables)
+
+        return variables
 
-            idx = substring.find(' ')
-            word = substring[:idx]
-            substring = substring[idx + 1 :]
-            self.assign(token, word)
+    @staticmethod
+    def word_parse(targets, substring, variables):
+        """Assign the words of substring to the targets, the last target getting the
+        rest of substring"""
+
+        last = len(targets) - 1
+        for n, name in enumerate(targets):
+            if n == last:
+                value = substring
+            elif not substring:
+                value = None
+            else:
+                substring = substring.lstrip()
+                if not substring:
+                    value = None
+                elif ' ' not in substring:
+                    value = substring
+                else:
+                    value, substring = substring.split(' ', 1)
+
+            if name != '.':
+                variables[name] = value
 
     def dereference(self, name, types=None):
         """Look up name in the context, assert it is one of types if possible"""
@@ -349,10 +312,27 @@ class RexxParser:
 
         return result
 
-    def assign(self, name, value):
-        """Assign name = value"""
 
-        name = str(name)
-        if name == '.':
-            return
-        self.variables[name] = value
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def compile_template(pattern):
+    """Return the parse plan for a pattern, from the cache if it has been
+    compiled before"""
+
+    return RexxParser.compile(pattern)
+
+
+def convert_value(value, strip=False, convert=False):
+    """Return the parsed value, stripped if strip is true, and converted to a
+    float or int if convert is true and it is a number"""
+
+    if strip:
+        value = value.strip()
+    if convert:
+        try:
+            ov = value
+            value = float(value)
+            if int(value) == value and '.' not in ov:
+                value = int(value)
+        except (TypeError, ValueError):
+            pass
+    return value
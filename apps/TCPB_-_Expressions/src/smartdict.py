@@ -1,11 +1,18 @@
 # -*- coding: utf-8 -*-
 """Smartdict -- smart dictionary for formatting strings"""
 
+from functools import lru_cache
 from string import Formatter
-from attrdict import AttrDict
+import _string  # the field name parser used by string.Formatter
+
+from attrdict import AttrDict, Phantom
 
 __notfound__ = object()
 
+TEMPLATE_CACHE_SIZE = 256
+
+CONVERSIONS = {'r': repr, 's': str, 'a': ascii}
+
 
 class SmartDict:
     """Smart dictionary object"""
@@ -23,6 +30,14 @@ class SmartDict:
     def __getitem__(self, name, default=__notfound__):
         """get item from values *or* namespace"""
 
+        return self.encapsulate(self.lookup(name, default))
+
+    get = __getitem__
+    __getattr__ = __getitem__
+
+    def lookup(self, name, default=__notfound__):
+        """get item from values *or* namespace, without encapsulating it"""
+
         if default is __notfound__:
             default = self.default
 
@@ -43,10 +58,7 @@ class SmartDict:
         if value is __notfound__:
             raise KeyError(name)
 
-        return self.encapsulate(value)
-
-    get = __getitem__
-    __getattr__ = __getitem__
+        return value
 
     def encapsulate(self, value):
         """Encapsulate dicts into AttrDicts"""
@@ -63,14 +75,138 @@ class SmartDict:
         return AttrDict(value)
 
 
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def compile_format(s: str):
+    """Parse format string S once into a template, a tuple of literal strings and
+    (name, path, conversion, format_spec) fields, where name is a keyword or
+    argument number and path is a tuple of (is_attribute, key) steps.  Returns None
+    if a format_spec has nested fields, which are left to string.Formatter."""
+
+    template = []
+    auto_arg_index = 0
+    for literal_text, field_name, format_spec, conversion in Formatter().parse(s):
+        if literal_text:
+            template.append(literal_text)
+        if field_name is None:
+            continue
+
+        if '{' in format_spec:
+            return None
+
+        # numbering as string.Formatter.vformat
+        first, path = _string.formatter_field_name_split(field_name)
+        if first == '':
+            if auto_arg_index is False:
+                raise ValueError(
+                    'cannot switch from manual field specification to automatic field numbering'
+                )
+            first = auto_arg_index
+            auto_arg_index += 1
+        elif isinstance(first, int):
+            if auto_arg_index:
+                raise ValueError(
+                    'cannot switch from manual field specification to automatic field numbering'
+                )
+            auto_arg_index = False
+
+        if conversion is not None and conversion not in CONVERSIONS:
+            raise ValueError(f'Unknown conversion specifier {conversion}')
+
+        template.append((first, tuple(path), conversion, format_spec))
+
+    return tuple(template)
+
+
+def resolve_attribute(ob, name):
+    """ob.name, where the name of a dictionary is its key.  Missing keys are
+    phantoms, which format as ''."""
+
+    if isinstance(ob, dict):
+        if name in ob:
+            return ob[name]
+        value = getattr(ob, name, __notfound__)
+        if value is __notfound__:
+            return Phantom(name, ob)
+        return value
+
+    return getattr(ob, name)
+
+
+class SmartFormatter(Formatter):
+    """string.Formatter for the templates compile_format leaves to it, where
+    missing names are phantoms, as in format_template"""
+
+    def get_value(self, key, args, kwargs):
+        """positional argument or SmartDict value"""
+
+        if isinstance(key, int):
+            return args[key]
+        try:
+            return kwargs[key]
+        except KeyError:
+            return Phantom(key, kwargs.values)
+
+
+def format_template(template, args, values: SmartDict):
+    """Format a compiled template with the positional args and the values"""
+
+    result = []
+    for segment in template:
+        if isinstance(segment, str):
+            result.append(segment)
+            continue
+
+        name, path, conversion, format_spec = segment
+        if isinstance(name, int):
+            ob = args[name]
+        else:
+            try:
+                ob = values.lookup(name)
+            except KeyError:
+                # a missing name is a phantom, which formats as '', like a missing key
+                ob = Phantom(name, values.values)
+        for is_attribute, key in path:
+            ob = resolve_attribute(ob, key) if is_attribute else ob[key]
+
+        if conversion is not None:
+            ob = CONVERSIONS[conversion](ob)
+        result.append(format(ob, format_spec))
+
+    return ''.join(result)
+
+
 def smart_format(s: str, *args, _default=__notfound__, _context=None, **kwargs):
     """Format string S according to Python string formatting rules.  Compound
     structure elements may be accessed with dot or bracket notation and without quotes
     around key names, e.g. `blob[0][events][0][source][device][ipAddress]`
     or `blob[0].events[0].source.device.ipAddress`.  If default is set,
-    that value will be used for any missing value."""
+    that value will be used for any missing value, otherwise missing values
+    are formatted as an empty string."""
 
     kws = SmartDict(_context, kwargs, default=_default)
-    fmt = Formatter()
 
-    return fmt.vformat(s, args, kws)
+    template = compile_format(s)
+    if template is None:
+        return SmartFormatter().vformat(s, args, kws)
+
+    return format_template(template, args, kws)
+
+
+def smart_format_many(s: str, records, _default=__notfound__, _context=None, **kwargs):
+    """smart_format() of S with the values of each of the records (dictionaries),
+    and any keyword arguments that the record doesn't have"""
+
+    template = compile_format(s)
+
+    result = []
+    for record in records:
+        if not isinstance(record, dict):
+            raise TypeError('format_many records must be dictionaries')
+        values = {**kwargs, **record} if kwargs else record
+        kws = SmartDict(_context, values, default=_default)
+        if template is None:
+            result.append(SmartFormatter().vformat(s, (), kws))
+        else:
+            result.append(format_template(template, (), kws))
+
+    return result
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 from sys import argv
+from collections import Counter
 
 
 class Costs:
@@ -55,12 +56,92 @@ def costs_matrix(a, b, costs):
     return m
 
 
+def indel_only(costs):
+    """
+    True if a change or a swap never costs less than a deletion plus an
+    insertion, as for the default Costs.  The distance is then the cost of
+    deleting, and inserting, the characters outside the longest common
+    subsequence of a and b.
+    """
+    both = costs.insert + costs.delete
+    return costs.change >= both and costs.swap >= both
+
+
+def char_masks(a):
+    """
+    Bit masks of the positions of each character in a, e.g.
+    'abca' -> {'a': 0b1001, 'b': 0b10, 'c': 0b100}
+    """
+    masks = {}
+    for i, c in enumerate(a):
+        masks[c] = masks.get(c, 0) | (1 << i)
+    return masks
+
+
+def lcs_len(masks, length, b):
+    """
+    Length of the longest common subsequence of a and b, where masks is
+    char_masks(a) and length is len(a).
+
+    Bit-parallel (Allison-Dix / Hyyro): one pass over b, with a row of the
+    DP matrix held in the bits of an integer.
+    """
+    full = (1 << length) - 1
+    v = full
+    for c in b:
+        u = v & masks.get(c, 0)
+        v = ((v + u) | (v - u)) & full
+    return length - bin(v).count('1')
+
+
 def edit_dist(a, b, costs=None):
     costs = costs or Costs()
+
+    if indel_only(costs):
+        try:
+            masks = char_masks(a)
+        except TypeError:  # unhashable items
+            pass
+        else:
+            common = lcs_len(masks, len(a), b)
+            return (len(a) - common) * costs.delete + (len(b) - common) * costs.insert
+
     m = costs_matrix(a, b, costs)
     return m[-1][-1]
 
 
+def edit_dist_many(a, bs, costs=None, limit=None):
+    """
+    Edit distances from a to each of bs.  If limit is set, a distance that
+    is known to be over limit (from the lengths and characters of the
+    strings, before comparing them) is returned as None.
+    """
+    costs = costs or Costs()
+
+    if not indel_only(costs):
+        dists = [edit_dist(a, b, costs) for b in bs]
+        if limit is None:
+            return dists
+        return [None if dist > limit else dist for dist in dists]
+
+    masks = char_masks(a)
+    counts = Counter(a) if limit is not None else None
+
+    dists = []
+    for b in bs:
+        if limit is not None:
+            # the common subsequence can't be longer than the characters in common
+            bound = sum((counts & Counter(b)).values())
+            if (len(a) - bound) * costs.delete + (len(b) - bound) * costs.insert > limit:
+                dists.append(None)
+                continue
+        common = lcs_len(masks, len(a), b)
+        dist = (len(a) - common) * costs.delete + (len(b) - common) * costs.insert
+        dists.append(None if limit is not None and dist > limit else dist)
+
+    return dists
+
+
 def _print_costs_matrix(a, b):
     # XXX mainly for debug purposes; consider removing
     m = costs_matrix(a, b, Costs())
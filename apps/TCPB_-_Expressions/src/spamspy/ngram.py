@@ -1,16 +1,48 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+"""
+N-gram index of spamsum digests
+
+Each digest is indexed by its NGRAM_LEN character substrings.  A search finds
+the digests sharing the most n-grams with the query, then re-ranks them by
+their edit distance to the query.
+
+The index is kept in SQLite, so digests are appended without rewriting the
+index, and a file index is memory-mapped rather than read when it is opened.
+"""
+
+import os
+import sqlite3
 from sys import argv
-from json import loads, dumps
-from collections import Counter, defaultdict
-from itertools import chain
+import urllib.parse
 
+from .edit_dist import edit_dist_many
 from .spamsum import spamsum
 
 BLOCK_SIZE = 100
 NGRAM_LEN = 5
 
-registry = defaultdict(set)  # ngram -> {source...}
+# digests sharing the most n-grams with the query, per result, that are
+# re-ranked by edit distance
+CANDIDATES = 8
+
+MMAP_SIZE = 1 << 30
+
+# the suffix of index files; only files with it are opened as an index by path
+INDEX_SUFFIX = '.ngram'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS digests (
+    id INTEGER PRIMARY KEY,
+    source,
+    digest TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ngrams (
+    ngram TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    PRIMARY KEY (ngram, id)
+) WITHOUT ROWID;
+'''
 
 
 def get_digest(path):
@@ -24,38 +56,113 @@ def _ngrams(s):
         yield s[i : i + NGRAM_LEN]
 
 
-def update_registry(digest, source):
-    for ngram in _ngrams(digest):
-        registry[ngram].add(source)
-
-
-def find_best_match(digest):
-    sources = chain.from_iterable(registry[ngram] for ngram in _ngrams(digest))
-    counter = Counter(sources)
-
-    if not counter:
+def ngrams(digest):
+    """
+    The distinct n-grams of digest.  A digest shorter than NGRAM_LEN is its
+    own n-gram, so it is found by identical digests.
+    """
+    if len(digest) < NGRAM_LEN:
+        return [digest] if digest else []
+    return list(dict.fromkeys(_ngrams(digest)))
+
+
+class NgramIndex:
+    """
+    A similarity index of (source, digest) entries, in the SQLite database
+    at path, or in memory.  A read-only index must already exist, and is
+    not changed.
+    """
+
+    def __init__(self, path=':memory:', readonly=False):
+        self.path = path
+        if not readonly:
+            self.db = sqlite3.connect(path)
+        else:
+            uri = 'file:' + urllib.parse.quote(os.path.abspath(path)) + '?mode=ro'
+            try:
+                self.db = sqlite3.connect(uri, uri=True)
+                self.db.execute('SELECT id, source, digest FROM digests LIMIT 1')
+            except sqlite3.DatabaseError:
+                raise ValueError(f'{path} is not an n-gram index') from None
+        if path != ':memory:':
+            self.db.execute(f'PRAGMA mmap_size={MMAP_SIZE}')
+        if not readonly:
+            self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        (count,) = self.db.execute('SELECT COUNT(*) FROM digests').fetchone()
+        return count
+
+    def add(self, digest, source=None):
+        self.add_many([(digest, source)])
+
+    def add_many(self, entries):
+        """Append an iterable of (digest, source) entries to the index"""
+        with self.db:
+            for digest, source in entries:
+                cursor = self.db.execute(
+                    'INSERT INTO digests (source, digest) VALUES (?, ?)', (source, digest)
+                )
+                self.db.executemany(
+                    'INSERT INTO ngrams (ngram, id) VALUES (?, ?)',
+                    ((ngram, cursor.lastrowid) for ngram in ngrams(digest)),
+                )
+
+    def candidates(self, digest, count):
+        """The (source, digest, shared n-grams) of up to count entries sharing
+        the most n-grams with digest"""
+        grams = ngrams(digest)
+        if not grams:
+            return []
+
+        marks = ','.join('?' * len(grams))
+        query = f'''
+            SELECT d.source, d.digest, c.shared FROM (
+                SELECT id, COUNT(*) AS shared FROM ngrams
+                WHERE ngram IN ({marks})
+                GROUP BY id
+                ORDER BY shared DESC, id
+                LIMIT ?
+            ) c JOIN digests d ON d.id = c.id
+        '''
+        return self.db.execute(query, grams + [count]).fetchall()
+
+    def search(self, digest, k=10, limit=None):
+        """
+        The k entries most similar to digest, as (source, digest, distance)
+        tuples, closest first.  If limit is set, entries with an edit distance
+        over limit are dropped.
+        """
+        found = self.candidates(digest, k * CANDIDATES)
+        dists = edit_dist_many(digest, [entry[1] for entry in found], limit=limit)
+
+        ranked = sorted(
+            (dist, -shared, order, source, other)
+            for order, ((source, other, shared), dist) in enumerate(zip(found, dists))
+            if dist is not None
+        )
+        return [(source, other, dist) for dist, _, _, source, other in ranked[:k]]
+
+
+def find_best_match(index, digest):
+    """The (source, shared n-grams) of the entry sharing the most n-grams
+    with digest, or (None, 0)"""
+    found = index.candidates(digest, 1)
+
+    if not found:
         return None, 0
 
-    (most_common_source,) = counter.most_common(1)
-    source, frequency = most_common_source
-    return source, frequency
-
-
-def load_registry():
-    registry.clear()
-
-    try:
-        saved = loads(open('registry.dat').read())
-
-        for ngram, sources in saved:
-            registry[ngram] = set(sources)
-    except IOError:
-        pass
-
-
-def dump_registry():
-    data = [(ngram, list(sources)) for ngram, sources in registry.items()]
-    open('registry.dat', 'w').write(dumps(data))
+    source, _, shared = found[0]
+    return source, shared
 
 
 def main():
@@ -73,12 +180,11 @@ def main():
         return
 
     if command in ['u', 'update']:
-        load_registry()
-        update_registry(digest, path)
-        dump_registry()
+        with NgramIndex('registry' + INDEX_SUFFIX) as index:
+            index.add(digest, path)
     elif command in ['s', 'search']:
-        load_registry()
-        print(find_best_match(digest))
+        with NgramIndex('registry' + INDEX_SUFFIX, readonly=True) as index:
+            print(find_best_match(index, digest))
     else:
         print('error: unknown command', command)
 
@@ -1,113 +1,290 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+"""
+Spamsum (ssdeep style) fuzzy hashes of str or bytes
+
+A digest character is emitted whenever the rolling hash of the last seven
+characters hits the block size trigger.  The character is the low six bits of
+the sum hash of the characters since the previous trigger, so only those six
+bits of the sum hash are kept: they depend on nothing else, and stepping them
+through a character is a table lookup (the table rows refer to the next row,
+so functools.reduce steps through a whole run of characters in C).
+
+A SpamSum hasher is updated with chunks of data, and produces the digests for
+several block sizes from a single pass.  Rolling hashes are computed a chunk at
+a time with NumPy, if it is available.
+"""
+
+from array import array
+from functools import reduce
+from math import ceil
+from operator import getitem
 from sys import argv
 from string import ascii_lowercase, ascii_uppercase, digits
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 MAX_DIGEST_LEN = 64
 MIN_BLOCK_SIZE = 3
 
 MAX_UINT32 = 0xFFFFFFFF
 
+B64 = ascii_uppercase + ascii_lowercase + digits + '+/'
+
+ROLLING_WINDOW = 7
+
+SUM_INIT = 0x28021967
+SUM_PRIME = 0x01000193
+
+CHUNK_SIZE = 1 << 20
+
+
+def _sum_states():
+    """
+    The low six bits of the sum hash as a state machine: states[h][c] is the
+    state after character c (or c & 255) in state h, and states[h][256] is h.
+    """
+    states = [[None] * 257 for _ in range(64)]
+    for h, state in enumerate(states):
+        for c in range(256):
+            state[c] = states[((h * SUM_PRIME) ^ c) & 63]
+        state[256] = h
+    return states
+
+
+SUM_STATES = _sum_states()
+SUM_START = SUM_STATES[SUM_INIT & 63]
+
+
+def _sum_hash(codes):
+    h = SUM_INIT
+    for c in codes:
+        h = ((h * SUM_PRIME) & MAX_UINT32) ^ c
+    return h
+
+
+def _codes(data):
+    """
+    (codes, view) of str or bytes-like data: the character codes, and a bytes
+    view of them (modulo 256) for stepping through SUM_STATES.
+    """
+    if isinstance(data, str):
+        try:
+            data = data.encode('latin-1')
+        except UnicodeEncodeError:
+            codes = array('I', map(ord, data))
+            return codes, bytes(c & 255 for c in codes)
+    view = memoryview(data).cast('B')
+    return view, view
+
+
+def _rolling_hashes(window, codes):
+    """
+    The rolling hash after each of codes, where window holds the
+    ROLLING_WINDOW codes before them.
+    """
+    if numpy is not None:
+        # uint32 arithmetic wraps around like the masked hash
+        x = numpy.concatenate(
+            (numpy.asarray(window, dtype=numpy.uint32), numpy.asarray(codes, dtype=numpy.uint32))
+        )
+        length = len(codes)
+        h1 = numpy.zeros(length, dtype=numpy.uint32)
+        h2 = numpy.zeros(length, dtype=numpy.uint32)
+        h3 = numpy.zeros(length, dtype=numpy.uint32)
+        for j in range(ROLLING_WINDOW):
+            c = x[ROLLING_WINDOW - j : ROLLING_WINDOW - j + length]
+            h1 += c
+            h2 += c * numpy.uint32(ROLLING_WINDOW - j)
+            h3 ^= c << numpy.uint32(5 * j)
+        h1 += h2
+        h1 += h3
+        return h1
+
+    values = list(window)
+    values.extend(codes)
+    h1 = h2 = h3 = 0
+    hashes = []
+    for n, c in enumerate(values):
+        h2 += ROLLING_WINDOW * c - h1
+        h1 += c - (values[n - ROLLING_WINDOW] if n >= ROLLING_WINDOW else 0)
+        h3 = ((h3 << 5) & MAX_UINT32) ^ c
+        hashes.append((h1 + h2 + h3) & MAX_UINT32)
+    return hashes[ROLLING_WINDOW:]
+
+
+def _triggers(hashes, block_size, count):
+    """The first count positions in hashes that trigger block_size"""
+    if count <= 0:
+        return []
+    if numpy is not None:
+        return numpy.flatnonzero(hashes % block_size == block_size - 1)[:count].tolist()
+    triggers = []
+    for n, h in enumerate(hashes):
+        if h % block_size == block_size - 1:
+            triggers.append(n)
+            if len(triggers) == count:
+                break
+    return triggers
+
+
+class SpamSum:
+    """
+    Spamsum digests of a stream of str or bytes chunks, for each of
+    block_sizes, with the corresponding digest_lens.
+    """
+
+    __slots__ = (
+        'block_sizes',
+        'limits',
+        'legacy_mode',
+        'length',
+        'window',
+        'sums',
+        'starts',
+        'states',
+    )
+
+    def __init__(self, block_sizes, digest_lens, legacy_mode=False):
+        self.block_sizes = block_sizes
+        # a digest ends with the sum of everything after its last trigger
+        self.limits = [max(ceil(digest_len - 1), 0) for digest_len in digest_lens]
+        self.legacy_mode = legacy_mode
+        self.length = 0
+        self.window = [0] * ROLLING_WINDOW
+        self.sums = [[] for _ in block_sizes]
+        self.starts = [0 for _ in block_sizes]  # offset of the current sum
+        self.states = [SUM_START for _ in block_sizes]
+
+    def update(self, data):
+        for start in range(0, len(data), CHUNK_SIZE):
+            self._update(data[start : start + CHUNK_SIZE])
+
+    def _update(self, chunk):
+        codes, view = _codes(chunk)
+
+        hashes = None
+        for i, block_size in enumerate(self.block_sizes):
+            state = self.states[i]
+            sums = self.sums[i]
+            start = 0
+            count = self.limits[i] - len(sums)
+            if count > 0:
+                if hashes is None:
+                    hashes = _rolling_hashes(self.window, codes)
+                for n in _triggers(hashes, block_size, count):
+                    sums.append(reduce(getitem, view[start : n + 1], state)[256])
+                    state = SUM_START
+                    start = n + 1
+                if start:
+                    self.starts[i] = self.length + start
+            self.states[i] = reduce(getitem, view[start:], state)
+
+        self.length += len(codes)
+        self.window = (self.window + list(codes[-ROLLING_WINDOW:]))[-ROLLING_WINDOW:]
+
+    def digests(self, remainder):
+        """
+        The digests, where remainder(offset) returns the codes of the data
+        from offset to the end.  It is only called in the unlikely event the
+        low bits of a final sum can't tell if the sum is the initial sum.
+        """
+        hashes = _rolling_hashes([0] * ROLLING_WINDOW, self.window)
+        final = hashes[-1] != 0
+
+        result = []
+        for sums, start, state in zip(self.sums, self.starts, self.states):
+            sums = list(sums)
+            if final:
+                # No need to add initial hash, unless mimicing the original
+                if self.legacy_mode or (
+                    state is not SUM_START or _sum_hash(remainder(start)) != SUM_INIT
+                ):
+                    sums.append(state[256])
+            result.append(''.join(B64[h] for h in sums))
+
+        return result
 
-class RollingHash:
-    _ROLLING_WINDOW = 7
-
-    def __init__(self):
-        self.h1 = 0
-        self.h2 = 0
-        self.h3 = 0
-
-        self.window = [0] * self._ROLLING_WINDOW
-        self.n = 0
-
-    @property
-    def hash(self):
-        h = self.h1 + self.h2 + self.h3
-        return h & MAX_UINT32
 
-    def update(self, c):
-        c = ord(c)
+def _block_size(s):
+    block_size = MIN_BLOCK_SIZE
 
-        self.h2 -= self.h1
-        self.h2 += self._ROLLING_WINDOW * c
+    while block_size * MAX_DIGEST_LEN < len(s):
+        block_size *= 2
 
-        self.h1 += c
-        self.h1 -= self.window[self.n % self._ROLLING_WINDOW]
+    return block_size
 
-        self.window[self.n % self._ROLLING_WINDOW] = c
-        self.n += 1
 
-        self.h3 = (self.h3 << 5) & MAX_UINT32
-        self.h3 ^= c
+def _digests(s, block_sizes, digest_lens, legacy_mode=False):
+    hasher = SpamSum(block_sizes, digest_lens, legacy_mode)
+    hasher.update(s)
+    return hasher.digests(lambda start: _codes(s[start:])[0])
 
 
-class SumHash:
-    def __init__(self):
-        self.hash = 0x28021967
+def spamsum(s, block_size=None, digest_len=MAX_DIGEST_LEN, legacy_mode=False):
+    block_size = block_size or _block_size(s)
+    return _digests(s, (block_size,), (digest_len,), legacy_mode)[0]
 
-    def update(self, c):
-        self.hash *= 0x01000193
-        self.hash &= MAX_UINT32
-        self.hash ^= ord(c)
 
+def _fuzzy_hash(size, digests):
+    """
+    The ssdeep style block_size:digest:double_block_digest of data of size,
+    where digests(block_sizes, digest_lens) returns the digests of the data.
+    Both block sizes are computed in one pass, and the data is only hashed
+    again if the digest is too short and the block size can be halved.
+    """
+    block_size = MIN_BLOCK_SIZE
 
-def _spamsum(s, block_size, digest_len, legacy_mode):
-    yielded = 0
-    sh = SumHash()
-    rh = RollingHash()
+    while block_size * MAX_DIGEST_LEN < size:
+        block_size *= 2
 
-    for c in s:
-        sh.update(c)
-        rh.update(c)
+    while True:
+        normal, shorter = digests(
+            (block_size, block_size * 2), (MAX_DIGEST_LEN, MAX_DIGEST_LEN // 2)
+        )
 
-        if (rh.hash % block_size) == (block_size - 1):
-            if yielded < (digest_len - 1):
-                yield sh.hash
-                yielded += 1
-                sh = SumHash()
+        normal_should_be_longer = len(normal) < (MAX_DIGEST_LEN // 2)
+        can_reduce_block = block_size > MIN_BLOCK_SIZE
 
-    if rh.hash != 0:
-        # No need to yield initial hash, unless mimicing the original
-        if legacy_mode or sh.hash != SumHash().hash:
-            yield sh.hash
+        if normal_should_be_longer and can_reduce_block:
+            block_size //= 2
+        else:
+            return '%d:%s:%s' % (block_size, normal, shorter)
 
 
-def _block_size(s):
-    block_size = MIN_BLOCK_SIZE
+def fuzzy_hash(s):
+    return _fuzzy_hash(
+        len(s), lambda block_sizes, digest_lens: _digests(s, block_sizes, digest_lens)
+    )
 
-    while block_size * MAX_DIGEST_LEN < len(s):
-        block_size *= 2
 
-    return block_size
+def fuzzy_hash_file(path, chunk_size=CHUNK_SIZE):
+    """The fuzzy hash of a file, read chunk_size bytes at a time"""
 
+    def remainder(start):
+        with open(path, 'rb') as f:
+            f.seek(start)
+            return f.read()
 
-def spamsum(s, block_size=None, digest_len=MAX_DIGEST_LEN, legacy_mode=False):
-    b64 = ascii_uppercase + ascii_lowercase + digits + '+/'
+    def digests(block_sizes, digest_lens):
+        hasher = SpamSum(block_sizes, digest_lens)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                hasher.update(chunk)
+        return hasher.digests(remainder)
 
-    block_size = block_size or _block_size(s)
-    hashes = _spamsum(s, block_size, digest_len, legacy_mode)
+    with open(path, 'rb') as f:
+        f.seek(0, 2)
+        size = f.tell()
 
-    return ''.join(b64[h % 64] for h in hashes)
+    return _fuzzy_hash(size, digests)
 
 
 def main():
-    path = argv[1]
-    s = open(path).read()
-
-    block_size = _block_size(s)
-
-    while True:
-        normal = spamsum(s, block_size, MAX_DIGEST_LEN)
-        shorter = spamsum(s, block_size * 2, MAX_DIGEST_LEN / 2)
-
-        normal_should_be_longer = len(normal) < (MAX_DIGEST_LEN / 2)
-        can_reduce_block = block_size > MIN_BLOCK_SIZE
-
-        if normal_should_be_longer and can_reduce_block:
-            block_size /= 2
-        else:
-            print('%d:%s:%s' % (block_size, normal, shorter))
-            return
+    print(fuzzy_hash_file(argv[1]))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""Benchmark canonical keys against sorted JSON for unique() and the set builtins"""
+
+import json
+import random
+
+import pytest
+
+import canonical
+from methods import ExpressionMethods
+
+SIZE = 100000
+
+
+def json_unique(values):
+    """unique() as it was, keyed by sorted JSON"""
+
+    seen = set()
+    result = []
+    for element in values:
+        key = json.dumps(element, sort_keys=True, ensure_ascii=False)
+        if key in seen:
+            continue
+        result.append(element)
+        seen.add(key)
+
+    return result
+
+
+def strings(rng):
+    """Indicator strings, about half of them duplicates"""
+
+    return [f'host{rng.randrange(SIZE // 2)}.example.com' for _ in range(SIZE)]
+
+
+def mixed(rng):
+    """Indicator dictionaries (with keys in either order), strings and numbers"""
+
+    values = []
+    for _ in range(SIZE // 4):
+        n = rng.randrange(SIZE // 8)
+        values.append({'type': 'Host', 'summary': f'host{n}.example.com', 'rating': n % 5})
+        values.append({'rating': n % 5, 'summary': f'host{n}.example.com', 'type': 'Host'})
+        values.append(f'host{n}.example.com')
+        values.append(rng.choice((n, float(n), n % 2 == 0, [n, str(n)], None)))
+    return values
+
+
+class TestCanonicalKeys(object):
+    """Canonical key benchmark"""
+
+    @staticmethod
+    @pytest.mark.benchmark
+    @pytest.mark.parametrize('make', [strings, mixed])
+    def test_unique(make, timed, record_property):
+        """Identical results, and time before and after"""
+
+        values = make(random.Random(17))
+
+        expected, before = timed(json_unique, values)
+        result, after = timed(ExpressionMethods.f_unique, values)
+
+        assert result == expected
+        assert [type(value) for value in result] == [type(value) for value in expected]
+        record_property(
+            'benchmark',
+            f'unique({make.__name__}): {before * 1000:.0f} -> {after * 1000:.0f} ms '
+            f'({before / after:.1f}x)',
+        )
+
+    @staticmethod
+    def test_same_keys():
+        """Values have the same canonical key when they have the same sorted JSON"""
+
+        values = [
+            1,
+            1.0,
+            -0.0,
+            0.0,
+            0,
+            True,
+            False,
+            None,
+            '1',
+            'true',
+            'null',
+            float('nan'),
+            float('inf'),
+            [1, 2],
+            (1, 2),
+            [2, 1],
+            {'a': 1, 'b': [1, {'c': None}]},
+            {'b': (1, {'c': None}), 'a': 1},
+            {'a': 1.0},
+            {1: 'x'},
+            {'1': 'x'},
+            {None: 'x'},
+            {'null': 'x'},
+            [],
+            {},
+            '',
+        ]
+
+        for a in values:
+            for b in values:
+                same_json = json.dumps(a, sort_keys=True) == json.dumps(b, sort_keys=True)
+                same_key = canonical.canonical_key(a) == canonical.canonical_key(b)
+                assert same_key == same_json, (a, b)
+
+    @staticmethod
+    def test_set_builtins():
+        """intersect, difference and group_by agree with sorted JSON"""
+
+        values = mixed(random.Random(23))
+        half = values[: len(values) // 2]
+        other = values[len(values) // 2 :]
+        other_json = {json.dumps(value, sort_keys=True) for value in other}
+
+        expected = [
+            value for value in json_unique(half) if json.dumps(value, sort_keys=True) in other_json
+        ]
+        assert ExpressionMethods.f_intersect(half, other) == expected
+
+        expected = [
+            value
+            for value in json_unique(half)
+            if json.dumps(value, sort_keys=True) not in other_json
+        ]
+        assert ExpressionMethods.f_difference(half, other) == expected
+
+        groups = ExpressionMethods.f_group_by(values)
+        assert [group['key'] for group in groups] == json_unique(values)
+        assert sum(len(group['value']) for group in groups) == len(values)
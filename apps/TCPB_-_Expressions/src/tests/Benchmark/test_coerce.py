@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""Benchmark the @coerce decorator against the per-call inspect implementation"""
+
+import functools
+import inspect
+import time
+import typing
+
+import pytest
+
+from lark_expr import Evaluate
+from literal import literal
+from methods import ExpressionMethods
+
+
+def legacy_strbytes(value, annotation):
+    """Convert value between str and bytes depending on annotation"""
+
+    if not isinstance(value, (bytes, str)):
+        return value
+
+    if isinstance(value, str) and bytes in annotation and str not in annotation:
+        return bytes(str(value), 'utf-8')
+
+    if isinstance(value, bytes) and str in annotation and bytes not in annotation:
+        return value.decode('utf-8')
+
+    return value
+
+
+def legacy_coerce(f):
+    """The original coerce, which inspects the signature on every call"""
+
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        """argument coercion wrapper"""
+        func = f
+        if isinstance(f, staticmethod):
+            func = f.__func__
+            args = tuple(args[1:])
+        sig = inspect.signature(func, follow_wrapped=True)
+        bindings = sig.bind(*args, **kwargs)
+        bindings.apply_defaults()
+
+        for param in bindings.arguments:
+            value = bindings.arguments[param]
+
+            annotation = sig.parameters[param].annotation
+            kind = sig.parameters[param].kind
+
+            if not annotation:
+                continue
+
+            union_args = typing.get_args(annotation)
+            if union_args:
+                annotation = union_args
+
+            if not isinstance(annotation, tuple):
+                annotation = (annotation,)
+
+            if kind is inspect.Parameter.VAR_POSITIONAL:
+                result = []
+                for v in value:
+                    v = legacy_strbytes(v, annotation)
+                    if not isinstance(v, annotation):
+                        for constructor in annotation:
+                            try:
+                                v = constructor(v)
+                                break
+                            except Exception:
+                                pass
+                    result.append(v)
+                bindings.arguments[param] = result
+            elif kind is inspect.Parameter.VAR_KEYWORD:
+                for k, v in value.items():
+                    v = legacy_strbytes(v, annotation)
+                    if not isinstance(v, annotation):
+                        for constructor in annotation:
+                            try:
+                                v = constructor(v)
+                                break
+                            except Exception:
+                                pass
+                        value[k] = v
+            else:
+                value = legacy_strbytes(value, annotation)
+                if not isinstance(value, annotation):
+                    for constructor in annotation:
+                        try:
+                            value = constructor(value)
+                            break
+                        except Exception:
+                            pass
+
+                bindings.arguments[param] = value
+
+        return func(*bindings.args, **bindings.kwargs)
+
+    return wrapper
+
+
+CALLS = [
+    (ExpressionMethods, 'f_sin', ('0.5',), {}),
+    (ExpressionMethods, 'f_sqrt', (16,), {}),
+    (ExpressionMethods, 'f_upper', (b'bytes',), {}),
+    (ExpressionMethods, 'f_replace', ('hello world', 'o', '0'), {}),
+    (ExpressionMethods, 'f_pad', ([1, 2], '4'), {'padvalue': 0}),
+    (ExpressionMethods, 'f_round', ('3.14159', 2), {}),
+    (ExpressionMethods, 'f_sum', ('1', 2, 3.5), {}),
+    (ExpressionMethods, 'f_max', (1, 5, 3), {}),
+    (Evaluate, 'add', ('1', 2), {}),
+    (Evaluate, 'mul', (literal('ab'), 3), {}),
+    (Evaluate, 'concat', (b'a', 'b'), {}),
+]
+
+ITERATIONS = 2000
+
+
+def calls_per_second(func, args, kwargs):
+    """Time func(*args, **kwargs) and return calls/sec"""
+
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        func(*args, **kwargs)
+    return ITERATIONS / (time.perf_counter() - start)
+
+
+class TestCoerce(object):
+    """Coercion benchmark"""
+
+    @staticmethod
+    @pytest.mark.benchmark
+    @pytest.mark.parametrize('cls,name,args,kwargs', CALLS)
+    def test_coerce(cls, name, args, kwargs, record_property):
+        """Identical results, calls/sec before and after"""
+
+        current = getattr(cls, name)
+        original = vars(cls)[name]
+        while not isinstance(original, staticmethod):
+            original = original.__wrapped__
+        legacy = legacy_coerce(original)
+        instance = object.__new__(cls)
+
+        assert current(instance, *args, **kwargs) == legacy(instance, *args, **kwargs)
+
+        before = calls_per_second(legacy, (instance,) + args, kwargs)
+        after = calls_per_second(current, (instance,) + args, kwargs)
+        record_property(
+            'benchmark', f'{name}: {before:,.0f} -> {after:,.0f} calls/sec ({after / before:.1f}x)'
+        )
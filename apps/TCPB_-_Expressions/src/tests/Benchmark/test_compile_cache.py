@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""Benchmark the JMESPath and regex compile caches, and the *_many functions, against
+compiling (and parsing the JSON) on every call"""
+
+import json
+import re
+
+import jmespath
+import pytest
+
+from lark_expr import Expression
+from methods import compile_jmespath, compile_regex
+
+ROWS = 2000
+
+DOCUMENT = json.dumps(
+    {
+        'indicators': [
+            {'summary': f'host{n}.example.com', 'rating': n % 5, 'tags': ['phish', f'tag{n}']}
+            for n in range(50)
+        ]
+    }
+)
+
+PATH = 'indicators[?rating > `2`].summary | [0:5]'
+
+PATHS = ['indicators[0].summary', 'indicators[-1].tags']
+
+PATTERN = r'(?:host|www)\d+\.(?:example|test)\.(?:com|net)'
+
+
+def legacy_jmespath(path, ob):
+    """jmespath() as it was"""
+
+    if isinstance(ob, str):
+        ob = json.loads(ob)
+    return jmespath.search(path, ob)
+
+
+def legacy_refindall(pattern, string, flags=''):
+    """refindall() as it was"""
+
+    f = 0
+    if isinstance(flags, int):
+        f = flags
+    elif isinstance(flags, str):
+        for c in flags:
+            c = c.upper()
+            i = getattr(re, c, None)
+            if i:
+                f += i
+
+    result = [m.group() for m in re.finditer(pattern, string, flags=f)]
+    return result or None
+
+
+def lines():
+    """Lines of text to search"""
+
+    return [f'Seen HOST{n}.example.COM and www{n}.test.net at {n}:00' for n in range(ROWS)]
+
+
+class TestCompileCache(object):
+    """Compile cache benchmark"""
+
+    @staticmethod
+    @pytest.mark.benchmark
+    def test_jmespath(timed, record_property):
+        """Identical results, and time before and after, for evaluations searching a JSON
+        string for two fields"""
+
+        engine = Expression()
+
+        def evaluation():
+            engine.parsed_json = None  # as Expression.eval does
+            return [engine.f_jmespath(path, DOCUMENT) for path in PATHS]
+
+        expected, before = timed(
+            lambda: [[legacy_jmespath(path, DOCUMENT) for path in PATHS] for _ in range(ROWS)]
+        )
+        result, after = timed(lambda: [evaluation() for _ in range(ROWS)])
+
+        assert result == expected
+        assert expected[0] == ['host0.example.com', ['phish', 'tag49']]
+        record_property(
+            'benchmark',
+            f'jmespath x {ROWS} evaluations: {before * 1000:.0f} -> {after * 1000:.0f} ms',
+        )
+
+    @staticmethod
+    @pytest.mark.benchmark
+    def test_jmespath_many(timed, record_property):
+        """Identical results, and time before and after"""
+
+        engine = Expression()
+        documents = [{'a': {'b': [n, n + 1]}} for n in range(ROWS)]
+
+        expected, before = timed(lambda: [legacy_jmespath('a.b[-1]', doc) for doc in documents])
+        result, after = timed(engine.f_jmespath_many, 'a.b[-1]', documents)
+
+        assert result == expected == [n + 1 for n in range(ROWS)]
+        record_property(
+            'benchmark', f'jmespath_many x {ROWS}: {before * 1000:.1f} -> {after * 1000:.1f} ms'
+        )
+
+    @staticmethod
+    def test_json_parsed_per_evaluation():
+        """A JSON string used twice in an evaluation is parsed once"""
+
+        engine = Expression()
+        engine.set('doc', DOCUMENT)
+        parsed = []
+        original = engine.parse_json
+
+        def parse_json(data):
+            parsed.append(data)
+            return original(data)
+
+        engine.parse_json = parse_json
+        result = engine.eval(
+            "jmespath('indicators[0].summary', doc) + jmespath('indicators[1].summary', doc)"
+        )
+
+        assert result == 'host0.example.comhost1.example.com'
+        assert len(parsed) == 2
+        assert len(engine.parsed_json) == 1
+
+    @staticmethod
+    @pytest.mark.benchmark
+    def test_refindall(timed, record_property):
+        """Identical results, and time before and after, per call and for refindall_many"""
+
+        engine = Expression()
+        strings = lines()
+
+        expected, before = timed(lambda: [legacy_refindall(PATTERN, s, 'i') for s in strings])
+        result, after = timed(lambda: [engine.f_refindall(PATTERN, s, 'i') for s in strings])
+        many, after_many = timed(engine.f_refindall_many, PATTERN, strings, 'i')
+
+        assert result == expected
+        assert many == expected
+        assert expected[7] == ['HOST7.example.COM', 'www7.test.net']
+        record_property(
+            'benchmark',
+            f'refindall x {ROWS}: {before * 1000:.1f} -> {after * 1000:.1f} ms, '
+            f'refindall_many {after_many * 1000:.1f} ms',
+        )
+
+    @staticmethod
+    @pytest.mark.parametrize('expression', ["jmespath(path, doc)", "refindall(pattern, line, 'i')"])
+    def test_loop(expression):
+        """The path or pattern is compiled once for all the iterations of a loop"""
+
+        engine = Expression()
+        engine.set('path', PATH)
+        engine.set('pattern', PATTERN)
+        engine.set('doc', DOCUMENT)
+        compile_regex.cache_clear()
+        compile_jmespath.cache_clear()
+
+        for line in lines()[:100]:
+            engine.set('line', line)
+            engine.eval(expression)
+
+        info = (
+            compile_regex.cache_info()
+            if 'refindall' in expression
+            else compile_jmespath.cache_info()
+        )
+        assert (info.misses, info.hits) == (1, 99)
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""Benchmark conform() and flatten() of DNS results with an inferred schema against
+the string path mapping"""
+
+import copy
+import random
+
+import pytest
+
+import json_util
+from methods import ExpressionMethods
+
+RECORDS = 10000
+
+
+def dns_results():
+    """DNS results, with the fields that a lookup didn't find left out or null"""
+
+    rng = random.Random(31)
+    results = []
+    for n in range(RECORDS):
+        result = {'question': f'host{n}.example.com', 'rrType': rng.choice(['A', 'AAAA', 'MX'])}
+        if rng.random() < 0.7:
+            result['answers'] = [
+                {'address': f'10.{n % 256}.0.{i}', 'ttl': rng.randrange(60, 3600)}
+                for i in range(rng.randrange(1, 4))
+            ]
+        else:
+            result['error'] = rng.choice(['NXDOMAIN', None])
+        if rng.random() < 0.2:
+            result['cName'] = f'alias{n}.example.net'
+        results.append(result)
+    return results
+
+
+def legacy_conform(object_list, _path=None, _mapping=None, add_missing=False, missing_value=None):
+    """conform() as it was, remembering the paths as strings and adding the missing
+    keys in a second pass"""
+
+    mapping = set() if _mapping is None else _mapping
+    path = [] if _path is None else _path.copy()
+
+    if isinstance(object_list, list):
+        result = [
+            legacy_conform(obj, path, mapping, add_missing, missing_value) for obj in object_list
+        ]
+        if _mapping is None:
+            result = legacy_conform(result, path, mapping, True, missing_value)
+        return result
+
+    if isinstance(object_list, dict):
+        for key, value in object_list.items():
+            path.append(key)
+            if not isinstance(value, (list, dict)):
+                mapping.add(':'.join(path))
+            else:
+                object_list[key] = legacy_conform(value, path, mapping, add_missing, missing_value)
+            path.pop()
+
+        if add_missing:
+            for key in mapping:
+                key_parts = key.split(':')
+                if len(key_parts) == len(path) + 1 and key_parts[:-1] == path:
+                    if object_list.get(key_parts[-1]) is None:
+                        object_list[key_parts[-1]] = missing_value
+
+        if _mapping is None:
+            object_list = legacy_conform(object_list, path, mapping, True, missing_value)
+
+    return object_list
+
+
+class TestConform(object):
+    """Conform benchmark"""
+
+    @staticmethod
+    @pytest.mark.benchmark
+    def test_conform(timed, record_property):
+        """Identical results, and time before and after"""
+
+        results = dns_results()
+
+        expected, before = timed(legacy_conform, copy.deepcopy(results), missing_value='')
+        result, after = timed(ExpressionMethods.f_conform, copy.deepcopy(results), '')
+
+        assert result == expected
+        assert all(record['error'] is not None for record in result)
+        record_property(
+            'benchmark', f'conform x {RECORDS}: {before * 1000:.0f} -> {after * 1000:.0f} ms'
+        )
+
+    @staticmethod
+    @pytest.mark.benchmark
+    def test_flatten(monkeypatch, timed, record_property):
+        """Identical outputs, and time without and with the camel2snake cache"""
+
+        conformed = ExpressionMethods.f_conform(dns_results())
+
+        with monkeypatch.context() as patch:
+            patch.setattr(json_util, 'camel2snake', json_util.camel2snake.__wrapped__)
+            expected, before = timed(ExpressionMethods.f_flatten, conformed, 'dns')
+        json_util.camel2snake.cache_clear()
+        result, after = timed(ExpressionMethods.f_flatten, conformed, 'dns')
+
+        assert result == expected
+        assert len(result['dns.rr_type']) == len(result['dns.c_name']) == RECORDS
+        record_property(
+            'benchmark', f'flatten x {RECORDS}: {before * 1000:.0f} -> {after * 1000:.0f} ms'
+        )
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""Benchmark the streaming CSV reader against reading and converting everything"""
+
+import csv
+from io import StringIO
+import random
+
+import pytest
+
+from methods import ExpressionMethods
+
+RECORDS = 100000
+
+
+def legacy_csvread(data, header=False, convert=True, delimiter=',', quote='"', rows=0, columns=0):
+    """csvread() as it was, converting every value of every record"""
+
+    if isinstance(data, bytes):
+        data = data.decode('utf-8')
+
+    result = []
+    for rowdata in csv.reader(StringIO(data), delimiter=delimiter, quotechar=quote):
+        if columns and len(rowdata) > columns:
+            rowdata = rowdata[:columns]
+        if convert:
+            rd = []
+            for value in rowdata:
+                i = None
+                f = None
+                try:
+                    f = float(value)
+                    i = int(value)
+                except ValueError:
+                    pass
+                if i is not None or f is not None:
+                    if f and i != f:
+                        value = f
+                    else:
+                        value = i
+                rd.append(value)
+            rowdata = rd
+        result.append(rowdata)
+
+    if header and result:
+        result.pop(0)
+
+    if rows and len(result) > rows:
+        result = result[:rows]
+
+    if rows == 1 or rows == 0 and len(result) == 1:
+        return result[0]
+
+    return result
+
+
+@pytest.fixture(name='export', scope='module')
+def fixture_export():
+    """An indicator export with a header"""
+
+    rng = random.Random(3)
+    lines = ['id,summary,type,rating,confidence,owner,dateAdded']
+    for n in range(RECORDS):
+        lines.append(
+            f'{n},host{n}.example.com,Host,{rng.randrange(6)}.{rng.randrange(1, 10)},'
+            f'{rng.randrange(101)},"Example, Inc.",2021-09-{rng.randrange(1, 31):02d}'
+        )
+    return '\n'.join(lines)
+
+
+class TestCsvStream(object):
+    """Streaming CSV benchmark"""
+
+    @staticmethod
+    @pytest.mark.benchmark
+    @pytest.mark.parametrize('rows', [10, 0])
+    def test_csvread(export, rows, timed, record_property):
+        """Identical results, and time before and after"""
+
+        expected, before = timed(legacy_csvread, export, header=True, rows=rows)
+        result, after = timed(ExpressionMethods.f_csvread, export, header=True, rows=rows)
+
+        assert result == expected
+        assert [type(value) for value in result[-1]] == [int, str, str, float, int, str, str]
+        record_property(
+            'benchmark',
+            f'csvread(rows={rows}) of {len(export) >> 20} MB: '
+            f'{before * 1000:.1f} -> {after * 1000:.1f} ms ({before / after:.1f}x)',
+        )
+
+    @staticmethod
+    def test_columnar(export):
+        """Columns of the converted values, by header name"""
+
+        rows = ExpressionMethods.f_csvread(export, header=True)
+        columns = ExpressionMethods.f_csvread(export, header=True, columnar=True)
+
+        assert list(columns) == export.split('\n', 1)[0].split(',')
+        assert [list(row) for row in zip(*columns.values())] == rows
+        assert ExpressionMethods.f_merge(columns['id'], columns['rating']) == [
+            [row[0], row[3]] for row in rows
+        ]
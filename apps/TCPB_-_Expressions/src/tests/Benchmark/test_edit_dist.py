@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""Benchmark fuzzy hash distances against the full DP matrix implementation"""
+
+import random
+
+import pytest
+
+from spamspy.edit_dist import Costs, costs_matrix, edit_dist, edit_dist_many
+from spamspy.spamsum import spamsum
+
+WORDS = 'the report malware observed contact server beacon payload analysis at with from'.split()
+
+
+def legacy_edit_dist(a, b):
+    """The edit distance from the full costs matrix"""
+
+    return costs_matrix(a, b, Costs())[-1][-1]
+
+
+def digests(count):
+    """Fuzzy hashes of count related documents"""
+
+    rng = random.Random(1)
+    base = [rng.choice(WORDS) for _ in range(2000)]
+    result = []
+    for _ in range(count):
+        words = list(base)
+        for _ in range(rng.randint(0, 400)):
+            words[rng.randrange(len(words))] = rng.choice(WORDS)
+        result.append(spamsum(' '.join(words[: rng.randint(1000, 2000)])))
+    return result
+
+
+class TestEditDist(object):
+    """Edit distance benchmark"""
+
+    @staticmethod
+    def test_random_strings():
+        """Identical results on short strings over a small alphabet"""
+
+        rng = random.Random(2)
+        for _ in range(5000):
+            a = ''.join(rng.choice('abc') for _ in range(rng.randint(0, 10)))
+            b = ''.join(rng.choice('abc') for _ in range(rng.randint(0, 10)))
+            assert edit_dist(a, b) == legacy_edit_dist(a, b), (a, b)
+
+    @staticmethod
+    def test_limit():
+        """edit_dist_many() gives None for distances over the limit"""
+
+        hashes = digests(200)
+        sample = hashes[0]
+        expected = [legacy_edit_dist(sample, h) for h in hashes]
+
+        assert edit_dist_many(sample, hashes) == expected
+        limit = sorted(expected)[len(expected) // 10]
+        limited = edit_dist_many(sample, hashes, limit=limit)
+        assert limited == [None if x > limit else x for x in expected]
+
+    @staticmethod
+    @pytest.mark.benchmark
+    def test_edit_dist_many(timed, record_property):
+        """Identical results, comparisons/sec before and after"""
+
+        hashes = digests(1000)
+        sample = hashes[0]
+
+        expected, before = timed(lambda: [legacy_edit_dist(sample, h) for h in hashes])
+        result, after = timed(edit_dist_many, sample, hashes)
+
+        assert result == expected
+        assert [edit_dist(sample, h) for h in hashes] == expected
+
+        count = len(hashes)
+        record_property(
+            'benchmark',
+            f'{count} digests: {count / before:.0f} -> {count / after:.0f} '
+            f'comparisons/sec ({before / after:.1f}x)',
+        )
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""Benchmark format() with compiled templates and direct field access against
+string.Formatter and AttrDict copies"""
+
+from string import Formatter
+
+import pytest
+
+from lark_expr import Expression
+from smartdict import compile_format, SmartDict, smart_format
+
+RECORDS = 5000
+
+FORMATS = [
+    '{blob[0].events[0].source.device.ipAddress} ({blob[0].events[0].source.device.name!r})',
+    '{blob[0][events][0][type]:>10}|{count:05d}|{ratio:.2%}|{missing.value}|{{literal}}',
+    '{0} of {1}: {blob[0].tags}',
+]
+
+
+def record(n):
+    """An event record"""
+
+    return {
+        'blob': [
+            {
+                'events': [
+                    {
+                        'type': 'login',
+                        'source': {'device': {'ipAddress': f'10.0.0.{n % 256}', 'name': f'h{n}'}},
+                    }
+                ]
+                * 5,
+                'tags': ['a', 'b'],
+            }
+        ],
+        'count': n,
+        'ratio': n / RECORDS,
+        'missing': {},
+    }
+
+
+def legacy_format(s, *args, **kwargs):
+    """smart_format() as it was"""
+
+    return Formatter().vformat(s, args, SmartDict(None, kwargs))
+
+
+class TestFormatTemplate(object):
+    """Format template benchmark"""
+
+    @staticmethod
+    @pytest.mark.benchmark
+    @pytest.mark.parametrize('s', FORMATS)
+    def test_format(s, timed, record_property):
+        """Identical results, and time before and after"""
+
+        records = [record(n) for n in range(RECORDS)]
+
+        expected, before = timed(lambda: [legacy_format(s, 1, 2, **r) for r in records])
+        result, after = timed(lambda: [smart_format(s, 1, 2, **r) for r in records])
+
+        assert result == expected
+        record_property(
+            'benchmark', f'format x {RECORDS}: {before * 1000:.0f} -> {after * 1000:.0f} ms'
+        )
+
+    @staticmethod
+    def test_format_many():
+        """format_many() formats each record with the format parsed once"""
+
+        engine = Expression()
+        records = [record(n) for n in range(RECORDS)]
+        s = FORMATS[0]
+
+        expected = [legacy_format(s, **r) for r in records]
+        compile_format.cache_clear()
+        result = engine.f_format_many(s, records)
+
+        assert result == expected
+        assert compile_format.cache_info().misses == 1
+
+    @staticmethod
+    @pytest.mark.parametrize(
+        's,error',
+        [
+            ('{} {0}', ValueError),
+            ('{0!x}', ValueError),
+            ('{', ValueError),
+            ('{2}', IndexError),
+            ('{count.nosuch}', AttributeError),
+        ],
+    )
+    def test_errors(s, error):
+        """Errors are raised as string.Formatter raises them"""
+
+        with pytest.raises(error):
+            legacy_format(s, 1, **record(1))
+        with pytest.raises(error):
+            smart_format(s, 1, **record(1))
+
+    @staticmethod
+    def test_missing_name():
+        """Missing names format as '', like missing keys, unless there is a default"""
+
+        assert smart_format('[{nosuch}|{nosuch.x}]', **record(1)) == '[|]'
+        assert smart_format('[{nosuch}]', _default='-') == '[-]'
+        assert Expression().f_format_many('{nosuch}{count}', [record(1)]) == ['1']
+        assert smart_format('[{nosuch}{count:{width}}]', width=3, **record(1)) == '[  1]'
+
+        # only formatting turns missing names into phantoms
+        with pytest.raises(KeyError):
+            SmartDict(None, record(1))['nosuch']
+
+    @staticmethod
+    def test_nested_format_spec():
+        """Fields nested in a format spec are formatted by string.Formatter"""
+
+        assert compile_format('{pi:{width}.{precision}f}') is None
+        assert smart_format('{0:{width}.{precision}f}', 3.14159, width=7, precision=2) == '   3.14'
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""Benchmark the compiled hyphenation patterns and word cache against the
+pattern trie, with a long-text report"""
+
+import marshal
+import random
+import re
+
+import pytest
+
+import hyphenate
+from hyphenate import Hyphenator
+from lark_expr import Expression
+import report
+
+PATTERNS, EXCEPTIONS = hyphenate.hyphenator.source
+
+WORDS = (
+    'indicator observable adversary infrastructure campaign exfiltration persistence '
+    'reconnaissance credential harvesting spearphishing attachment malicious executable '
+    'command control beaconing lateral movement privilege escalation vulnerability '
+    'exploitation remediation containment investigation attribution associates table'
+).split()
+
+
+class TrieHyphenator:
+    """Hyphenator as it was, walking a trie of the patterns from each letter"""
+
+    def __init__(self, patterns, exceptions):
+        self.tree = {}
+        for pattern in patterns.split():
+            chars = re.sub('[0-9]', '', pattern)
+            points = [int(d or 0) for d in re.split('[.a-z]', pattern)]
+            t = self.tree
+            for c in chars:
+                t = t.setdefault(c, {})
+            t[None] = points
+
+        self.exceptions = {}
+        for ex in exceptions.split():
+            points = [0] + [int(h == '-') for h in re.split(r'[a-z]', ex)]
+            self.exceptions[ex.replace('-', '')] = points
+
+    def hyphenate_word(self, word):
+        """hyphenate_word() as it was"""
+
+        if len(word) <= 4:
+            return [word]
+        if word.lower() in self.exceptions:
+            points = self.exceptions[word.lower()]
+        else:
+            work = '.' + word.lower() + '.'
+            points = [0] * (len(work) + 1)
+            for i in range(len(work)):
+                t = self.tree
+                for c in work[i:]:
+                    if c not in t:
+                        break
+                    t = t[c]
+                    if None in t:
+                        for j, p_j in enumerate(t[None]):
+                            points[i + j] = max(points[i + j], p_j)
+            points[1] = points[2] = points[-2] = points[-3] = 0
+
+        pieces = ['']
+        for c, p in zip(word, points[2:]):
+            pieces[-1] += c
+            if p % 2:
+                pieces.append('')
+        return pieces
+
+
+@pytest.fixture(name='records', scope='module')
+def fixture_records():
+    """Records with paragraphs of long words"""
+
+    rng = random.Random(7)
+    return [
+        {'id': n, 'notes': ' '.join(rng.choice(WORDS) for _ in range(rng.randrange(20, 60)))}
+        for n in range(2000)
+    ]
+
+
+class TestHyphenate(object):
+    """Hyphenation benchmark"""
+
+    @staticmethod
+    def test_same_hyphenation():
+        """Identical hyphenations for every word in this repository's documentation"""
+
+        with open('METHODS.md', 'r', encoding='utf-8') as f:
+            words = sorted(set(re.findall('[A-Za-z]+', f.read())) | set(WORDS))
+
+        trie = TrieHyphenator(PATTERNS, EXCEPTIONS)
+        compiled = Hyphenator(PATTERNS, EXCEPTIONS)
+
+        for word in words:
+            assert compiled.hyphenate_word(word) == trie.hyphenate_word(word), word
+
+    @staticmethod
+    def test_pattern_cache(tmp_path):
+        """The compiled patterns are loaded from the cache, unless they are stale,
+        and the cache is only read"""
+
+        cache = tmp_path / 'hyphenate.cache'
+
+        missing = Hyphenator(PATTERNS, EXCEPTIONS, cache=str(cache))
+        missing.load()
+        assert not cache.exists()
+
+        Hyphenator(PATTERNS, EXCEPTIONS, cache=str(cache)).build()
+        built = cache.read_bytes()
+        cached = Hyphenator(PATTERNS, EXCEPTIONS, cache=str(cache))
+        cached.load()
+        stale = Hyphenator('hy3ph he2n', cache=str(cache))
+        stale.load()
+
+        assert missing.patterns == cached.patterns
+        assert cached.patterns == Hyphenator.compile(PATTERNS, EXCEPTIONS)['patterns']
+        assert stale.patterns == {'hyph': (2, (3,)), 'hen': (2, (2,))}
+        assert stale.hyphenate_word('hyphen') == ['hy', 'phen']
+        assert cache.read_bytes() == built
+
+    @staticmethod
+    def test_packaged_patterns():
+        """the packaged table was built from these patterns ('python hyphenate.py
+        --build-patterns' rebuilds it)"""
+
+        with open(hyphenate.PATTERNS_CACHE, 'rb') as f:
+            table = marshal.loads(f.read())
+
+        assert table['digest'] == hyphenate.hyphenator.digest()
+
+    @staticmethod
+    def test_word_cache():
+        """Words are hyphenated once, and the pieces returned can be changed"""
+
+        hyphenator = Hyphenator(PATTERNS, EXCEPTIONS, cache_size=2)
+
+        pieces = hyphenator.hyphenate_word('hyphenation')
+        pieces.pop(0)
+        for word in ['hyphenation', 'associates', 'hyphenation', 'table', 'hyphenation']:
+            hyphenator.hyphenate_word(word)
+
+        assert hyphenator.hyphenate_word('hyphenation') == ['hy', 'phen', 'ation']
+        info = hyphenator.split.cache_info()
+        assert (info.hits, info.misses, info.currsize) == (4, 3, 2)
+
+    @staticmethod
+    @pytest.mark.benchmark
+    def test_report(records, monkeypatch, timed, record_property):
+        """Identical long-text report, and time before and after"""
+
+        engine = Expression()
+        columns = [('id', '6'), ('notes', '23')]
+
+        with monkeypatch.context() as patch:
+            patch.setattr(
+                report, 'hyphenate_word', TrieHyphenator(PATTERNS, EXCEPTIONS).hyphenate_word
+            )
+            expected, before = timed(engine.f_report, records, columns=columns)
+
+        hyphenator = Hyphenator(PATTERNS, EXCEPTIONS)
+        monkeypatch.setattr(report, 'hyphenate_word', hyphenator.hyphenate_word)
+        result, after = timed(engine.f_report, records, columns=columns)
+
+        assert result == expected
+        assert re.search(r'[a-z]-$', result, re.M)
+        record_property(
+            'benchmark',
+            f'long-text report: {before * 1000:.0f} -> {after * 1000:.0f} ms '
+            f'({hyphenator.split.cache_info().hits} hyphenations cached)',
+        )
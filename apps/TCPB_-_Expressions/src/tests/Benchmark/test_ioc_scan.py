@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""Benchmark extract_indicators against one regex pass per pattern"""
+
+import random
+
+import pytest
+
+from tests.IOC.test_extract_indicators import TEXT, PatternExpression, reference
+
+WORDS = 'the report malware observed contact server beacon payload analysis at with from'.split()
+
+
+def report(lines, indicators=True):
+    """A synthetic report of lines, with addresses, hosts and hashes"""
+
+    rng = random.Random(1)
+    result = []
+    for i in range(lines):
+        words = [rng.choice(WORDS) for _ in range(8)]
+        chance = rng.random()
+        if chance < 0.3:
+            words.append('.'.join(str(rng.randint(1, 254)) for _ in range(4)))
+        elif chance < 0.4:
+            words.append(f'host{i}.example.com')
+        elif chance < 0.45:
+            words.append('%032x' % rng.getrandbits(128))
+        result.append(' '.join(words))
+    if indicators:
+        result.append(TEXT)
+    return '\n'.join(result)
+
+
+class TestExtractIndicators(object):
+    """Indicator extraction benchmark"""
+
+    @staticmethod
+    @pytest.mark.benchmark
+    @pytest.mark.parametrize('indicators', [True, False])
+    def test_extract_indicators(indicators, timed, record_property):
+        """Identical results, MB/sec before and after"""
+
+        data = report(20000, indicators)
+        expr = PatternExpression()
+
+        expected, before = timed(reference, data)
+        result, after = timed(expr.f_extract_indicators, data)
+
+        assert result == expected
+        size = len(data) / 1e6
+        record_property(
+            'benchmark',
+            f'{size:.1f}MB, email/url={indicators}: {size / before:.2f} -> '
+            f'{size / after:.2f} MB/sec ({before / after:.1f}x)',
+        )
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""Benchmark short-circuit evaluation of guarded calls against eager evaluation"""
+
+import time
+
+import pytest
+
+from lark_expr import Expression, compile_tree, get_parser
+
+ROWS = 200
+DELAY = 0.002  # stands in for a url or fetch_indicators request
+
+EXPRESSIONS = [
+    'cached or expensive(indicator)',
+    '(not cached) and expensive(indicator)',
+    'choice(cached, cached, expensive(indicator))',
+    'cached || rematch("^host", expensive(indicator))',
+]
+
+
+def run(engine, code):
+    """Evaluate code once per row, returning the results, calls and rows/sec"""
+
+    calls = []
+
+    def expensive(value):
+        """A slow call"""
+
+        calls.append(value)
+        time.sleep(DELAY)
+        return value.upper()
+
+    engine.set('expensive', expensive)
+
+    results = []
+    start = time.perf_counter()
+    for i in range(ROWS):
+        engine.set('cached', f'host{i}')
+        engine.set('indicator', f'host{i}.example.com')
+        results.append(engine.deencapsulate(code(engine.evaluator)))
+    rate = ROWS / (time.perf_counter() - start)
+
+    return results, len(calls), rate
+
+
+class TestLazyEval(object):
+    """Short-circuit evaluation benchmark"""
+
+    @staticmethod
+    @pytest.mark.benchmark
+    @pytest.mark.parametrize('expression', EXPRESSIONS)
+    def test_lazy_eval(expression, record_property):
+        """Identical results, guarded calls and rows/sec before and after"""
+
+        engine = Expression()
+        tree = get_parser().parse(expression)
+
+        expected, eager_calls, before = run(engine, compile_tree(tree, lazy=False))
+        result, lazy_calls, after = run(engine, compile_tree(tree))
+
+        assert result == expected
+        assert eager_calls == ROWS
+        assert lazy_calls == 0
+        record_property(
+            'benchmark',
+            f'{expression}: {eager_calls} -> {lazy_calls} calls, '
+            f'{before:,.0f} -> {after:,.0f} rows/sec ({after / before:.0f}x)',
+        )
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""Benchmark lazy views of TC variables against resolving the whole variable"""
+
+import json
+import time
+
+import pytest
+
+from lark_expr import Expression
+from lazyvar import LazyView
+from literal import tcvar
+
+ENTRIES = 2000
+
+VARIABLES = {
+    '#App:1:blob!String': json.dumps(
+        {'items': [{'name': f'host{i}.example.com', 'score': i} for i in range(ENTRIES)]}
+    ),
+    '#App:1:hosts!StringArray': [f'host{i}.example.com' for i in range(ENTRIES)],
+}
+
+EXPRESSIONS = [
+    '#App:1:blob!String.items[5].name',
+    '#App:1:blob!String.items[-1].score + 1',
+    '#App:1:hosts!StringArray[5]',
+    'len(#App:1:hosts!StringArray[:10])',
+]
+
+
+class Playbook(object):
+    """Playbook variables"""
+
+    @staticmethod
+    def read(variable, embedded=False):
+        """read"""
+
+        return VARIABLES[variable]
+
+
+class TcEx(object):
+    """TcEx with a playbook"""
+
+    playbook = Playbook()
+
+
+class LegacyExpression(Expression):
+    """Expression engine which resolves the whole variable when it is read"""
+
+    def redis_fetch(self, variable):
+        """Fetch a TC variable"""
+
+        if variable in self.cache:
+            return self.cache[variable]
+
+        result = self.encapsulate(self.tcex.playbook.read(variable, embedded=False))
+        while isinstance(result, tcvar):
+            result = self.deencapsulate(result)
+
+        self.cache[variable] = result
+        return result
+
+
+def run(engine, expression, count=20):
+    """Evaluate expression count times, returning the result and evaluations/sec"""
+
+    start = time.perf_counter()
+    for _ in range(count):
+        result = engine.eval(expression)
+    return result, count / (time.perf_counter() - start)
+
+
+class TestLazyVar(object):
+    """Lazy TC variable benchmark"""
+
+    @staticmethod
+    @pytest.mark.benchmark
+    @pytest.mark.parametrize('expression', EXPRESSIONS)
+    def test_lazy_var(expression, record_property):
+        """Identical results, evaluations/sec before and after (for a fresh
+        engine, so the variable is read once)"""
+
+        expected, before = run(LegacyExpression(TcEx()), expression)
+        result, after = run(Expression(TcEx()), expression)
+
+        assert result == expected
+        record_property(
+            'benchmark',
+            f'{expression}: {before:,.1f} -> {after:,.1f} evals/sec ({after / before:.1f}x)',
+        )
+
+    @staticmethod
+    def test_shared_resolution():
+        """References to the same variable share its resolved strings"""
+
+        engine = Expression(TcEx())
+        resolved = []
+        deencapsulate = engine.deencapsulate
+
+        def counting(ob):
+            """Count the strings resolved"""
+
+            if isinstance(ob, tcvar):
+                resolved.append(ob)
+            return deencapsulate(ob)
+
+        engine.deencapsulate = counting
+
+        expected = VARIABLES['#App:1:hosts!StringArray']
+        assert engine.eval('#App:1:hosts!StringArray') == expected
+        assert engine.eval('#App:1:hosts!StringArray') == expected
+        assert len(resolved) == ENTRIES
+
+
+class TestViewFunctions(object):
+    """Views passed through to builtins"""
+
+    def setup_method(self):
+        """setup"""
+
+        self.engine = Expression(TcEx())
+        self.evaluated = []
+        evaluate = self.engine.eval
+
+        def counting(expression, *args, **kwargs):
+            """Count the strings evaluated"""
+
+            if isinstance(expression, tcvar):
+                self.evaluated.append(expression)
+            return evaluate(expression, *args, **kwargs)
+
+        self.engine.eval = counting
+
+    @pytest.mark.parametrize(
+        'expression,result',
+        [
+            ('len(#App:1:hosts!StringArray)', ENTRIES),
+            ('len(#App:1:blob!String.items)', ENTRIES),
+            ('keys(#App:1:blob!String.items[0])', ['name', 'score']),
+            ('choice(true, #App:1:hosts!StringArray)[5]', 'host5.example.com'),
+        ],
+    )
+    def test_not_materialized(self, expression, result, monkeypatch):
+        """Builtins that only index a view don't resolve or materialize it"""
+
+        monkeypatch.setattr(LazyView, 'materialize', lambda self: pytest.fail('view materialized'))
+
+        assert self.engine.eval(expression) == result
+        assert len(self.evaluated) <= 1
+
+    def test_shadowed(self):
+        """Views are materialized for functions that aren't the builtin"""
+
+        self.engine.set('len', lambda value: type(value).__name__)
+
+        assert self.engine.eval('len(#App:1:hosts!StringArray)') == 'list'
+
+    def test_resolved_once(self):
+        """An element read on its own is not resolved again with the whole view"""
+
+        assert self.engine.eval('#App:1:hosts!StringArray[5]') == 'host5.example.com'
+        assert self.engine.eval('#App:1:hosts!StringArray') == VARIABLES['#App:1:hosts!StringArray']
+        assert len(self.evaluated) == ENTRIES
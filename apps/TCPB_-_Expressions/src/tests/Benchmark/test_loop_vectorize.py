@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""Benchmark vectorized loop evaluation against one evaluation per element"""
+
+import pytest
+
+from lark_expr import Expression
+from vectorize import evaluate_columns
+
+ROWS = 10000
+
+COLUMNS = {
+    'score': list(range(ROWS)),
+    'indicator': [f'Host{i}.Example.COM ' for i in range(ROWS)],
+}
+
+EXPRESSIONS = [
+    'score * 3 + 1',
+    'score > 5000',
+    'lower(strip(indicator))',
+    'replace(lower(indicator), ".com", ".net")',
+    'sha256(indicator)',
+    'rematch("host[0-9]+5", lower(indicator))',
+]
+
+
+def scalar(engine, expression):
+    """Evaluate expression once per row"""
+
+    results = []
+    for row in zip(*COLUMNS.values()):
+        for name, value in zip(COLUMNS, row):
+            engine.set(name, value)
+        results.append(engine.eval(expression))
+    return results
+
+
+class TestVectorize(object):
+    """Vectorized evaluation benchmark"""
+
+    @staticmethod
+    @pytest.mark.benchmark
+    @pytest.mark.parametrize('expression', EXPRESSIONS)
+    def test_vectorize(expression, timed, record_property):
+        """Identical results, rows/sec before and after"""
+
+        engine = Expression()
+
+        expected, before = timed(scalar, engine, expression)
+        result, after = timed(evaluate_columns, engine, expression, COLUMNS)
+
+        assert result == expected
+        record_property(
+            'benchmark',
+            f'{expression}: {ROWS / before:,.0f} -> {ROWS / after:,.0f} rows/sec '
+            f'({before / after:.1f}x)',
+        )
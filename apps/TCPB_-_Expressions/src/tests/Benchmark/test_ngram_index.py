@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""Benchmark n-gram index searches against comparing every digest"""
+
+import os
+import random
+import tempfile
+
+import pytest
+
+from lark_expr import Expression
+from spamspy.edit_dist import edit_dist_many
+from spamspy.ngram import find_best_match, NgramIndex
+from spamspy.spamsum import spamsum
+
+ALPHABET = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/'
+
+
+def corpus(count):
+    """Random 64 character digests"""
+
+    rng = random.Random(1)
+    return [''.join(rng.choice(ALPHABET) for _ in range(64)) for _ in range(count)]
+
+
+def mutate(digest, rng, edits=6):
+    """digest with a few characters changed"""
+
+    chars = list(digest)
+    for _ in range(edits):
+        chars[rng.randrange(len(chars))] = rng.choice(ALPHABET)
+    return ''.join(chars)
+
+
+class TestNgramIndex(object):
+    """N-gram index benchmark"""
+
+    @staticmethod
+    def test_append_and_reopen():
+        """Appends are kept in the index file"""
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'index.db')
+            first = spamsum('foo bla blerg woot growl bark ' * 20)
+            second = spamsum('foo bla blerg woot Growl bark ' * 20)
+
+            with NgramIndex(path) as index:
+                index.add(first, 'first')
+            with NgramIndex(path) as index:
+                index.add(second, 'second')
+            with NgramIndex(path) as index:
+                assert len(index) == 2
+                assert index.search(first, k=1) == [('first', first, 0)]
+                assert index.search(second)[0] == ('second', second, 0)
+                assert index.search('') == []
+
+    @staticmethod
+    def test_fuzzysearch_index(tmp_path):
+        """fuzzysearch only opens .ngram index files, read-only"""
+
+        digest = spamsum('foo bla blerg woot growl bark ' * 20)
+        path = str(tmp_path / 'hashes.ngram')
+        with NgramIndex(path) as index:
+            index.add(digest, 'first')
+        with open(path, 'rb') as f:
+            contents = f.read()
+        other = tmp_path / 'other.ngram'
+        other.write_text('not an index')
+
+        engine = Expression()
+
+        assert engine.f_fuzzysearch(digest, path) == [
+            {'source': 'first', 'digest': digest, 'distance': 0}
+        ]
+        with open(path, 'rb') as f:
+            assert f.read() == contents
+        with pytest.raises(ValueError):
+            engine.f_fuzzysearch(digest, str(tmp_path / 'hashes.db'))
+        with pytest.raises(ValueError):
+            engine.f_fuzzysearch(digest, str(other))
+        assert other.read_text() == 'not an index'
+        with pytest.raises(FileNotFoundError):
+            engine.f_fuzzysearch(digest, str(tmp_path / 'missing.ngram'))
+
+    @staticmethod
+    def test_find_best_match():
+        """find_best_match returns the source sharing the most n-grams, and their count"""
+
+        with NgramIndex() as index:
+            index.add('ABCDEFGH', 'first')
+            index.add('ABCDEFXY', 'second')
+
+            assert find_best_match(index, 'ABCDEFGH') == ('first', 4)
+            assert find_best_match(index, 'ZZZZZZ') == (None, 0)
+
+    @staticmethod
+    @pytest.mark.benchmark
+    def test_search(timed, record_property):
+        """Same nearest digests, searches/sec before and after"""
+
+        digests = corpus(20000)
+        rng = random.Random(2)
+        queries = [mutate(rng.choice(digests), rng) for _ in range(50)]
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'index.db')
+            with NgramIndex(path) as index:
+                index.add_many((digest, i) for i, digest in enumerate(digests))
+
+            expected, before = timed(
+                lambda: [min(edit_dist_many(query, digests)) for query in queries]
+            )
+
+            with NgramIndex(path) as index:
+                results, after = timed(lambda: [index.search(query, k=5) for query in queries])
+
+        for query, result, best in zip(queries, results, expected):
+            assert result[0][2] == best
+            assert result[0][1] == digests[result[0][0]]
+            assert [x[2] for x in result] == sorted(x[2] for x in result)
+
+        count = len(queries)
+        record_property(
+            'benchmark',
+            f'{len(digests)} digests: {count / before:.1f} -> {count / after:.1f} '
+            f'searches/sec ({before / after:.1f}x)',
+        )
@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+"""Count key value store round trips for Evaluate Many: reads, with and without
+prefetch, and output writes, with and without batching"""
+
+import json
+import logging
+import socketserver
+import contextlib
+import threading
+from types import SimpleNamespace
+
+import pytest
+import redis
+import tcex
+from tcex.key_value_store import KeyValueRedis
+from tcex.playbooks import Playbooks
+
+import app as app_module
+from app import App
+from batch_writer import BatchWriter
+from lark_expr import Expression
+from prefetch import PrefetchStore
+
+CONTEXT = 'b7c6ea2b-4a56-4f1f-a1a2-3b9c3b1e0c6f'
+
+REFERENCES = 24
+
+KVSTORE = {
+    '#App:1234:variables!KeyValueArray': [
+        {'key': 'constant', 'value': "'This is a constant'"},
+        {'key': 'ref', 'value': '#App:1234:ref!String'},
+        {'key': 'array', 'value': '(1, 2, 3, 4, 5)'},
+    ],
+    '#App:1234:outputs!KeyValueArray': [
+        {'key': 'sum', 'value': 'sum(array)'},
+        {'key': 'item_list', 'value': '(constant, 2, 4, ref)'},
+    ]
+    + [
+        {'key': f'host{i}', 'value': f'lower(#App:1234:host{i}!String) + "." + domain'}
+        for i in range(REFERENCES)
+    ],
+    '#App:1234:stringarray_outputs!KeyValueArray': [
+        {'key': 'hosts', 'value': '[#App:1234:host0!String, #App:1234:host1!String]'},
+    ],
+    '#App:1234:ref!String': 'Reference Value',
+    **{f'#App:1234:host{i}!String': f'HOST{i}' for i in range(REFERENCES)},
+}
+
+ARGS = {
+    'variables': '#App:1234:variables!KeyValueArray',
+    'outputs': '#App:1234:outputs!KeyValueArray',
+    'stringarray_outputs': '#App:1234:stringarray_outputs!KeyValueArray',
+}
+
+
+class StubHandler(socketserver.StreamRequestHandler):
+    """Redis protocol (RESP) stand-in, serving hashes from server.hashes"""
+
+    def command(self):
+        """Read one command, as a list of bytes, or None at EOF"""
+
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    @staticmethod
+    def bulk(value):
+        """Encode a bulk string reply"""
+
+        if value is None:
+            return b'$-1\r\n'
+        return b'$%d\r\n%s\r\n' % (len(value), value)
+
+    def handle(self):
+        """Serve commands until the client disconnects"""
+
+        hashes = self.server.hashes
+        while True:
+            args = self.command()
+            if args is None:
+                return
+
+            name = args[0].upper().decode()
+            self.server.commands.append(name)
+            if name == 'HGET':
+                reply = self.bulk(hashes.get(args[1], {}).get(args[2]))
+            elif name == 'HMGET':
+                values = hashes.get(args[1], {})
+                reply = b'*%d\r\n' % (len(args) - 2)
+                reply += b''.join(self.bulk(values.get(key)) for key in args[2:])
+            elif name == 'HSET':
+                values = hashes.setdefault(args[1], {})
+                for key, value in zip(args[2::2], args[3::2]):
+                    values[key] = value
+                reply = b':1\r\n'
+            else:
+                reply = b'+OK\r\n'  # e.g. CLIENT SETINFO
+            self.wfile.write(reply)
+
+
+class StubServer(socketserver.ThreadingTCPServer):
+    """Redis stand-in on a local port"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        """init"""
+
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.hashes = {}
+        self.commands = []
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def round_trips(self):
+        """The number of reads"""
+
+        return sum(1 for name in self.commands if name in ('HGET', 'HMGET'))
+
+    def writes(self):
+        """The number of writes"""
+
+        return sum(1 for name in self.commands if name == 'HSET')
+
+
+@pytest.fixture(name='server')
+def fixture_server():
+    """Redis stand-in, loaded with KVSTORE"""
+
+    server = StubServer()
+    client = redis.Redis(port=server.server_address[1], protocol=2)
+    for key, value in KVSTORE.items():
+        client.hset(CONTEXT, key, json.dumps(value))
+    server.commands.clear()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class TcEx(tcex.TcEx):
+    """The parts of TcEx used by the App.  key_value_store is tcex's own, which
+    returns the store the App sets in its place."""
+
+    log = args = default_args = playbook = None
+
+    def __init__(self, server):  # pylint: disable=super-init-not-called
+        """init"""
+
+        self.log = logging.getLogger('test_prefetch')
+        self.args = SimpleNamespace(tc_action='Evaluate Many', **ARGS)
+        self.default_args = SimpleNamespace(tc_playbook_db_context=CONTEXT)
+        self._key_value_store = KeyValueRedis(
+            redis.Redis(port=server.server_address[1], protocol=2)
+        )
+        self.playbook = None
+
+
+def make_app(server, output_variables=()):
+    """An Evaluate Many App, reading from the stand-in"""
+
+    tcex = TcEx(server)
+    tcex.playbook = Playbooks(tcex, CONTEXT, list(output_variables))
+
+    app = App.__new__(App)
+    app.tcex = tcex
+    app.engine = Expression(tcex)
+    app.engine.set('domain', 'example.com')
+    app.expression = ''
+    app.output = []
+    app.outlist = []
+    app.errors = []
+    app.loop = None
+    app.outloop = {}
+    setattr(tcex.playbook, '_wrap_embedded_keyvalue', lambda data: data)
+    return app
+
+
+class TestPrefetch(object):
+    """Key value store round trips"""
+
+    @staticmethod
+    def test_prefetch(server):
+        """Identical outputs, round trips before and after"""
+
+        app = make_app(server)
+        app.prefetch = lambda *varnames: None
+        app.evaluate_many()
+        expected = app.outlist
+        before = server.round_trips()
+
+        server.commands.clear()
+        app = make_app(server)
+        app.evaluate_many()
+        after = server.round_trips()
+
+        assert app.outlist == expected
+        assert not app.errors
+        assert ('host3', 'host3.example.com', 'String') in app.outlist
+        assert after == 2 < before
+
+    @staticmethod
+    def test_cached_variables(server):
+        """Variables already cached are not read again, and reads which
+        weren't prefetched still go to the store"""
+
+        app = make_app(server)
+        app.prefetch('stringarray_outputs')
+        assert isinstance(app.tcex.key_value_store, PrefetchStore)
+        assert server.round_trips() == 2
+
+        app.prefetch('variables')
+        assert server.round_trips() == 4
+
+        assert app.engine.eval('#App:1234:host0!String') == 'HOST0'
+        assert app.engine.eval('#App:1234:host5!String') == 'HOST5'
+        assert server.round_trips() == 5
+
+    @staticmethod
+    def test_resolved_on_use(server):
+        """Prefetched variables are only decoded and resolved when they are
+        used, so variables in branches that aren't taken never are"""
+
+        app = make_app(server)
+        app.prefetch('stringarray_outputs')
+        assert not app.engine.cache
+
+        expression = 'choice(true, #App:1234:host1!String, #App:1234:host0!String)'
+        assert app.engine.eval(expression) == 'HOST1'
+        assert list(app.engine.cache) == ['#App:1234:host1!String']
+        assert server.round_trips() == 2
+
+    @staticmethod
+    def test_read_decode(server):
+        """Reads are decoded as asked, whether or not they were prefetched"""
+
+        store = PrefetchStore(KeyValueRedis(redis.Redis(port=server.server_address[1], protocol=2)))
+        store.prefetch(CONTEXT, ['#App:1234:host0!String'])
+
+        for key in ('#App:1234:host0!String', '#App:1234:host1!String'):
+            value = json.dumps(KVSTORE[key])
+            assert store.read(CONTEXT, key) == value
+            assert store.read(CONTEXT, key, decode=False) == value.encode()
+            assert store.read(CONTEXT, key, decode='latin-1') == value
+
+
+class TestBatchWriter(object):
+    """Key value store round trips writing the outputs"""
+
+    @staticmethod
+    def written(server):
+        """The outputs in the stand-in, decoded"""
+
+        hashes = server.hashes[CONTEXT.encode()]
+        return {
+            key.decode(): json.loads(value)
+            for key, value in hashes.items()
+            if key.decode().startswith('#App:9876:')
+        }
+
+    def test_write_output(self, server, monkeypatch):
+        """Identical outputs, writes before and after"""
+
+        app = make_app(server)
+        app.evaluate_many()
+        output_variables = ['#App:9876:expression.action!String'] + [
+            f'#App:9876:{name}!{output_type}' for name, _, output_type in app.outlist
+        ]
+
+        app = make_app(server, output_variables)
+        app.evaluate_many()
+        with monkeypatch.context() as patch:
+            patch.setattr(
+                app_module, 'batched_writes', lambda tcex: contextlib.nullcontext(BatchWriter(None))
+            )
+            server.commands.clear()
+            app.write_output()
+        expected = self.written(server)
+        before = server.writes()
+
+        for key in expected:
+            del server.hashes[CONTEXT.encode()][key.encode()]
+        app = make_app(server, output_variables)
+        app.evaluate_many()
+        server.commands.clear()
+        app.write_output()
+        after = server.writes()
+
+        assert self.written(server) == expected
+        assert len(expected) == len(output_variables)
+        assert expected['#App:9876:host3!String'] == 'host3.example.com'
+        assert before == len(output_variables)
+        assert after == 1
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""Benchmark report() with a compiled filter, streamed rendering and sampled
+column widths"""
+
+from operator import itemgetter
+import random
+
+import pytest
+
+from lark_expr import Expression
+from report import Report
+from reporting import Reporting
+
+ROWS = 20000
+
+
+@pytest.fixture(name='records', scope='module')
+def fixture_records():
+    """Indicator records"""
+
+    rng = random.Random(11)
+    return [
+        {
+            'id': n,
+            'summary': f'host{n}.example.com',
+            'rating': rng.randrange(6),
+            'owner': rng.choice(['Example', 'Sample', 'Test']),
+            'description': 'Seen in a phishing campaign ' * rng.randrange(1, 3),
+        }
+        for n in range(ROWS)
+    ]
+
+
+def legacy_sort_and_filter(context, data, sort, filter):  # pylint: disable=redefined-builtin
+    """sort_and_filter() as it was, evaluating the filter for each record"""
+
+    result = []
+    for record in data:
+        try:
+            if context.eval(filter, record):
+                result.append(record)
+        except Exception:
+            pass
+
+    for sortcolumn in reversed(sort):
+        reverse = sortcolumn.startswith('-')
+        result.sort(key=itemgetter(sortcolumn.lstrip('-')), reverse=reverse)
+
+    return result
+
+
+class TestReportStream(object):
+    """Report benchmark"""
+
+    @staticmethod
+    @pytest.mark.benchmark
+    @pytest.mark.parametrize('sort', [['-rating', '-owner'], ['rating', '-owner', 'summary']])
+    def test_sort_and_filter(records, sort, timed, record_property):
+        """Identical records, and time before and after"""
+
+        engine = Expression()
+        filter = 'rating > 1 and owner != "Test"'  # pylint: disable=redefined-builtin
+
+        expected, before = timed(legacy_sort_and_filter, engine, list(records), sort, filter)
+        result, after = timed(
+            Reporting(engine).sort_and_filter, list(records), sort=sort, filter=filter
+        )
+
+        assert result == expected
+        record_property(
+            'benchmark', f'sort_and_filter({sort}): {before * 1000:.0f} -> {after * 1000:.0f} ms'
+        )
+
+    @staticmethod
+    def test_bad_filter(records):
+        """A filter that doesn't parse excludes every record"""
+
+        engine = Expression()
+
+        assert not Reporting(engine).sort_and_filter(list(records[:10]), filter='rating >')
+
+    @staticmethod
+    def test_render_iter(records):
+        """render_iter() streams the lines of render()"""
+
+        columns = Reporting(None).report_autowidth(records[:100], line_width=100)
+        report = Report(columns, title='Indicators', width=100)
+        for record in records[:100]:
+            report.add(**record)
+
+        lines = report.render_iter()
+        first = next(lines)
+
+        assert report.lineno == 0  # no records rendered yet
+        assert '\n'.join([first, *lines]) == report.render()
+
+    @staticmethod
+    def test_autowidth_columns():
+        """Columns only in rows outside the sample are sized from those rows"""
+
+        records = [{'host': f'host{n}.example.com', 'score': n} for n in range(5000)]
+        records[1] = dict(records[1], note='a rare note')
+
+        (columns,) = Reporting.report_autowidth(records, 0, sample_rows=1000)
+
+        assert list(columns) == ['host', 'score', 'note']
+        assert columns['note'] == len('a rare note')
+
+    @staticmethod
+    @pytest.mark.benchmark
+    def test_autowidth(records, timed, record_property):
+        """Sampled column widths match the widths from all the records, and time before
+        and after"""
+
+        expected, before = timed(Reporting.report_autowidth, records, 100, sample_rows=0)
+        result, after = timed(Reporting.report_autowidth, records, 100)
+
+        assert result == expected
+        record_property(
+            'benchmark', f'report_autowidth: {before * 1000:.1f} -> {after * 1000:.1f} ms'
+        )
+
+    @staticmethod
+    @pytest.mark.benchmark
+    def test_report(records, timed, record_property):
+        """Time for a whole report"""
+
+        engine = Expression()
+
+        report, elapsed = timed(
+            engine.f_report,
+            records,
+            sort=['-rating', 'summary'],
+            filter='rating > 1',
+            width=100,
+        )
+
+        assert report.count('\n') > len(records) // 2
+        record_property('benchmark', f'report of {ROWS} records: {elapsed * 1000:.0f} ms')
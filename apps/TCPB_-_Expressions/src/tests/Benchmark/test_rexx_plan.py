@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""Benchmark REXX parsing with compiled parse plans, and rexxparse_many"""
+
+import random
+
+import pytest
+
+from lark_expr import Expression
+from rexxparse import compile_template, RexxParser
+
+LINES = 50000
+
+TEMPLATE = 'month day time host program "[" pid "]: " message'
+
+
+@pytest.fixture(name='syslog', scope='module')
+def fixture_syslog():
+    """Syslog lines"""
+
+    rng = random.Random(13)
+    return [
+        f'Sep {rng.randrange(1, 31):2d} 12:{rng.randrange(60):02d}:{rng.randrange(60):02d} '
+        f'host{rng.randrange(20)} sshd[{rng.randrange(1000, 9999)}]: '
+        f'Failed password for root from 10.0.{rng.randrange(256)}.{rng.randrange(256)}'
+        for _ in range(LINES)
+    ]
+
+
+def uncompiled(lines):
+    """Parse each line, tokenizing the template each time as rexxparse() did"""
+
+    result = []
+    for line in lines:
+        compile_template.cache_clear()
+        result.append(RexxParser(TEMPLATE).parse(line))
+    return result
+
+
+class TestRexxPlan(object):
+    """REXX parse plan benchmark"""
+
+    @staticmethod
+    @pytest.mark.benchmark
+    def test_rexxparse_many(syslog, timed, record_property):
+        """Identical results, and time before and after"""
+
+        engine = Expression()
+
+        expected, before = timed(uncompiled, syslog)
+        each, after = timed(lambda: [engine.f_rexxparse(line, TEMPLATE) for line in syslog])
+        many, after_many = timed(engine.f_rexxparse_many, syslog, TEMPLATE)
+        blob = engine.f_rexxparse_many('\n'.join(syslog[:100]) + '\n', TEMPLATE)
+
+        assert each == expected
+        assert list(many) == ['month', 'day', 'time', 'host', 'program', 'pid', 'message']
+        assert [dict(zip(many, values)) for values in zip(*many.values())] == expected
+        assert [dict(zip(blob, values)) for values in zip(*blob.values())] == expected[:100]
+        record_property(
+            'benchmark',
+            f'rexxparse x {LINES}: {before * 1000:.0f} -> {after * 1000:.0f} ms, '
+            f'rexxparse_many {after_many * 1000:.0f} ms',
+        )
+
+    @staticmethod
+    def test_loop(syslog):
+        """The template is compiled once for all the iterations of a loop"""
+
+        engine = Expression()
+        engine.set('template', TEMPLATE)
+        compile_template.cache_clear()
+
+        for line in syslog[:100]:
+            engine.set('line', line)
+            engine.eval('rexxparse(line, template)')
+
+        info = compile_template.cache_info()
+        assert (info.misses, info.hits) == (1, 99)
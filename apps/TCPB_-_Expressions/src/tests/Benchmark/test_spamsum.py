@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""Benchmark spamsum digests against the per-character hash object implementation"""
+
+import os
+import random
+import tempfile
+
+import pytest
+
+from spamspy.spamsum import MAX_DIGEST_LEN, _block_size, fuzzy_hash, fuzzy_hash_file, spamsum
+
+MAX_UINT32 = 0xFFFFFFFF
+
+
+class RollingHash:
+    _ROLLING_WINDOW = 7
+
+    def __init__(self):
+        self.h1 = 0
+        self.h2 = 0
+        self.h3 = 0
+
+        self.window = [0] * self._ROLLING_WINDOW
+        self.n = 0
+
+    @property
+    def hash(self):
+        h = self.h1 + self.h2 + self.h3
+        return h & MAX_UINT32
+
+    def update(self, c):
+        c = ord(c)
+
+        self.h2 -= self.h1
+        self.h2 += self._ROLLING_WINDOW * c
+
+        self.h1 += c
+        self.h1 -= self.window[self.n % self._ROLLING_WINDOW]
+
+        self.window[self.n % self._ROLLING_WINDOW] = c
+        self.n += 1
+
+        self.h3 = (self.h3 << 5) & MAX_UINT32
+        self.h3 ^= c
+
+
+class SumHash:
+    def __init__(self):
+        self.hash = 0x28021967
+
+    def update(self, c):
+        self.hash *= 0x01000193
+        self.hash &= MAX_UINT32
+        self.hash ^= ord(c)
+
+
+def legacy_spamsum(s, block_size=None, digest_len=MAX_DIGEST_LEN, legacy_mode=False):
+    """The spamsum digest, one character at a time"""
+
+    b64 = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/'
+    block_size = block_size or _block_size(s)
+
+    hashes = []
+    sh = SumHash()
+    rh = RollingHash()
+
+    for c in s:
+        sh.update(c)
+        rh.update(c)
+
+        if (rh.hash % block_size) == (block_size - 1):
+            if len(hashes) < (digest_len - 1):
+                hashes.append(sh.hash)
+                sh = SumHash()
+
+    if rh.hash != 0:
+        if legacy_mode or sh.hash != SumHash().hash:
+            hashes.append(sh.hash)
+
+    return ''.join(b64[h % 64] for h in hashes)
+
+
+def legacy_fuzzy_hash(s):
+    """block_size:digest:double_block_digest, hashing each block size separately"""
+
+    block_size = _block_size(s)
+
+    while True:
+        normal = legacy_spamsum(s, block_size, MAX_DIGEST_LEN)
+        shorter = legacy_spamsum(s, block_size * 2, MAX_DIGEST_LEN / 2)
+
+        if len(normal) < (MAX_DIGEST_LEN / 2) and block_size > 3:
+            block_size //= 2
+        else:
+            return '%d:%s:%s' % (block_size, normal, shorter)
+
+
+def document(size, seed=1):
+    """size characters of text"""
+
+    rng = random.Random(seed)
+    words = 'the report malware observed contact server beacon payload analysis'.split()
+    text = []
+    length = 0
+    while length < size:
+        word = rng.choice(words) + rng.choice(' \n')
+        text.append(word)
+        length += len(word)
+    return ''.join(text)[:size]
+
+
+class TestSpamsum(object):
+    """Spamsum benchmark"""
+
+    @staticmethod
+    def test_random_strings():
+        """Identical results for str and bytes, block sizes and digest lengths"""
+
+        rng = random.Random(2)
+        for _ in range(300):
+            s = ''.join(rng.choice('abcdefg \né€') for _ in range(rng.randint(0, 3000)))
+            block_size = rng.choice([None, 3, 12])
+            digest_len = rng.choice([MAX_DIGEST_LEN, MAX_DIGEST_LEN / 2, 2])
+            legacy_mode = rng.random() < 0.2
+            expected = legacy_spamsum(s, block_size, digest_len, legacy_mode)
+            assert spamsum(s, block_size, digest_len, legacy_mode) == expected
+            latin = s.encode('latin-1', 'ignore')
+            assert spamsum(latin, block_size, digest_len, legacy_mode) == legacy_spamsum(
+                latin.decode('latin-1'), block_size, digest_len, legacy_mode
+            )
+
+    @staticmethod
+    def test_fuzzy_hash_file():
+        """Files are hashed in chunks, with the same digest"""
+
+        data = document(200000)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'data')
+            with open(path, 'wb') as f:
+                f.write(data.encode('utf-8'))
+            assert fuzzy_hash_file(path, chunk_size=65536) == legacy_fuzzy_hash(data)
+
+    @staticmethod
+    @pytest.mark.benchmark
+    def test_fuzzy_hash(timed, record_property):
+        """Identical results for both block sizes, MB/sec before and after"""
+
+        data = document(1000000)
+
+        expected, before = timed(legacy_fuzzy_hash, data)
+        result, after = timed(fuzzy_hash, data)
+
+        assert result == expected
+
+        size = len(data) / 1e6
+        record_property(
+            'benchmark',
+            f'{size:.1f}MB: {size / before:.2f} -> {size / after:.2f} MB/sec '
+            f'({before / after:.1f}x)',
+        )
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""Benchmark Expressions startup (import to first evaluation)"""
+
+import json
+import os
+import subprocess  # nosec
+import sys
+
+import lark_expr
+
+STARTUP = '''
+import json
+import sys
+import time
+
+start = time.perf_counter()
+import lark_expr
+from lark_expr import Expression
+if '--no-parser-cache' in sys.argv:
+    lark_expr.PARSER_CACHE = ''
+imported = time.perf_counter()
+result = Expression().eval('upper("a") + str(1 + 2)')
+done = time.perf_counter()
+
+lazy = ('chardet', 'ioc_fanger', 'jmespath', 'requests', 'tcex')
+print(json.dumps({
+    'import': imported - start,
+    'first_eval': done - imported,
+    'total': done - start,
+    'result': result,
+    'loaded': [x for x in lazy if x in sys.modules],
+}))
+'''
+
+
+def startup(*args):
+    """Run a fresh interpreter, returning its startup timings"""
+
+    src = os.path.dirname(os.path.abspath(lark_expr.__file__))
+    output = subprocess.check_output([sys.executable, '-c', STARTUP, *args], cwd=src)  # nosec
+    return json.loads(output.decode('utf-8').strip().split('\n')[-1])
+
+
+class TestStartup(object):
+    """Startup benchmark"""
+
+    @staticmethod
+    def test_startup(record_property):
+        """import to first eval, building the parser and loading the packaged one"""
+
+        src = os.listdir(os.path.dirname(os.path.abspath(lark_expr.__file__)))
+
+        cold = startup('--no-parser-cache')
+        warm = startup()
+
+        record_property(
+            'benchmark',
+            f'startup cold: {cold["total"]:.3f}s (first eval {cold["first_eval"]:.3f}s), '
+            f'warm: {warm["total"]:.3f}s (first eval {warm["first_eval"]:.3f}s)',
+        )
+
+        assert cold['result'] == warm['result'] == 'A3'
+        assert os.listdir(os.path.dirname(os.path.abspath(lark_expr.__file__))) == src
+        assert not warm['loaded'], f'{warm["loaded"]} imported before use'
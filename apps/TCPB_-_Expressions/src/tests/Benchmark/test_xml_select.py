@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""Benchmark reading selected elements of a large XML feed incrementally"""
+
+import time
+import tracemalloc
+
+from defusedxml import EntitiesForbidden
+import pytest
+
+from methods import ExpressionMethods
+from xml_util import xml_to_dict
+
+INDICATORS = 10000
+
+
+@pytest.fixture(name='feed', scope='module')
+def fixture_feed():
+    """A STIX style feed of indicators"""
+
+    parts = [
+        '<stix:STIX_Package xmlns:stix="http://stix.mitre.org/stix-1" '
+        'xmlns:indicator="http://stix.mitre.org/Indicator-2">',
+        '<stix:STIX_Header><stix:Title>Feed</stix:Title></stix:STIX_Header>',
+        '<stix:Indicators>',
+    ]
+    for n in range(INDICATORS):
+        parts.append(
+            f'<stix:Indicator id="example:indicator-{n}" timestamp="2021-09-23T00:00:00Z">'
+            f'<indicator:Title>Indicator {n}</indicator:Title>'
+            f'<indicator:Type>Domain Watchlist</indicator:Type>'
+            f'<indicator:Observable><indicator:Value>host{n}.example.com</indicator:Value>'
+            f'<indicator:Rating>{n % 5}</indicator:Rating></indicator:Observable>'
+            f'<indicator:Description>{"Seen in a phishing campaign. " * 4}</indicator:Description>'
+            '</stix:Indicator>'
+        )
+    parts.append('</stix:Indicators></stix:STIX_Package>')
+    return '\n'.join(parts)
+
+
+def measured(f, *args, **kwargs):
+    """(result, seconds, MB) of f(*args, **kwargs), where MB is the peak memory
+    used beyond the memory kept for the result"""
+
+    start = time.perf_counter()
+    f(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    try:
+        result = f(*args, **kwargs)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return result, elapsed, (peak - current) / (1 << 20)
+
+
+def read_all(feed):
+    """The indicators, from the whole document"""
+
+    package = xml_to_dict(feed, compact=False)['STIX_Package']
+    return [child for child in package if 'Indicators' in child][0]['Indicators']
+
+
+class TestXmlSelect(object):
+    """Incremental XML benchmark"""
+
+    @staticmethod
+    @pytest.mark.benchmark
+    def test_select(feed, record_property):
+        """Identical indicators, and time and peak memory before and after"""
+
+        expected, before, before_peak = measured(read_all, feed)
+        result, after, after_peak = measured(
+            ExpressionMethods().f_xmlread, feed, select='Indicators/Indicator'
+        )
+
+        assert result == expected
+        assert len(result) == INDICATORS
+        assert after_peak * 4 < before_peak
+        record_property(
+            'benchmark',
+            f'xmlread of {len(feed) >> 20} MB: {before * 1000:.0f} -> {after * 1000:.0f} ms, '
+            f'working memory {before_peak:.1f} -> {after_peak:.1f} MB',
+        )
+
+    @staticmethod
+    @pytest.mark.parametrize(
+        'select,result',
+        [
+            ('/a', [{'a': 1}, {'a': 2}, {'a': [{'b': 3}]}]),
+            ('a', [{'a': 1}, {'a': 2}, {'a': [{'b': 3}]}]),
+            ('/a/b', [{'b': 3}]),
+            ('b', [{'b': 3}]),
+            ('/b', []),
+        ],
+    )
+    def test_several_roots(select, result):
+        """Documents with several root elements are read as siblings"""
+
+        xmldata = '<a>1</a><a>2</a><a><b>3</b></a>'
+
+        assert ExpressionMethods().f_xmlread(xmldata, select=select) == result
+
+    @staticmethod
+    def test_entities_forbidden():
+        """Incremental reads are defused too"""
+
+        bomb = (
+            '<!DOCTYPE lolz [<!ENTITY lol "lol"><!ENTITY lol2 "&lol;&lol;&lol;">]>'
+            '<lolz><item>&lol2;</item></lolz>'
+        )
+        with pytest.raises(EntitiesForbidden):
+            ExpressionMethods().f_xmlread(bomb, select='item')
@@ -1,10 +1,13 @@
 # -*- coding: utf-8 -*-
 """Test atomic values from expression Parser"""
 
+import json
+import os
 from inspect import isclass
 
 import pytest
-from lark_expr import Expression
+import lark_expr
+from lark_expr import Expression, compile_expression
 
 # pylint: disable=attribute-defined-outside-init
 
@@ -69,7 +72,7 @@ EVAL_TESTS = [
     ('"e" not in name', True),
     ('"a" not in name', False),
     ('not "e" in name', True),
-    ('1 in 1,2,3', TypeError),
+    ('1 in 1,2,3', SyntaxError),
     ('1 in (1,2,3)', True),
     ('(true)', True),
     ('(true', SyntaxError),
@@ -105,3 +108,137 @@ class TestEval(object):
         else:
             value = self.expr.eval(expression)
             assert value == result, f'{expression} == {result}'
+
+
+class TestCompiled(object):
+    """Test compiled expression reuse"""
+
+    def setup_class(self):
+        """setup"""
+
+        self.expr = Expression()
+
+    def test_compile_cache(self):
+        """the same expression text is only compiled once"""
+
+        compile_expression.cache_clear()
+
+        for i in range(100):
+            self.expr.set('x', i)
+            assert self.expr.eval('x * 2 + 1') == i * 2 + 1
+
+        info = compile_expression.cache_info()
+        assert info.misses == 1
+        assert info.hits == 99
+
+    def test_compiled_namespace(self):
+        """compiled expressions are evaluated against the current namespace"""
+
+        code = compile_expression('upper(name) + "!"')
+
+        self.expr.set('name', 'matt')
+        assert code(self.expr.evaluator) == 'MATT!'
+        self.expr.set('name', 'bob')
+        assert code(self.expr.evaluator) == 'BOB!'
+
+    def test_compiled_trace(self):
+        """eval and compiled expressions share one path, including tracing"""
+
+        code = self.expr.compiled('1 + 2')
+        lines = []
+        self.expr.trace = lines.append
+        try:
+            assert code() == 3
+            assert self.expr.eval('1 + 2') == 3
+        finally:
+            self.expr.trace = None
+
+        assert lines == ['<?< 1 + 2', '>R> 3'] * 2
+
+    def test_long_list(self):
+        """long lists (e.g. JSON documents) don't exhaust the recursion limit"""
+
+        document = {'items': [{'name': f'host{i}', 'score': i} for i in range(5000)]}
+
+        assert self.expr.eval(json.dumps(document)) == document
+
+    @pytest.mark.parametrize(
+        'operator,operand,result',
+        [
+            ('+', '1', 5000),
+            ('-', '1', -4998),
+            ('*', '1', 1),
+            (' or ', '0', 0),
+            (' and ', '1', 1),
+            (' + ', '"a"', 'a' * 5000),
+        ],
+    )
+    def test_long_chain(self, operator, operand, result):
+        """long chains of binary operators don't exhaust the recursion limit"""
+
+        assert self.expr.eval(operator.join([operand] * 5000)) == result
+
+    def test_chain_order(self):
+        """chains are evaluated left to right, and and/or short-circuit"""
+
+        assert self.expr.eval('10 - 2 - 3 - 4') == 1
+        assert self.expr.eval('2 ** 3 ** 2') == 64
+        assert self.expr.eval('0 or 0 or 3 or error("x")') == 3
+        assert self.expr.eval('1 and 0 and error("x")') == 0
+
+    @staticmethod
+    def test_packaged_parser():
+        """the packaged parser was built from this grammar, with the version of
+        lark pinned in requirements.txt ('python lark_expr.py --build-parser'
+        rebuilds it)"""
+
+        with open(lark_expr.PARSER_CACHE, 'rb') as f:
+            digest, version = f.readline().decode('ascii').split()
+
+        assert digest.encode('ascii') == lark_expr.parser_key().split()[0]
+
+        requirements = os.path.join(os.path.dirname(lark_expr.GRAMMAR), 'requirements.txt')
+        with open(requirements, 'r') as f:
+            pins = [line.strip() for line in f if line.startswith('lark')]
+        assert pins == [f'lark=={version}']
+
+
+class TestLazy(object):
+    """Test short-circuit evaluation"""
+
+    def setup_method(self):
+        """setup"""
+
+        self.calls = []
+        self.expr = Expression()
+        self.expr.set('probe', lambda value=None: self.calls.append(value) or value)
+
+    @pytest.mark.parametrize(
+        'expression,result,calls',
+        [
+            ('probe(1) or probe(2)', 1, [1]),
+            ('probe(0) or probe(2)', 2, [0, 2]),
+            ('probe(0) and probe(2)', 0, [0]),
+            ('probe(1) && probe(2)', 2, [1, 2]),
+            ('probe(1) || missing', 1, [1]),
+            ('probe(0) and missing(1)', 0, [0]),
+            ('choice(probe(1), probe(2), probe(3))', 2, [1, 2]),
+            ('choice(probe(0), probe(2), probe(3))', 3, [0, 3]),
+            ('choice(probe(0), probe(2))', None, [0]),
+            ('choice(probe(1), probe(2),)', 2, [1, 2]),
+            ('choice(probe(0), true_result=probe(2))', None, [0, 2]),
+        ],
+    )
+    def test_short_circuit(self, expression, result, calls):
+        """Operands and results that don't decide the value are not evaluated"""
+
+        assert self.expr.eval(expression) == result
+        assert self.calls == calls
+
+    def test_shadowed_choice(self):
+        """All arguments are evaluated if choice is not the builtin"""
+
+        self.expr.set('choice', lambda *args: args)
+
+        assert self.expr.eval('choice(probe(1), probe(2), probe(3))') == (1, 2, 3)
+        assert self.calls == [1, 2, 3]
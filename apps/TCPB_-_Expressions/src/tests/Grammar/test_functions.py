@@ -367,6 +367,13 @@ FUNCTION_TESTS = [
     ("format('a')", 'a'),
     ("format('{pi}')", '3.141592653589793'),
     ("format('{pi} / 2 = {f}', f=pi/2)", '3.141592653589793 / 2 = 1.5707963267948966'),
+    ("format('{a.b[0].c}|{a[b][0][c]:>3}|{a.x}', a={'b': [{'c': 1}]})", '1|  1|'),
+    ("format('{nosuch}|{nosuch.x}')", '|'),
+    (
+        "format_many('{id}: {host.name}{sep}', [{'id': 1, 'host': {'name': 'a'}}, "
+        "{'id': 2, 'host': {'name': 'b'}, 'sep': '.'}], sep='')",
+        ['1: a', '2: b.'],
+    ),
     (
         'gamma(0)',
         ValueError(
@@ -453,6 +460,8 @@ FUNCTION_TESTS = [
     ("jmespath('b', { 'a': 1, 'b': [{'i': 0}, {'i': 1}]})", [{'i': 0}, {'i': 1}]),
     ("jmespath('*.i', { 'a': 1, 'b': [{'i': 0}, {'i': 1}]})", []),
     ("jmespath('b[].i', { 'a': 1, 'b': [{'i': 0}, {'i': 1}]})", [0, 1]),
+    ("jmespath('b[].i', '{\"b\": [{\"i\": 0}, {\"i\": 1}]}')", [0, 1]),
+    ("jmespath_many('a', ({'a': 1}, {'b': 2}, '{\"a\": 3}'))", [1, None, 3]),
     (
         "json({ 'a': 1, 'b': [{'i': 0}, {'i': 1}]})",
         '{\n  "a": 1,\n  "b": [\n    {\n      "i": 0\n    },\n    {\n      "i": 1\n    }\n  ]\n}',
@@ -751,6 +760,9 @@ FUNCTION_TESTS = [
     ),
     ("research('\\d{4}-\\d{2}-\\d{2}', '2017-07-01T16:18:19')", '2017-07-01'),
     ("rematch('\\d{4}-\\d{2}-\\d{2}', '2017-07-01T16:18:19')", '2017-07-01'),
+    ("rematch('abc', 'ABCD', 'i')", 'ABC'),
+    ("refindall_many('[0-9]+', ('a1b22', 'none', '333'))", [['1', '22'], None, ['333']]),
+    ("refindall_many('[a-c]', ('ABC', 'xyz'), 'i')", [['A', 'B', 'C'], None]),
     ('pformat(1)', '1'),
     ("pformat('foo')", "'foo'"),
     ("pformat({'a': 1, 'b': {'c': 2}})", "{'a': 1, 'b': {'c': 2}}"),
@@ -762,6 +774,12 @@ FUNCTION_TESTS = [
     ('csvread("a,b,c,1,2,3.5\\na,b,c",rows=1)', ['a', 'b', 'c', 1, 2, 3.5]),
     ('csvread("a,b,c,1,2,3.5\\na,b,c",rows=1,columns=3)', ['a', 'b', 'c']),
     ('csvread("a,b,c,1,2,3.5\\nx,y,z",rows=1,columns=3,header=True)', ['x', 'y', 'z']),
+    ('csvread("0.0,-1.5,1e3,x")', [0.0, -1.5, 1000.0, 'x']),
+    (
+        'csvread("name,count\\nfoo,1\\nbar,2,x",header=True,columnar=True)',
+        {'name': ['foo', 'bar'], 'count': [1, 2], 2: [None, 'x']},
+    ),
+    ('csvread("a,1\\nb,2\\nc,3",columnar=True,rows=2)', {0: ['a', 'b'], 1: [1, 2]}),
     (
         'csvwrite(["Mary had a little lamb, whose fleece was white as snow", 1, 2, 3.5])',
         '"Mary had a little lamb, whose fleece was white as snow",1,2,3.5\r\n',
@@ -779,9 +797,26 @@ FUNCTION_TESTS = [
     ('sha256(None)', 'dc937b59892604f5a86ac96936cd7ff09e25f18ae6b758e8014a24c7fa039e91'),
     ("sha256('')", 'e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855'),
     ("fuzzydist(spamsum('foo '*512 + ' bla'), spamsum('foo '*513))", 2),
+    (
+        "fuzzysearch('NQFu2URFUKSJ9Ee', ['NQFu2URF0Ge', 'NQFu2URFUKSJ9Ee', 'x'], k=2)",
+        [
+            {'source': 1, 'digest': 'NQFu2URFUKSJ9Ee', 'distance': 0},
+            {'source': 0, 'digest': 'NQFu2URF0Ge', 'distance': 8},
+        ],
+    ),
+    (
+        "fuzzysearch('NQFu2URFUKSJ9Ee', {'a': 'NQFu2URF0Ge', 'b': 'xyz'}, limit=4)",
+        [],
+    ),
     ("fuzzyhash('foo bla blerg woot growl bark')", 'NQFu2URFUKSJ9Ee'),
     ("fuzzyhash('foo bla blerg woot Growl bark')", 'NQFu2URF0Ge'),
+    ("fuzzyhash(bytes('foo bla blerg woot growl bark', 'utf-8'))", 'NQFu2URFUKSJ9Ee'),
     ("fuzzydist('NQFu2URFUKSJ9Ee', 'NQFu2URF0Ge')", 8),
+    ("fuzzydist_many('NQFu2URFUKSJ9Ee', ['NQFu2URF0Ge', 'NQFu2URFUKSJ9Ee', 'x'])", [8, 0, 16]),
+    (
+        "fuzzydist_many('NQFu2URFUKSJ9Ee', ['NQFu2URF0Ge', 'NQFu2URFUKSJ9Ee', 'x'], limit=8)",
+        [8, 0, None],
+    ),
     (
         "refindall(urlre, 'this contains www.foo.com https://www.foo.com/bla/oog as a url"
         " and foo.bla.org/path?param=f&z=y and 1.2.3.4 and matt@domain.com')",
@@ -793,6 +828,21 @@ FUNCTION_TESTS = [
     ),
     ("urlparse_qs('foo=bla&bla=oog').foo[0]", 'bla'),
     ('unique((1,2,3,4,5,2,1,{"foo": "bla"}))', [1, 2, 3, 4, 5, {'foo': 'bla'}]),
+    (
+        'unique((1, 1.0, true, "1", {"a": 1, "b": 2}, {"b": 2, "a": 1}))',
+        [1, 1.0, True, '1', {'a': 1, 'b': 2}],
+    ),
+    ('intersect((1, 2, 3, 4, 3), (3, 2, 5), (2, 3))', [2, 3]),
+    ('intersect(({"a": 1, "b": 2}, {"a": 2}), ({"b": 2, "a": 1},))', [{'a': 1, 'b': 2}]),
+    ('difference((1, 2, 2, 3, {"a": 1}), (2,), ({"a": 1},))', [1, 3]),
+    (
+        'group_by(({"t": "a", "v": 1}, {"t": "b"}, {"t": "a", "v": 2}), "t")',
+        [
+            {'key': 'a', 'value': [{'t': 'a', 'v': 1}, {'t': 'a', 'v': 2}]},
+            {'key': 'b', 'value': [{'t': 'b'}]},
+        ],
+    ),
+    ('group_by((1, 2, 1))', [{'key': 1, 'value': [1, 1]}, {'key': 2, 'value': [2]}]),
     ("fuzzymatch('bla'+'foo'*63, 'foo'*63+'bla')", 98.17708333333333),
     ("fuzzymatch('foo bla zoid', 'foo bla21 blerg')", 74.07407407407408),
     ("fuzzymatch('foo bla zoid', 'foo bla21 blerg')>75", False),
@@ -879,6 +929,16 @@ FUNCTION_TESTS = [
         'rexxparse(\'Mary had a little lamb\', \'"little " chop +2 -2 animal +3 1 phrase\' )',
         {'chop': 'li', 'animal': 'lit', 'phrase': 'Mary had a little lamb'},
     ),
+    (
+        'rexxparse_many(\'Mary had a little lamb\\nBob had a big cat\', \'name . "had a " size thing\')',
+        {'name': ['Mary', 'Bob'], 'size': ['little', 'big'], 'thing': ['lamb', 'cat']},
+    ),
+    (
+        "rexxparse_many(['id=7 n= 2.5', 'id=12 n=3'], '\"id=\" id \"n=\" n', convert=True)",
+        {'id': [7, 12], 'n': [2.5, 3]},
+    ),
+    ("rexxparse('a-b', 'x (sep) y', sep='-')", {'x': 'a', 'y': 'b'}),
+    ("rexxparse('a b c', 'x (sep) y')", KeyError),
     ("uuid3('dns', 'mtu.edu')", '93ea5ad7-ae2d-3509-bbbc-958b90bfe336'),
     ("uuid5('dns', 'mtu.edu')", 'b796a2f3-fcde-53a1-9123-e11e6c8f3216'),
     ('uuid4()', sametype('b796a2f3-fcde-53a1-9123-e11e6c8f3216')),
@@ -897,6 +957,21 @@ FUNCTION_TESTS = [
         'compact=False)',
         {'people': [{'person': [{'name': 'Matt'}, {'job': 'Developer'}]}]},
     ),
+    (
+        "xmlread('<people><person><name>Matt</name></person><team><person><name>Ann</name>"
+        "</person></team></people>', select='person')",
+        [{'person': [{'name': 'Matt'}]}, {'person': [{'name': 'Ann'}]}],
+    ),
+    (
+        "xmlread('<people><person><name>Matt</name></person><team><person><name>Ann</name>"
+        "</person></team></people>', select='/people/person')",
+        [{'person': [{'name': 'Matt'}]}],
+    ),
+    (
+        "xmlread('<person id=\"1\"><n>1</n></person><person><n>2</n></person>', "
+        "select='*/n', compact=True)",
+        [{'n': 1}, {'n': 2}],
+    ),
     (
         "xmlwrite({'people': [{'person': [{'name': 'Matt'}, {'job': 'Developer'}]}]})",
         '<people><person><name>Matt</name><job>Developer</job></person></people>',
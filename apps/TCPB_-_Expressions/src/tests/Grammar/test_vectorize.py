@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""Test vectorized evaluation of loop expressions"""
+
+import pytest
+import vectorize
+from lark_expr import Expression, parse_expression
+from vectorize import evaluate_columns
+
+# pylint: disable=attribute-defined-outside-init
+
+COLUMNS = {
+    'i': list(range(-5, 6)),
+    'f': [x / 4 for x in range(-5, 6)],
+    's': ['alpha', 'Beta', 'gamma', '', 'delta', 'EPSILON', 'zeta', 'eta', 'theta', 'iota', 'k'],
+}
+
+VECTOR_TESTS = [
+    'i + 1',
+    'i * 2 - 3',
+    '-i',
+    'i / 2',
+    'f * i + 0.5',
+    'i > 0',
+    'i == f',
+    'i <= 2',
+    'i != 3',
+    'abs(i) + round(f, 1)',
+    'upper(s) + "!"',
+    's + str(i)',
+    'len(s) * i',
+    'md5(s)',
+    'rematch("[a-z]+", s)',
+    'replace(s, "a", "4")',
+    '[i, s]',
+    'sqrt(i * i)',
+]
+
+FALLBACK_TESTS = [
+    '_previous + i',  # excluded name
+    'url(s)',  # not an element-wise function
+    '1 / i',  # division by zero
+    'chr(i)',  # error for negative values
+    '1 + 2',  # no loop variables
+    'i +',  # syntax error
+]
+
+
+class TestVectorize(object):
+    """Test vectorized evaluation against element at a time evaluation"""
+
+    def setup_class(self):
+        """setup"""
+
+        self.expr = Expression()
+
+    def scalar(self, expression):
+        """Evaluate expression one row at a time"""
+
+        results = []
+        for row in zip(*COLUMNS.values()):
+            for name, value in zip(COLUMNS, row):
+                self.expr.set(name, value)
+            results.append(self.expr.eval(expression))
+        return results
+
+    @pytest.mark.parametrize('expression', VECTOR_TESTS)
+    def test_vector(self, expression):
+        """vectorized results match the scalar results"""
+
+        result = evaluate_columns(self.expr, expression, COLUMNS, {'_previous'})
+        assert result is not None
+        assert result == self.scalar(expression)
+        assert [type(x) for x in result] == [type(x) for x in self.scalar(expression)]
+
+    @pytest.mark.parametrize('expression', VECTOR_TESTS)
+    def test_vector_without_numpy(self, expression, monkeypatch):
+        """vectorized results match the scalar results without NumPy"""
+
+        monkeypatch.setattr(vectorize, 'numpy', None)
+        result = evaluate_columns(self.expr, expression, COLUMNS)
+        assert result == self.scalar(expression)
+
+    @pytest.mark.parametrize('expression', FALLBACK_TESTS)
+    def test_fallback(self, expression):
+        """expressions that cannot be vectorized return None"""
+
+        assert evaluate_columns(self.expr, expression, COLUMNS, {'_previous'}) is None
+
+    def test_shadowed_function(self):
+        """functions shadowed by variables are not vectorized"""
+
+        self.expr.set('upper', 'x')
+        try:
+            assert evaluate_columns(self.expr, 'upper(s)', COLUMNS) is None
+        finally:
+            del self.expr.variables['upper']
+
+    def test_large_integers(self):
+        """integers outside the NumPy-safe range give exact Python results"""
+
+        columns = {'i': [2 ** 62, 2 ** 63, -(2 ** 70)]}
+        result = evaluate_columns(self.expr, 'i * 4 + 1', columns)
+        assert result == [x * 4 + 1 for x in columns['i']]
+
+    def test_parse_cache(self):
+        """the loop expression is parsed once for repeated evaluations"""
+
+        parse_expression.cache_clear()
+
+        for _ in range(10):
+            evaluate_columns(self.expr, 'i * 3 - 1', COLUMNS)
+
+        info = parse_expression.cache_info()
+        assert (info.misses, info.hits) == (1, 9)
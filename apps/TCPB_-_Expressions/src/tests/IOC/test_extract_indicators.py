@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""Test extract_indicators and the indicator scanner"""
+
+import json
+import os
+import re
+
+import pytest
+
+from ioc_scan import IndicatorScanner, compile_pattern
+from lark_expr import Expression
+
+# pylint: disable=attribute-defined-outside-init
+
+
+def load_patterns():
+    """The indicator patterns, as built by indicator_patterns(), from the
+    recorded indicator types"""
+
+    filename = os.path.join(os.path.dirname(__file__), 'profiles.d', 'indicator_types.json')
+    with open(filename, 'r') as f:
+        profile = json.load(f)
+
+    outputs = profile['outputs']['#App:9876:expression.result.array!StringArray']
+    result = {}
+    for ioc_type in map(json.loads, outputs['expected_output']):
+        if ioc_type.get('parsable', 'false') != 'true':
+            continue
+        type_keys = ioc_type.get('keys', {})
+        ioc_name = ioc_type.get('name')
+        key_names = [ioc_name + '.' + type_keys[x] for x in sorted(type_keys)]
+        if len(key_names) == 1:
+            key_names = [ioc_name]
+        result.update(zip(key_names, ioc_type.get('regexes', [])))
+    return result
+
+
+PATTERNS = load_patterns()
+
+TEXT = '''Report for ASN1234 and asn99
+Contact bad.actor@evil-domain.com or visit https://evil-domain.com/path?q=1 today.
+Callback to 10.1.2.3 and 192.168.100.200, and 10.1.2.3 again, block 10.0.0.0/8
+hashes: d41d8cd98f00b204e9800998ecf8427e da39a3ee5e6b4b0d3255bfef95601890afd80709
+e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855
+resolver at ns1.example.org, not a host: report.pdf
+'''
+
+
+def reference(data, patterns=PATTERNS):
+    """One regex pass per pattern, as extract_indicators did originally"""
+
+    bytesmode = isinstance(data, bytes)
+    flags = re.MULTILINE | re.DOTALL if bytesmode else re.MULTILINE
+    result = []
+    for key, value in patterns.items():
+        if bytesmode:
+            value = bytes(value, 'utf-8')
+        for match in compile_pattern(value, flags).finditer(data):
+            hit = match.group()
+            if bytesmode:
+                hit = hit.decode('utf-8')
+            if (key, hit) not in result:
+                result.append((key, hit))
+    return result
+
+
+class PatternExpression(Expression):
+    """Expression engine with recorded indicator patterns"""
+
+    def f_indicator_patterns(self):
+        """the patterns"""
+        return PATTERNS
+
+
+class TestExtractIndicators:
+    """Test extract_indicators"""
+
+    def setup_method(self):
+        """setup"""
+
+        self.expr = PatternExpression()
+
+    def test_extract(self):
+        """results are the same as a regex pass per pattern"""
+
+        result = self.expr.f_extract_indicators(TEXT)
+        assert result == reference(TEXT)
+        assert ('Host', 'ns1.example.org') in result
+        assert ('EmailAddress', 'bad.actor@evil-domain.com') in result
+        assert result.count(('Address', '10.1.2.3')) == 1
+
+    def test_extract_bytes(self):
+        """bytes mode"""
+
+        data = TEXT.encode('utf-8')
+        assert self.expr.f_extract_indicators(data) == reference(data)
+        raw = self.expr.f_extract_indicators(data, convert=False, dedup=False)
+        assert (b'Address', b'10.1.2.3') not in raw
+        assert raw.count(('Address', b'10.1.2.3')) == 2
+
+    def test_ignore(self):
+        """ignored patterns are skipped"""
+
+        ignore = [PATTERNS['ASN'], PATTERNS['EmailAddress'].encode('utf-8')]
+        result = self.expr.f_extract_indicators(TEXT, ignore=ignore)
+        assert result == [x for x in reference(TEXT) if x[0] not in ('ASN', 'EmailAddress')]
+        assert len(ignore) == 2
+
+    @pytest.mark.parametrize('size', [1, 7, 50, 1000])
+    def test_chunked(self, size):
+        """chunked input finds the same indicators"""
+
+        chunks = [TEXT[i : i + size] for i in range(0, len(TEXT), size)]
+        result = self.expr.f_extract_indicators(chunks, chunked=True, overlap=100)
+        assert result == reference(TEXT)
+
+        data = TEXT.encode('utf-8')
+        chunks = [data[i : i + size] for i in range(0, len(data), size)]
+        result = self.expr.f_extract_indicators(chunks, chunked=True, overlap=100)
+        assert result == reference(data)
+
+    def test_string_array(self):
+        """the items of a list are scanned separately, not joined"""
+
+        result = self.expr.f_extract_indicators(['10.1.2.3', '4.5.6.7'])
+        assert result == [('Address', '10.1.2.3'), ('Address', '4.5.6.7')]
+
+        result = self.expr.f_extract_indicators(['evil.com', 'good.org', 'evil.com'])
+        assert result == [('Host', 'evil.com'), ('Host', 'good.org')]
+
+        self.expr.set('hosts', ['evil.com', 'good.org'])
+        result = self.expr.eval('extract_indicators(hosts)')
+        assert result == [('Host', 'evil.com'), ('Host', 'good.org')]
+
+    def test_sparse(self):
+        """only the lines containing rare literals are scanned for some
+        patterns, with the same results"""
+
+        filler = 'nothing to see here, version 1.2 of 3\n' * 2000
+        data = filler + TEXT + filler + 'admin@example.com\nhttp://x.example.com/' + filler
+        assert self.expr.f_extract_indicators(data) == reference(data)
+
+        data = data.encode('utf-8')
+        assert self.expr.f_extract_indicators(data) == reference(data)
+
+    def test_expression(self):
+        """from an expression"""
+
+        self.expr.set('text', TEXT)
+        assert self.expr.eval('extract_indicators(text)') == reference(TEXT)
+        assert self.expr.eval('extract_indicators([])') == []
+
+
+class TestScanner:
+    """Test the indicator scanner"""
+
+    def test_prefilter(self):
+        """required literals rule out patterns"""
+
+        scanner = IndicatorScanner(PATTERNS)
+        literals = {x.key: x.literals for x in scanner.compile(False)}
+
+        assert set(literals['EmailAddress']) == {'@', '.'}
+        assert '://' in literals['URL']
+        assert set(literals['CIDR']) == {'.', '/'}
+        assert literals['ASN'] == ()
+
+        line_local = {x.key: x.line_local for x in scanner.compile(False)}
+        assert line_local['EmailAddress']
+        assert not line_local['Host']  # (?!.*@) ... dat($|\r\n)
+
+        literals = {x.key: x.literals for x in scanner.compile(True)}
+        assert set(literals['EmailAddress']) == {b'@', b'.'}
+
+        data = 'ASN1234 10.1.2.3'
+        possible = [x.key for x in scanner.compile(False) if x.possible(data)]
+        assert 'EmailAddress' not in possible
+        assert 'URL' not in possible
+        assert 'Address' in possible
+
+    def test_global_flags(self):
+        """inline global flags anywhere in a pattern apply to the whole pattern"""
+
+        regex = compile_pattern(r'abc(?i)def', 0)
+        assert regex.match('ABCDEF')
+        regex = compile_pattern(rb'abc(?i)def', 0)
+        assert regex.match(b'ABCDEF')
+
+        with pytest.raises(re.error):
+            compile_pattern(r'abc(', 0)
+
+    def test_scanner_reuse(self):
+        """patterns are compiled once per mode"""
+
+        scanner = IndicatorScanner(PATTERNS)
+        compiled = scanner.compile(False)
+        list(scanner.scan(TEXT))
+        list(scanner.scan(TEXT))
+        assert scanner.compile(False) is compiled
+        assert scanner.compile(True) is not compiled
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""Test fetch_indicators against a local stub of the ThreatConnect API"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+import shutil
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+import urllib.parse
+
+import pytest
+import requests
+
+from lark_expr import Expression
+
+# pylint: disable=attribute-defined-outside-init
+
+INDICATOR_TYPES = [
+    {
+        'name': 'Address',
+        'apiBranch': 'addresses',
+        'apiEntity': 'address',
+        'keys': {'key1': 'ip'},
+        'parsable': 'true',
+    },
+    {
+        'name': 'Host',
+        'apiBranch': 'hosts',
+        'apiEntity': 'host',
+        'keys': {'key1': 'hostName'},
+        'parsable': 'true',
+    },
+    {'name': 'Mutex', 'apiBranch': 'mutexes', 'apiEntity': 'mutex', 'keys': {'key1': 'Mutex'}},
+]
+
+REGEXES = {
+    'address': [r'\b\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}\b'],
+    'host': [r'\b(?:[a-z0-9-]+\.)+[a-z]{2,13}\b'],
+}
+
+KNOWN = {('addresses', '1.1.1.1'), ('addresses', '2.2.2.2'), ('hosts', 'example.com')}
+
+SUBRESOURCES = {
+    'owners': {'owner': [{'id': 1, 'name': 'Example Org'}]},
+    'observationCount': {'observationCount': {'count': 3}},
+    'attributes': {'attribute': [{'type': 'Description', 'value': 'stub'}]},
+    'securityLabels': {'securityLabel': [{'name': 'TLP:WHITE'}]},
+    'groups': {},
+    'tags': {'tag': [{'name': 'stub'}]},
+}
+
+DELAY = 0.02
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Serve canned ThreatConnect v2 API responses"""
+
+    requests = []
+    etag = '"types-1"'
+    failing = set()
+    lock = threading.Lock()
+    in_flight = 0
+    max_in_flight = 0
+    overlap = None  # if set, an Event each request waits on until another one is in flight
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """GET, recording the most requests in flight at once"""
+
+        cls = StubHandler
+        with cls.lock:
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+            if cls.overlap is not None and cls.in_flight > 1:
+                cls.overlap.set()
+        try:
+            if cls.overlap is not None:
+                cls.overlap.wait(5)
+            self.respond()
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+    def respond(self):
+        """Send the canned response for the request"""
+
+        path = urllib.parse.urlparse(self.path).path
+        self.requests.append(path)
+        time.sleep(DELAY)
+
+        parts = [urllib.parse.unquote_plus(x) for x in path.split('/')[1:]]
+        headers = {}
+        if parts == ['v2', 'types', 'indicatorTypes']:
+            if self.etag and self.headers.get('If-None-Match') == self.etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            body = {'status': 'Success', 'data': {'indicatorType': INDICATOR_TYPES}}
+            if self.etag:
+                headers['ETag'] = self.etag
+        elif parts[:3] == ['v2', 'types', 'indicatorTypes']:
+            if parts[3] in self.failing:
+                body = {'status': 'Failure'}
+            else:
+                indicator_type = {'regexes': REGEXES[parts[3]]}
+                body = {'status': 'Success', 'data': {'indicatorType': indicator_type}}
+        elif (parts[2], parts[3]) not in KNOWN:
+            body = {'status': 'Failure', 'message': 'Not Found'}
+        elif len(parts) == 4:
+            entity = parts[2][:-2] if parts[2] == 'addresses' else parts[2][:-1]
+            body = {'status': 'Success', 'data': {entity: {'summary': parts[3], 'rating': 3}}}
+        else:
+            body = {'status': 'Success', 'data': SUBRESOURCES[parts[4]]}
+
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        """quiet"""
+
+
+class StubSession(requests.Session):
+    """A session with a base URL, like the tcex session"""
+
+    def __init__(self, base_url):
+        """init"""
+        super().__init__()
+        self.base_url = base_url
+
+    def request(self, method, url, *args, **kwargs):  # pylint: disable=arguments-differ
+        """request relative to the base URL"""
+        return super().request(method, self.base_url + url, *args, **kwargs)
+
+
+class StubTcex:
+    """The parts of tcex used by fetch_indicators"""
+
+    def __init__(self, base_url, temp_path):
+        """init"""
+        self.log = logging.getLogger('stub')
+        self.session = StubSession(base_url)
+        self.default_args = SimpleNamespace(tc_api_path=base_url, tc_temp_path=temp_path)
+
+
+class StubServer:
+    """A stub ThreatConnect API server"""
+
+    def __init__(self):
+        """start the server"""
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.temp_path = tempfile.mkdtemp()
+
+    def tcex(self):
+        """Return a StubTcex for the server"""
+
+        host, port = self.server.server_address
+        return StubTcex(f'http://{host}:{port}', self.temp_path)
+
+    def close(self):
+        """stop the server"""
+
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.temp_path)
+
+
+class TestFetchIndicators:
+    """Test fetch_indicators"""
+
+    def setup_class(self):
+        """start the stub server"""
+
+        self.server = StubServer()
+
+    def teardown_class(self):
+        """stop the stub server"""
+
+        self.server.close()
+
+    def setup_method(self):
+        """fresh expression engine (and cache) per test"""
+
+        self.expr = Expression(self.server.tcex())
+        self.expr.f_indicator_types()
+        StubHandler.requests.clear()
+
+    def test_fetch(self):
+        """found and missing indicators, all fields"""
+
+        result = self.expr.eval(
+            "fetch_indicators(('Address', '1.1.1.1'), ('Host', 'example.com'), "
+            "('Address', '9.9.9.9'))"
+        )
+
+        assert result[2] == ('Address', '9.9.9.9', None, None)
+        assert result[0][:3] == ('Address', '1.1.1.1', 'address')
+        assert result[1][:3] == ('Host', 'example.com', 'host')
+        assert result[0][3] == {
+            'summary': '1.1.1.1',
+            'rating': 3,
+            'owners': SUBRESOURCES['owners']['owner'],
+            'observationCount': {'count': 3},
+            'attribute': SUBRESOURCES['attributes']['attribute'],
+            'securityLabel': SUBRESOURCES['securityLabels']['securityLabel'],
+            'associations': [],
+            'tag': SUBRESOURCES['tags']['tag'],
+        }
+        assert len(StubHandler.requests) == 3 + 2 * 6
+
+    def test_fields(self):
+        """only the requested fields are fetched"""
+
+        result = self.expr.eval(
+            "fetch_indicators('1.1.1.1', '2.2.2.2', default_type='Address', fields=['tag'])"
+        )
+
+        assert [x[3] for x in result] == [
+            {'summary': '1.1.1.1', 'rating': 3, 'tag': SUBRESOURCES['tags']['tag']},
+            {'summary': '2.2.2.2', 'rating': 3, 'tag': SUBRESOURCES['tags']['tag']},
+        ]
+        assert sorted(StubHandler.requests) == [
+            '/v2/indicators/addresses/1.1.1.1',
+            '/v2/indicators/addresses/1.1.1.1/tags',
+            '/v2/indicators/addresses/2.2.2.2',
+            '/v2/indicators/addresses/2.2.2.2/tags',
+        ]
+
+        with pytest.raises(ValueError):
+            self.expr.f_fetch_indicators('1.1.1.1', default_type='Address', fields='bogus')
+
+    def test_cache(self):
+        """indicators and fields are only fetched once per run"""
+
+        self.expr.f_fetch_indicators('1.1.1.1', '1.1.1.1', default_type='Address', fields='tag')
+        assert len(StubHandler.requests) == 2
+
+        result = self.expr.f_fetch_indicators(
+            ('Address', '1.1.1.1'), ('Address', '9.9.9.9'), fields=['tag', 'owners']
+        )
+        assert len(StubHandler.requests) == 4  # 9.9.9.9, and 1.1.1.1/owners
+        assert list(result[0][3]) == ['summary', 'rating', 'tag', 'owners']
+
+        self.expr.f_fetch_indicators(('Address', '1.1.1.1'), ('Address', '9.9.9.9'), fields='tag')
+        assert len(StubHandler.requests) == 4
+
+    def test_concurrent(self):
+        """requests are made concurrently"""
+
+        values = [f'{x}.{x}.{x}.{x}' for x in range(1, 3)] * 10
+        StubHandler.max_in_flight = 0
+        StubHandler.overlap = threading.Event()
+        try:
+            self.expr.f_fetch_indicators(values, default_type='Address')
+        finally:
+            StubHandler.overlap = None
+
+        assert len(StubHandler.requests) == 2 + 2 * 6
+        # serially, only one request would ever be in flight
+        assert StubHandler.max_in_flight > 1
+
+    def test_type_spelling(self):
+        """indicator types are matched, and cached, regardless of case"""
+
+        result = self.expr.f_fetch_indicators(('Host', 'example.com'), fields='tag')
+        assert len(StubHandler.requests) == 2
+
+        again = self.expr.f_fetch_indicators(('host', 'example.com'), fields='tag')
+        assert len(StubHandler.requests) == 2
+        assert again[0][0] == 'host'
+        assert again[0][1:] == result[0][1:]
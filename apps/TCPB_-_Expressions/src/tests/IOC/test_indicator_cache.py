@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""Test the indicator type and pattern cache"""
+
+import gc
+import json
+import os
+import stat
+import weakref
+
+from indicator_cache import IndicatorCache, private_directory
+from lark_expr import Expression
+from methods import ExpressionMethods
+
+from .test_fetch_indicators import INDICATOR_TYPES, REGEXES, StubHandler, StubServer
+
+# pylint: disable=attribute-defined-outside-init
+
+PATTERNS = {'Address': REGEXES['address'][0], 'Host': REGEXES['host'][0]}
+
+TYPES = '/v2/types/indicatorTypes'
+
+
+class TestIndicatorCache:
+    """Test the indicator cache"""
+
+    def setup_class(self):
+        """start the stub server"""
+
+        self.server = StubServer()
+
+    def teardown_class(self):
+        """stop the stub server"""
+
+        self.server.close()
+
+    def setup_method(self):
+        """start with an empty cache"""
+
+        StubHandler.etag = '"types-1"'
+        StubHandler.failing = set()
+        self.expr = Expression(self.server.tcex())
+        if os.path.exists(self.expr.indicator_cache().path):
+            os.unlink(self.expr.indicator_cache().path)
+        StubHandler.requests.clear()
+
+    def run(self):
+        """A new run, i.e. a new engine with only the disk cache"""
+
+        self.expr = Expression(self.server.tcex())
+        StubHandler.requests.clear()
+        return self.expr
+
+    def test_cold_and_warm(self):
+        """types and patterns are fetched once, and reused by later runs"""
+
+        assert self.expr.f_indicator_patterns() == PATTERNS
+        assert sorted(StubHandler.requests) == [TYPES, TYPES + '/address', TYPES + '/host']
+        assert self.expr.indicator_cache().stats['misses'] == 2
+
+        expr = self.run()
+        assert expr.f_indicator_types() == INDICATOR_TYPES
+        assert expr.f_indicator_patterns() == PATTERNS
+        assert expr.indicator_name_to_branch('Host') == 'hosts'
+        assert not StubHandler.requests
+        stats = expr.indicator_cache().stats
+        assert stats['misses'] == 0
+        assert stats['hits'] == 2  # the types and the patterns, once each
+        assert stats['reused'] >= 1
+
+    def test_stats(self):
+        """a later run counts the types and patterns served from disk"""
+
+        self.expr.f_indicator_patterns()
+        assert self.expr.indicator_cache().stats['misses'] == 2
+        assert len(StubHandler.requests) == 3
+
+        expr = self.run()
+        expr.f_indicator_patterns()
+        stats = expr.indicator_cache().stats
+        assert stats == {'hits': 2, 'misses': 0, 'revalidated': 0, 'reused': 0, 'errors': 0}
+
+    def test_revalidate_etag(self):
+        """stale types are revalidated with the ETag"""
+
+        self.expr.f_indicator_patterns()
+
+        expr = self.run()
+        expr.indicator_cache().ttl = 0
+        assert expr.f_indicator_patterns() == PATTERNS
+        assert StubHandler.requests == [TYPES]
+        assert expr.indicator_cache().stats['revalidated'] == 1
+
+    def test_revalidate_hash(self):
+        """stale types without an ETag are revalidated by their hash"""
+
+        StubHandler.etag = None
+        self.expr.f_indicator_patterns()
+
+        expr = self.run()
+        expr.indicator_cache().ttl = 0
+        assert expr.f_indicator_patterns() == PATTERNS
+        assert StubHandler.requests == [TYPES]
+        assert expr.indicator_cache().stats['revalidated'] == 1
+
+    def test_changed(self):
+        """changed types refetch the patterns"""
+
+        self.expr.f_indicator_patterns()
+
+        StubHandler.etag = '"types-2"'
+        INDICATOR_TYPES[1]['parsable'] = 'false'
+        try:
+            expr = self.run()
+            expr.indicator_cache().ttl = 0
+            assert expr.f_indicator_patterns() == {'Address': PATTERNS['Address']}
+            assert StubHandler.requests == [TYPES, TYPES + '/address']
+        finally:
+            INDICATOR_TYPES[1]['parsable'] = 'true'
+
+    def test_corrupt(self):
+        """a corrupt cache file is ignored"""
+
+        self.expr.f_indicator_patterns()
+        path = self.expr.indicator_cache().path
+        with open(path, 'r') as f:
+            entry = json.load(f)
+        entry['patterns']['Address'] = '.*'
+        with open(path, 'w') as f:
+            json.dump(entry, f)
+
+        expr = self.run()
+        assert expr.f_indicator_patterns() == PATTERNS
+        assert len(StubHandler.requests) == 3
+        assert expr.indicator_cache().stats['errors'] == 1
+
+    def test_permissions(self):
+        """the cache file is only readable by the user, and is ignored if others
+        could have written it"""
+
+        self.expr.f_indicator_patterns()
+        path = self.expr.indicator_cache().path
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+        os.chmod(path, 0o666)
+        expr = self.run()
+        assert expr.f_indicator_patterns() == PATTERNS
+        assert len(StubHandler.requests) == 3
+        assert expr.indicator_cache().stats['errors'] == 1
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+    @staticmethod
+    def test_private_directory(tmp_path):
+        """without the App's temp path, the cache is kept in a directory only the
+        user can access, or not at all"""
+
+        directory = private_directory(str(tmp_path))
+        assert stat.S_IMODE(os.stat(directory).st_mode) == 0o700
+        assert private_directory(str(tmp_path)) == directory
+
+        os.chmod(directory, 0o777)
+        assert private_directory(str(tmp_path)) is None
+
+        os.rmdir(directory)
+        os.symlink(str(tmp_path), directory)
+        assert private_directory(str(tmp_path)) is None
+
+        cache = IndicatorCache('https://api.example.com')
+        assert os.path.dirname(cache.path) == private_directory()
+
+    def test_incomplete(self):
+        """patterns are not saved if any could not be fetched"""
+
+        StubHandler.failing = {'host'}
+        assert self.expr.f_indicator_patterns() == {'Address': PATTERNS['Address']}
+        assert self.expr.f_indicator_patterns() == {'Address': PATTERNS['Address']}
+        assert len(StubHandler.requests) == 3
+
+        StubHandler.failing = set()
+        expr = self.run()
+        assert expr.f_indicator_patterns() == PATTERNS
+        assert sorted(StubHandler.requests) == [TYPES + '/address', TYPES + '/host']
+
+    def test_no_method_caches(self):
+        """the methods don't cache (and so keep alive) the engine"""
+
+        for name in ('f_indicator_types', 'f_indicator_patterns', 'indicator_name_to_branch'):
+            assert not hasattr(getattr(ExpressionMethods, name), 'cache_info')
+
+        self.expr.f_indicator_patterns()
+        self.expr.indicator_name_to_branch('Address')
+        ref = weakref.ref(self.expr)
+        self.expr = None
+        gc.collect()
+        assert ref() is None
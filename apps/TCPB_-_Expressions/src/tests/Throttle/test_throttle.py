@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""Test the URL throttle"""
+
+# standard library
+import threading
+
+# third-party
+import pytest
+
+# first-party
+from throttle import Throttle
+
+
+class TestThrottle:
+    """Test the URL throttle"""
+
+    @staticmethod
+    def test_burst(clock):
+        """burst requests at once, then rate per period"""
+
+        throttle = Throttle(20, period=1, burst=3, clock=clock, sleep=clock.sleep)
+
+        for _ in range(3):
+            throttle()
+        assert not clock.sleeps
+
+        for _ in range(2):
+            throttle()
+        assert clock.sleeps == pytest.approx([0.05, 0.05])
+
+    @staticmethod
+    def test_no_burst(clock):
+        """The first request goes at once, then rate per period"""
+
+        throttle = Throttle(20, period=1, clock=clock, sleep=clock.sleep)
+        assert throttle.burst == 0
+
+        for _ in range(3):
+            throttle()
+        assert clock.sleeps == pytest.approx([0.05, 0.05])
+
+    @staticmethod
+    def test_per_host(clock):
+        """Hosts are throttled separately"""
+
+        throttle = Throttle(1, period=10, clock=clock, sleep=clock.sleep)
+
+        threads = [
+            threading.Thread(target=throttle, args=(host,))
+            for host in ('a.example', 'b.example', 'c.example')
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert not clock.sleeps
+        assert not throttle.try_acquire('a.example')
+        assert throttle.stats()['keys'] == 3
@@ -0,0 +1,148 @@
+"""Test the token bucket rate limiter"""
+
+# standard library
+import asyncio
+import threading
+import time
+
+# third-party
+import pytest
+
+# first-party
+from token_bucket import TokenBucket, TokenBuckets
+
+
+class TestTokenBucket:
+    """Test the token bucket rate limiter"""
+
+    @staticmethod
+    def test_burst_then_rate(clock):
+        """capacity tokens at once, then one per interval"""
+
+        bucket = TokenBucket(10, period=1, capacity=3, clock=clock)
+
+        assert [bucket.reserve() for _ in range(5)] == pytest.approx([0, 0, 0, 0.1, 0.2])
+
+        clock.now += 0.2
+        assert bucket.reserve() == pytest.approx(0.1)
+
+        clock.now += 10
+        assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+
+        stats = bucket.stats()
+        assert stats['acquired'] == 9
+        assert stats['rejected'] == 1
+        assert stats['waits'] == 3
+        assert stats['wait_time'] == pytest.approx(0.4)
+        assert stats['max_wait'] == pytest.approx(0.2)
+
+    @staticmethod
+    def test_try_acquire_with_waiters(clock):
+        """try_acquire doesn't take tokens reserved by waiting callers"""
+
+        bucket = TokenBucket(1, period=1, clock=clock)
+
+        assert bucket.reserve() == 0
+        assert bucket.reserve() == pytest.approx(1)
+        clock.now += 1
+        assert not bucket.try_acquire()
+        clock.now += 1
+        assert bucket.try_acquire()
+
+    @staticmethod
+    def test_invalid_rate():
+        """Rate and period must be positive"""
+
+        with pytest.raises(ValueError):
+            TokenBucket(0)
+        with pytest.raises(ValueError):
+            TokenBuckets(1, period=0)
+
+    @staticmethod
+    def test_keys(clock):
+        """Each key has its own bucket"""
+
+        buckets = TokenBuckets(1, period=1, clock=clock)
+
+        assert buckets.try_acquire('a')
+        assert buckets.try_acquire('b')
+        assert not buckets.try_acquire('a')
+        assert buckets.bucket('a') is buckets.bucket('a')
+
+        stats = buckets.stats()
+        assert stats['keys'] == 2
+        assert stats['acquired'] == 2
+        assert stats['rejected'] == 1
+
+    @staticmethod
+    def test_acquire_sleeps(clock):
+        """acquire sleeps for the time until its token is refilled"""
+
+        bucket = TokenBucket(20, period=1, capacity=2, clock=clock, sleep=clock.sleep)
+
+        waits = [bucket.acquire() for _ in range(5)]
+
+        assert waits == pytest.approx([0, 0, 0.05, 0.05, 0.05])
+        assert clock.sleeps == pytest.approx([0.05, 0.05, 0.05])
+
+    @staticmethod
+    def test_threads_wait_outside_lock(clock):
+        """Waiting threads don't hold the lock, and are spaced by the rate"""
+
+        release = threading.Event()
+        sleeping = []
+
+        def sleep(delay):
+            sleeping.append(delay)
+            release.wait(10)
+
+        bucket = TokenBucket(20, period=1, clock=clock, sleep=sleep)
+        threads = [threading.Thread(target=bucket.acquire) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+
+        # the five waiting threads all reach their sleep, so none holds the lock
+        for _ in range(1000):
+            if len(sleeping) == 5:
+                break
+            time.sleep(0.01)
+        assert len(sleeping) == 5
+        assert not bucket.try_acquire()
+
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        assert sorted(sleeping) == pytest.approx([0.05, 0.1, 0.15, 0.2, 0.25])
+
+    @staticmethod
+    def test_acquire_async(clock):
+        """Async acquires sleep without blocking the event loop"""
+
+        events = []
+        sleeps = []
+
+        async def async_sleep(delay):
+            sleeps.append(delay)
+            await asyncio.sleep(0)
+
+        bucket = TokenBucket(50, period=1, clock=clock, async_sleep=async_sleep)
+
+        async def ticker():
+            for _ in range(3):
+                events.append('tick')
+                await asyncio.sleep(0)
+
+        async def acquire():
+            await bucket.acquire_async()
+            events.append('acquired')
+
+        async def main():
+            await asyncio.gather(ticker(), *(acquire() for _ in range(3)))
+
+        asyncio.run(main())
+
+        assert sleeps == pytest.approx([0.02, 0.04])
+        # the ticker runs while the second and third acquires are sleeping
+        assert events == ['tick', 'acquired', 'tick', 'acquired', 'acquired', 'tick']
+        assert bucket.stats()['waits'] == 2
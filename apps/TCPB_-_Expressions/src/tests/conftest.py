@@ -1,8 +1,13 @@
 # -*- coding: utf-8 -*-
 """Base pytest configuration file."""
+
 # standard library
 import os
 import shutil
+import time
+
+# third-party
+import pytest
 
 # first-party
 from app_lib import AppLib
@@ -46,6 +51,36 @@ def pytest_addoption(parser: object) -> None:
         action='append',
         help='Sets the TCEX_TEST_ENVS environment variable',
     )
+    parser.addoption(
+        '--benchmark',
+        action='store_true',
+        help='Run the benchmarks (tests marked benchmark), which are skipped by default',
+    )
+
+
+def pytest_configure(config: object) -> None:
+    """Register the benchmark marker.
+
+    Args:
+        config: Pytest config instance.
+    """
+    config.addinivalue_line('markers', 'benchmark: timing comparison, run with --benchmark')
+
+
+def pytest_collection_modifyitems(config: object, items: list) -> None:
+    """Skip the benchmarks unless --benchmark is given.
+
+    Args:
+        config: Pytest config instance.
+        items: The collected test items.
+    """
+    if config.getoption('--benchmark'):
+        return
+
+    skip = pytest.mark.skip(reason='benchmark (run with --benchmark)')
+    for item in items:
+        if 'benchmark' in item.keywords:
+            item.add_marker(skip)
 
 
 def pytest_generate_tests(metafunc: object) -> None:
@@ -75,6 +110,43 @@ def pytest_generate_tests(metafunc: object) -> None:
     metafunc.parametrize('profile_name,options', permutations, ids=ids)
 
 
+class SimulatedClock:
+    """A clock that only advances when it is slept on, recording the sleeps"""
+
+    def __init__(self, now: float = 100.0):
+        """Initialize class properties."""
+        self.now = now
+        self.sleeps = []
+
+    def __call__(self) -> float:
+        """Return the time."""
+        return self.now
+
+    def sleep(self, delay: float) -> None:
+        """Advance the clock by delay."""
+        self.sleeps.append(delay)
+        self.now += delay
+
+
+@pytest.fixture(name='clock')
+def fixture_clock() -> SimulatedClock:
+    """A simulated clock, to pass as the clock and sleep functions of a rate limiter."""
+    return SimulatedClock()
+
+
+def timed(f: callable, *args, **kwargs) -> tuple:
+    """Return the result of f(*args, **kwargs) and the seconds it took."""
+    start = time.perf_counter()
+    result = f(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+@pytest.fixture(name='timed')
+def fixture_timed() -> callable:
+    """The timed function, for the benchmarks."""
+    return timed
+
+
 # clear log directory
 def clear_log_directory() -> None:
     """Clear the App log directory."""
@@ -1,50 +1,25 @@
 # -*- coding: utf-8 -*-
 """Throttle class to implement rate limiting"""
-from threading import Lock
 import time
 
+from token_bucket import TokenBuckets
 
-class Throttle:
-    """Throttle Class"""
 
-    def __init__(self, rate=150, period=60, burst=0):
-        """Create a throttle for a specific rate/sec"""
+class Throttle(TokenBuckets):
+    """Throttle to rate requests per period, after an initial burst of up to
+    burst requests, with a separate throttle per key (e.g. per host)"""
+
+    def __init__(self, rate=150, period=60, burst=0, **kwargs):
+        """Create a throttle for a specific rate/period.  Keyword arguments
+        (e.g. clock and sleep) are passed on to the token buckets."""
 
-        self.lock = Lock()
-        self.rate = rate
-        self.period = period
         self.burst = max(min(burst, rate), 0)
-        self.count = 0
-        self.ts = None
-        self.end = None
+        super().__init__(rate, period, capacity=max(self.burst, 1), **kwargs)
 
-    def __call__(self):
+    def __call__(self, key=None):
         """Return when the throttle limit is acceptable"""
 
-        with self.lock:
-            now = time.time()
-            if self.ts is None:
-                self.ts = now
-                self.end = now + self.period
-
-            if now > self.end:
-                self.count = 0
-                # Because we do a tail sleep, the rollover will let an extra request through,
-                # unless we "count" that request here
-                if self.ts > (now - self.period * 2):
-                    self.count += 1
-                self.ts = now
-                self.end = now + self.period
-
-            self.count += 1
-
-            if self.count <= max(self.burst, 0):
-                return
-
-            deadline = self.period / self.rate * max(self.count - 1, 0)
-
-            if self.ts != now:
-                time.sleep(max(self.ts + deadline - now, 0))
+        self.acquire(key)
 
 
 if __name__ == '__main__':
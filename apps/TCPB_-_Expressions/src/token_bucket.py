@@ -0,0 +1,199 @@
+"""Token bucket rate limiting
+
+A TokenBucket allows rate acquisitions per period, with bursts of up to
+capacity acquisitions.  A caller that has to wait reserves its token under the
+lock, then sleeps (or awaits) after releasing it, so waiting callers never hold
+up the others, and are served in the order they arrived.
+
+The clock and the sleep functions may be replaced, e.g. by a simulated clock
+in tests.
+"""
+
+# standard library
+import asyncio
+import time
+from threading import Lock
+
+
+class TokenBucket:
+    """A bucket of up to capacity tokens, refilled at rate tokens per period"""
+
+    def __init__(
+        self,
+        rate,
+        period=1.0,
+        capacity=1,
+        clock=time.monotonic,
+        sleep=time.sleep,
+        async_sleep=asyncio.sleep,
+    ):
+        """Initialize class properties."""
+
+        if rate <= 0 or period <= 0:
+            raise ValueError('Rate and period must be positive')
+
+        self.rate = rate
+        self.period = period
+        self.capacity = max(capacity, 1)
+        self.clock = clock
+        self.sleep = sleep
+        self.async_sleep = async_sleep
+        self.lock = Lock()
+        self.tokens = float(self.capacity)
+        self.updated = clock()
+
+        # counters
+        self.acquired = 0
+        self.rejected = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+
+    @property
+    def interval(self):
+        """The time to refill one token"""
+
+        return self.period / self.rate
+
+    def _refill(self):
+        """Add the tokens refilled since the last update"""
+
+        now = self.clock()
+        self.tokens = min(self.tokens + (now - self.updated) / self.interval, self.capacity)
+        self.updated = now
+
+    def try_acquire(self, tokens=1):
+        """Take tokens if they are available now, returning True if they were"""
+
+        with self.lock:
+            self._refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                self.acquired += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def reserve(self, tokens=1):
+        """Take tokens, returning the number of seconds to wait before they
+        may be used"""
+
+        with self.lock:
+            self._refill()
+            self.tokens -= tokens
+            self.acquired += 1
+            delay = max(-self.tokens * self.interval, 0.0)
+            if delay > 0:
+                self.waits += 1
+                self.wait_time += delay
+                self.max_wait = max(self.max_wait, delay)
+            return delay
+
+    def acquire(self, tokens=1):
+        """Return when tokens have been acquired, returning the wait time"""
+
+        delay = self.reserve(tokens)
+        if delay > 0:
+            self.sleep(delay)
+        return delay
+
+    async def acquire_async(self, tokens=1):
+        """Return when tokens have been acquired, without blocking the event
+        loop, returning the wait time"""
+
+        delay = self.reserve(tokens)
+        if delay > 0:
+            await self.async_sleep(delay)
+        return delay
+
+    def stats(self):
+        """Return a dictionary of the counters"""
+
+        with self.lock:
+            return {
+                'acquired': self.acquired,
+                'rejected': self.rejected,
+                'waits': self.waits,
+                'wait_time': round(self.wait_time, 3),
+                'max_wait': round(self.max_wait, 3),
+            }
+
+
+class TokenBuckets:
+    """A TokenBucket per key, e.g. per nameserver or per host"""
+
+    def __init__(
+        self,
+        rate,
+        period=1.0,
+        capacity=1,
+        clock=time.monotonic,
+        sleep=time.sleep,
+        async_sleep=asyncio.sleep,
+    ):
+        """Initialize class properties."""
+
+        if rate <= 0 or period <= 0:
+            raise ValueError('Rate and period must be positive')
+
+        self.rate = rate
+        self.period = period
+        self.capacity = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.async_sleep = async_sleep
+        self.lock = Lock()
+        self.buckets = {}
+
+    def bucket(self, key=None):
+        """Return the bucket for key"""
+
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(
+                    self.rate,
+                    self.period,
+                    self.capacity,
+                    self.clock,
+                    self.sleep,
+                    self.async_sleep,
+                )
+                self.buckets[key] = bucket
+            return bucket
+
+    def try_acquire(self, key=None, tokens=1):
+        """Take tokens from the bucket for key if they are available now"""
+
+        return self.bucket(key).try_acquire(tokens)
+
+    def acquire(self, key=None, tokens=1):
+        """Return when tokens have been acquired from the bucket for key"""
+
+        return self.bucket(key).acquire(tokens)
+
+    async def acquire_async(self, key=None, tokens=1):
+        """Return when tokens have been acquired from the bucket for key,
+        without blocking the event loop"""
+
+        return await self.bucket(key).acquire_async(tokens)
+
+    def stats(self):
+        """Return a dictionary of the counters, summed over the buckets"""
+
+        with self.lock:
+            buckets = list(self.buckets.values())
+
+        result = {'keys': len(buckets), 'acquired': 0, 'rejected': 0, 'waits': 0}
+        wait_time = 0.0
+        max_wait = 0.0
+        for bucket in buckets:
+            stats = bucket.stats()
+            for name in ('acquired', 'rejected', 'waits'):
+                result[name] += stats[name]
+            wait_time += stats['wait_time']
+            max_wait = max(max_wait, stats['max_wait'])
+        result['wait_time'] = round(wait_time, 3)
+        result['max_wait'] = round(max_wait, 3)
+
+        return result
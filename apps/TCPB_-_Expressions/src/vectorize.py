@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""Vectorized (column at a time) evaluation of loop expressions
+
+A loop expression that only uses element-wise safe operations and builtins
+can be evaluated over all of the loop values in one pass, rather than once
+per iteration.  Numeric columns use NumPy (a requirement of the App) for the
+arithmetic and comparison operators; without it they are evaluated in Python.
+"""
+
+from itertools import repeat
+
+from lark import Tree
+
+from lark_expr import Evaluate, parse_expression
+from lazyvar import materialize
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# builtins which only depend on their arguments, and so can be applied
+# element by element
+ELEMENTWISE_FUNCTIONS = {
+    'abs',
+    'acos',
+    'acosh',
+    'asin',
+    'asinh',
+    'atan',
+    'atanh',
+    'b64decode',
+    'b64encode',
+    'bin',
+    'ceil',
+    'center',
+    'chr',
+    'cos',
+    'cosh',
+    'degrees',
+    'exp',
+    'float',
+    'hex',
+    'int',
+    'len',
+    'log',
+    'log10',
+    'log2',
+    'lower',
+    'lstrip',
+    'md5',
+    'ord',
+    'radians',
+    'refindall',
+    'rematch',
+    'replace',
+    'research',
+    'round',
+    'rstrip',
+    'sha1',
+    'sha256',
+    'sin',
+    'sinh',
+    'sqrt',
+    'str',
+    'strip',
+    'tan',
+    'tanh',
+    'title',
+    'trunc',
+    'upper',
+}
+
+# evaluation methods which may run on NumPy arrays when the operands are numeric
+NUMPY_OPERATORS = {
+    'add': 'add',
+    'sub': 'subtract',
+    'mul': 'multiply',
+    'div': 'true_divide',
+    'neg': 'negative',
+    'equals': 'equal',
+    'not_equals': 'not_equal',
+    'less_than': 'less',
+    'greater_than': 'greater',
+    'less_than_equal_to': 'less_equal',
+    'greater_than_equal_to': 'greater_equal',
+}
+
+# integers are only handed to NumPy when they are small enough that int64
+# arithmetic and float64 conversion give the same results as Python
+INT_LIMIT = 2 ** 31
+
+
+class Column(list):
+    """The per-element values of a loop variable or subexpression"""
+
+
+def references(tree, names):
+    """Return True if the parse tree references any of names as a variable"""
+
+    for node in tree.iter_subtrees():
+        if node.data == 'var' and str(node.children[0]) in names:
+            return True
+    return False
+
+
+def vectorizable(engine, tree, excluded=()):
+    """Return True if the parse tree can be evaluated a column at a time.
+
+    Function calls must be to element-wise safe builtins (that are not
+    shadowed by variables), and no variable may be one of the excluded names,
+    e.g. the results of a prior loop iteration.
+    """
+
+    for node in tree.iter_subtrees():
+        method = str(node.data)
+        if not hasattr(Evaluate, method):
+            return False
+        if method == 'var' and str(node.children[0]) in excluded:
+            return False
+        if method == 'function':
+            name = str(node.children[0])
+            if name not in ELEMENTWISE_FUNCTIONS:
+                return False
+            if name in engine.variables or any(name in context for context in engine.stack):
+                return False
+
+    return True
+
+
+def numeric_kind(value):
+    """Return int or float if value is a homogeneous numeric column or
+    scalar NumPy can process exactly, otherwise None"""
+
+    values = value if isinstance(value, Column) else (value,)
+
+    kinds = set(map(type, values))
+    if len(kinds) != 1:
+        return None
+    kind = kinds.pop()
+
+    if kind is int:
+        if min(values) <= -INT_LIMIT or max(values) >= INT_LIMIT:
+            return None
+    elif kind is not float:
+        return None
+
+    return kind
+
+
+def numpy_operator(method, args):
+    """Apply method to the args with NumPy, or return None if it can't be
+    done with the same results as the evaluator"""
+
+    kinds = [numeric_kind(arg) for arg in args]
+    if None in kinds:
+        return None
+
+    if method == 'div':
+        # Python raises on division by zero, and float division can overflow
+        divisor = args[1]
+        if float in kinds:
+            return None
+        if (0 in divisor) if isinstance(divisor, Column) else (divisor == 0):
+            return None
+
+    arrays = []
+    for arg, kind in zip(args, kinds):
+        dtype = numpy.int64 if kind is int else numpy.float64
+        arrays.append(numpy.asarray(arg, dtype=dtype))
+
+    return Column(getattr(numpy, NUMPY_OPERATORS[method])(*arrays).tolist())
+
+
+class ColumnEvaluator:
+    """Evaluate a parse tree over columns of loop values"""
+
+    def __init__(self, engine, columns: dict):
+        """init"""
+
+        self.engine = engine
+        self.evaluator = engine.evaluator
+        self.columns = columns
+
+    def evaluate(self, node):
+        """Evaluate a node, returning a Column or a (broadcast) scalar"""
+
+        if not isinstance(node, Tree):
+            return node  # a token
+
+        method = str(node.data)
+
+        if method == 'var':
+            name = str(node.children[0])
+            if name in self.columns:
+                return self.columns[name]
+            return self.evaluator.var(name)
+
+        # TC variables are used whole, rather than as lazy views
+        args = [materialize(self.evaluate(child)) for child in node.children]
+        func = getattr(self.evaluator, method)
+
+        if not any(isinstance(arg, Column) for arg in args):
+            return func(*args)
+
+        if numpy is not None and method in NUMPY_OPERATORS:
+            result = numpy_operator(method, args)
+            if result is not None:
+                return result
+
+        args = [arg if isinstance(arg, Column) else repeat(arg) for arg in args]
+        return Column(func(*row) for row in zip(*args))
+
+
+def evaluate_columns(engine, expression, columns: dict, excluded=()):
+    """Evaluate expression over the columns (a dictionary of name: list of values,
+    all of the same length), returning the list of results, or None if the
+    expression cannot be vectorized.
+
+    Any exception raised during evaluation also returns None, so the caller
+    can fall back to evaluating one element at a time.
+    """
+
+    if engine.trace or not isinstance(expression, str):
+        return None
+
+    try:
+        tree = parse_expression(expression)
+    except Exception:
+        return None
+
+    if not isinstance(tree, Tree) or not references(tree, columns):
+        return None
+
+    if not vectorizable(engine, tree, excluded):
+        return None
+
+    evaluator = ColumnEvaluator(engine, {k: Column(v) for k, v in columns.items()})
+    try:
+        result = evaluator.evaluate(tree)
+        if not isinstance(result, Column):
+            return None
+        return [engine.deencapsulate(x) for x in result]
+    except Exception:
+        return None
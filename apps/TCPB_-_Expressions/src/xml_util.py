@@ -4,7 +4,7 @@
 
 # standard library
 from collections import OrderedDict
-from io import StringIO
+from io import BytesIO, StringIO
 from xml.sax.saxutils import escape, quoteattr  # nosec
 
 # third-party
@@ -114,9 +114,7 @@ def walk_xml(
 
     result = {}
 
-    tag = element.tag
-    if not namespace and tag.startswith('{'):
-        tag = tag.split('}', 1)[1]
+    tag = local_tag(element.tag, namespace)
 
     value = element.text
     if strip:
@@ -193,6 +191,122 @@ def xml_to_dict(
     return result
 
 
+def local_tag(tag, namespace=False):
+    """The tag, without its namespace unless namespace is True"""
+
+    if not namespace and tag.startswith('{'):
+        return tag.split('}', 1)[1]
+    return tag
+
+
+def select_matcher(select: str):
+    """Return a function of a list of tags (from the root element down) that is
+    true if they match select, a path of tags (or *) such as
+    'Indicators/Indicator'.  The path matches the last tags, or if it starts
+    with /, all of them."""
+
+    anchored = select.startswith('/')
+    path = [tag for tag in select.strip('/').split('/') if tag]
+    if not path:
+        raise ValueError(f'Invalid select path {select!r}')
+
+    def matches(tags):
+        if len(tags) < len(path) or anchored and len(tags) != len(path):
+            return False
+        return all(p in ('*', tag) for p, tag in zip(path, tags[-len(path) :]))
+
+    return matches
+
+
+class StringSource:
+    """File-like reader of a string, which (unlike StringIO) doesn't copy it"""
+
+    def __init__(self, data: str):
+        """init"""
+
+        self.data = data
+        self.position = 0
+
+    def read(self, size=-1):
+        """Read up to size characters"""
+
+        start = self.position
+        end = len(self.data) if size is None or size < 0 else start + size
+        self.position = min(end, len(self.data))
+        return self.data[start:end]
+
+
+def iter_select(xmldata, select: str, namespace=False, **kwargs):
+    """Parse the XML data incrementally, yielding walk_xml() of each element
+    matching select (see select_matcher), and discarding each element once it
+    has been processed, so the document is never held in memory at once.  The
+    elements inside a matching element are not matched themselves."""
+
+    matches = select_matcher(select)
+
+    if isinstance(xmldata, bytes):
+        source = BytesIO(xmldata)
+    else:
+        source = StringSource(xmldata)
+
+    tags = []
+    parents = []
+    selected = None  # depth of the matching element being read
+
+    for event, element in ElementTree.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            parents.append(element)
+            if selected is not None:
+                tags.append(None)  # only the depth matters within a match
+                continue
+            tags.append(local_tag(element.tag, namespace))
+            if matches(tags):
+                selected = len(tags)
+            continue
+
+        if selected == len(tags):
+            selected = None
+            yield walk_xml(element, namespace=namespace, **kwargs)
+
+        tags.pop()
+        parents.pop()
+        if selected is None and parents:
+            # the element has just ended, so it is the last child of its parent
+            del parents[-1][-1]
+
+
+def xml_select(
+    xmldata,
+    select: str,
+    namespace=False,
+    strip=True,
+    convert=True,
+    compact=True,
+    transform=None,
+):
+    """Return the list of dictionary structures of the elements of the XML data
+    matching select (see select_matcher)"""
+
+    kwargs = {'strip': strip, 'convert': convert, 'compact': compact, 'transform': transform}
+
+    try:
+        return list(iter_select(xmldata, select, namespace=namespace, **kwargs))
+    except Exception as e:
+        if 'junk after document element' not in str(e):
+            raise
+
+    if isinstance(xmldata, bytes):
+        xmldata = b'<X_PARSE_ROOT>\n' + xmldata + b'\n</X_PARSE_ROOT>'
+    else:
+        xmldata = '<X_PARSE_ROOT>\n' + xmldata + '\n</X_PARSE_ROOT>'
+
+    # an anchored path starts below the wrapper element
+    if select.startswith('/'):
+        select = '/X_PARSE_ROOT' + select
+
+    return list(iter_select(xmldata, select, namespace=namespace, **kwargs))
+
+
 def tag_for(name, attributes=None, close=False, prefix='', namespace=None):
     """Returns an opening or closing tag with attributes"""
 